@@ -0,0 +1,193 @@
+"""
+Convert many logger files at once, for example after a fleet retrieval.
+
+Files are spread over a pool of worker processes, largest first so one big
+file doesn't end up running alone at the end. LID files are converted with
+DataConverter and LIX files (the newer .lid flavor) with the parsers routed
+by mat.lix_pr. LIX files are always converted next to the source file,
+to CSV unless a columnar output format is asked for.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from mat.columnar_file import COLUMNAR_FORMATS
+from mat.data_converter import DataConverter, default_parameters
+from mat.file_format import sniff_file
+from mat.lix import LID_FILE_V2
+from mat.lix_pr import get_lix_parser
+from mat.tiltcurve import TiltCurve
+from mat.utils import linux_ls_by_ext
+
+
+ConversionResult = namedtuple('ConversionResult', [
+    'path',
+    'status',
+    'duration',
+    'rows',
+    'output_paths',
+    'error']
+)
+
+
+def find_logger_files(path, extension='lid'):
+    """
+    path is either a folder, searched recursively for files with extension,
+    or a glob pattern
+    """
+    if os.path.isdir(path):
+        return linux_ls_by_ext(path, extension)
+    return glob.glob(path, recursive=True)
+
+
+def convert_file(path, parameters, more_columns=0):
+    """
+    Convert one file and describe the outcome, never raise.
+    """
+    start = time.perf_counter()
+    try:
+        if sniff_file(path).flavor == LID_FILE_V2:
+            rows, output_paths = _convert_lix(path,
+                                              more_columns,
+                                              parameters['output_format'])
+        else:
+            rows, output_paths = _convert_lid(path, parameters)
+        status, error = 'ok', None
+    except Exception as ex:
+        rows, output_paths = 0, []
+        status, error = 'error', '{}: {}'.format(type(ex).__name__, ex)
+    return ConversionResult(path,
+                            status,
+                            time.perf_counter() - start,
+                            rows,
+                            output_paths,
+                            error)
+
+
+def _convert_lid(path, parameters):
+    converter = DataConverter(path, parameters)
+    try:
+        converter.convert()
+    finally:
+        converter.close_source()
+    return converter.rows_written(), converter.output_paths()
+
+
+def _convert_lix(path, more_columns, output_format):
+    parser = get_lix_parser(path, more_columns)
+    if output_format in COLUMNAR_FORMATS:
+        output_path = parser.convert(verbose=False,
+                                     output_format=output_format)
+        return parser.n_rows, [output_path]
+    csv_path = parser.convert(verbose=False)
+    with open(csv_path) as f:
+        # do not count the column header
+        rows = sum(1 for _ in f) - 1
+    return rows, [csv_path]
+
+
+class BatchConverter:
+    def __init__(self, paths, parameters, workers=None, more_columns=0):
+        self.paths = sorted(paths, key=os.path.getsize, reverse=True)
+        self.parameters = parameters
+        self.workers = workers
+        self.more_columns = more_columns
+        self.observers = []
+        self._is_running = None
+
+    def cancel_conversion(self):
+        self._is_running = False  # pragma: no cover
+
+    def convert(self):
+        """
+        Return a ConversionResult per file, in the order files were
+        scheduled. Files not started before a cancel are left out.
+        """
+        self._is_running = True
+        sizes = {p: os.path.getsize(p) for p in self.paths}
+        total_size = sum(sizes.values()) or 1
+        done_size = 0
+        results = {}
+        with ProcessPoolExecutor(self.workers) as pool:
+            futures = [pool.submit(convert_file,
+                                   path,
+                                   self.parameters,
+                                   self.more_columns)
+                       for path in self.paths]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result.path] = result
+                done_size += sizes[result.path]
+                self._update_observers(done_size / total_size * 100, result)
+                if not self._is_running:
+                    for f in futures:
+                        f.cancel()
+                    break
+        return [results[p] for p in self.paths if p in results]
+
+    def _update_observers(self, percent, result):
+        for observer in self.observers:
+            observer(percent_done=percent, result=result)
+
+    def register_observer(self, observer):
+        self.observers.append(observer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert a folder of Lowell Instruments logger files, '
+                    'results are written to stdout as JSON')
+    parser.add_argument('path', help='folder or glob pattern')
+    parser.add_argument('--extension', default='lid')
+    parser.add_argument('--output-directory')
+    parser.add_argument('--output-type', default='discrete',
+                        help='one type or a comma separated list')
+    parser.add_argument('--output-format', default='csv')
+    parser.add_argument('--time-format', default='iso8601')
+    parser.add_argument('--tilt-curve', help='tilt curve file for current')
+    parser.add_argument('--no-average', action='store_true')
+    parser.add_argument('--voltage', action='store_true')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue interrupted LID conversions')
+    parser.add_argument('--more-columns', action='store_true',
+                        help='extra columns in LIX TDO files')
+    parser.add_argument('--workers', type=int,
+                        help='defaults to the number of processors')
+    parser.add_argument('--output-interval', type=float,
+                        help='seconds, reduce LID samples to one row per '
+                             'interval')
+    parser.add_argument('--statistics', default='mean',
+                        help='of each interval, a comma separated list of '
+                             'mean, min, max and std')
+    args = parser.parse_args(argv)
+
+    parameters = default_parameters()
+    parameters['output_directory'] = args.output_directory
+    parameters['output_type'] = args.output_type
+    parameters['output_format'] = args.output_format
+    parameters['time_format'] = args.time_format
+    parameters['average'] = not args.no_average
+    parameters['voltage'] = args.voltage
+    parameters['resume'] = args.resume
+    parameters['output_interval'] = args.output_interval
+    parameters['output_statistics'] = args.statistics
+    if args.tilt_curve:
+        parameters['tilt_curve'] = TiltCurve(args.tilt_curve)
+
+    paths = find_logger_files(args.path, args.extension)
+    results = BatchConverter(paths,
+                             parameters,
+                             args.workers,
+                             int(args.more_columns)).convert()
+    json.dump([r._asdict() for r in results], sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0 if all(r.status == 'ok' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
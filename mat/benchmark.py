@@ -0,0 +1,203 @@
+"""
+Conversion benchmarks on synthetic LID files.
+
+A LID file of the requested size is generated with mat.lid_generator, then
+converted to every output type and output format. Each conversion runs in
+a fresh process so the peak memory reported is its own. The report is a
+JSON document with the versions, the test file and, for each conversion,
+pages/s, MB/s and the peak resident set size, so results of different
+releases can be compared.
+
+python -m mat.benchmark --pages 20 --output benchmark.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from tempfile import TemporaryDirectory
+import numpy as np
+from mat.columnar_file import COLUMNAR_FORMATS
+from mat.data_converter import DataConverter, default_parameters
+from mat.lid_generator import lid_tags, write_lid_file
+from mat.tiltcurve import TiltCurve
+from mat.version import __version__
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+
+OUTPUT_TYPES = ['discrete', 'current', 'compass', 'ypr', 'cable',
+                'vertical_orientation']
+OUTPUT_FORMATS = ['csv', 'hdf5'] + list(COLUMNAR_FORMATS)
+MB = 1000 ** 2
+
+
+BenchmarkResult = namedtuple('BenchmarkResult', [
+    'output_type',
+    'output_format',
+    'duration',
+    'pages_per_second',
+    'mb_per_second',
+    'peak_rss_mb',
+    'rows',
+    'error']
+)
+
+
+def run_benchmarks(n_pages,
+                   output_types=OUTPUT_TYPES,
+                   output_formats=OUTPUT_FORMATS,
+                   tags=None,
+                   parameters=None,
+                   directory=None):
+    """
+    Return the benchmark report as a dict. parameters update the
+    default_parameters of every conversion, the generated file and the
+    outputs go to directory, a temporary directory by default.
+    """
+    with TemporaryDirectory(dir=directory) as work_directory:
+        path = os.path.join(work_directory, 'benchmark.lid')
+        write_lid_file(path, n_pages, tags)
+        n_bytes = os.path.getsize(path)
+        results = []
+        for output_type in output_types:
+            for output_format in output_formats:
+                case_parameters = default_parameters()
+                case_parameters.update(parameters or {})
+                case_parameters['output_type'] = output_type
+                case_parameters['output_format'] = output_format
+                case_parameters['output_directory'] = work_directory
+                results.append(benchmark_conversion(path,
+                                                    case_parameters,
+                                                    n_pages,
+                                                    n_bytes))
+                _remove_outputs(work_directory, path)
+    return {'mat': __version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'file': {'pages': n_pages,
+                     'bytes': n_bytes,
+                     'tags': lid_tags(tags)},
+            'results': [r._asdict() for r in results]}
+
+
+def benchmark_conversion(path, parameters, n_pages, n_bytes):
+    """
+    Convert path in a new process and describe the run, never raise
+    """
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            duration, rows, peak_rss = pool.submit(_convert,
+                                                   path,
+                                                   parameters).result()
+    except Exception as ex:
+        return BenchmarkResult(parameters['output_type'],
+                               parameters['output_format'],
+                               None, None, None, None, 0,
+                               '{}: {}'.format(type(ex).__name__, ex))
+    return BenchmarkResult(parameters['output_type'],
+                           parameters['output_format'],
+                           duration,
+                           n_pages / duration,
+                           n_bytes / MB / duration,
+                           peak_rss,
+                           rows,
+                           None)
+
+
+def _convert(path, parameters):
+    start = time.perf_counter()
+    converter = DataConverter(path, parameters)
+    converter.convert()
+    duration = time.perf_counter() - start
+    converter.close_source()
+    return duration, converter.rows_written(), peak_rss_mb()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and its finished children in
+    MB, or None where the resource module is missing (Windows)
+    """
+    if resource is None:
+        return None  # pragma: no cover
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # bytes on macOS, kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return peak * scale / MB
+
+
+def _remove_outputs(directory, source_path):
+    for name in os.listdir(directory):
+        output_path = os.path.join(directory, name)
+        if output_path != source_path:
+            os.remove(output_path)
+
+
+def parse_tags(tags):
+    """
+    'BMN=32,PRS=1' -> {'BMN': 32, 'PRS': 1}
+    """
+    parsed = {}
+    for tag_value in filter(None, tags.split(',')):
+        tag, value = tag_value.split('=')
+        parsed[tag.strip()] = int(value)
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark LID conversions on a synthetic file, the '
+                    'report is written as JSON')
+    parser.add_argument('--pages', type=int, default=10,
+                        help='size of the file in 1 MiB data pages')
+    parser.add_argument('--output-type',
+                        help='comma separated list, defaults to all the '
+                             'types, current only with a tilt curve')
+    parser.add_argument('--output-format', default=','.join(OUTPUT_FORMATS),
+                        help='comma separated list')
+    parser.add_argument('--tags', default='',
+                        help='header tags of the file, eg BMN=32,PRS=1')
+    parser.add_argument('--tilt-curve', help='tilt curve file for current')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--directory', help='where files are written')
+    parser.add_argument('--output', help='JSON report path, else stdout')
+    args = parser.parse_args(argv)
+
+    parameters = {'workers': args.workers}
+    output_types = [t for t in OUTPUT_TYPES
+                    if t != 'current' or args.tilt_curve]
+    if args.output_type:
+        output_types = args.output_type.split(',')
+    if args.tilt_curve:
+        parameters['tilt_curve'] = TiltCurve(args.tilt_curve)
+    report = run_benchmarks(args.pages,
+                            output_types,
+                            args.output_format.split(','),
+                            parse_tags(args.tags),
+                            parameters,
+                            args.directory)
+    if args.output:
+        with open(args.output, 'w') as fid:
+            json.dump(report, fid, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0 if all(r['error'] is None for r in report['results']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
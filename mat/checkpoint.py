@@ -0,0 +1,85 @@
+"""
+Checkpoints let an interrupted DataConverter conversion (power loss, a
+cancel or a crash) continue where it stopped rather than start over.
+
+After each data page, the output stream is flushed to disk and a small
+JSON state file records the page and where the output of each stream ends.
+The outputs are synced before the state file, so after a power loss the
+state never points past the end of an output. A new
+conversion of the same source file, with the same parameters, truncates
+the outputs back to that point and carries on with the next page. The
+state file is removed once a conversion completes.
+"""
+
+from datetime import datetime
+from os import path
+from .output_stream import output_prefix
+import json
+import os
+
+
+CHECKPOINT_EXTENSION = '.checkpoint'
+# parameters that don't change the output files
+IGNORED_PARAMETERS = ('workers', 'overwrite', 'index_cache', 'resume',
+                      'timings')
+
+
+class Checkpoint:
+    def __init__(self, file_path, parameters):
+        destination, file_prefix = output_prefix(file_path, parameters)
+        self.path = path.join(destination, file_prefix + CHECKPOINT_EXTENSION)
+        self.source = {'name': path.basename(file_path),
+                       'size': path.getsize(file_path)}
+        self.parameters = checkpoint_parameters(parameters)
+
+    def load(self):
+        """
+        The saved state, or None if there is no checkpoint of this source
+        file converted with these parameters
+        """
+        try:
+            with open(self.path) as fid:
+                state = json.load(fid)
+        except (OSError, ValueError):
+            return None
+        if state.get('source') != self.source \
+                or state.get('parameters') != self.parameters:
+            return None
+        return state
+
+    def save(self, page, output_state):
+        """
+        Record that page is the last page written. The file is replaced
+        in one step so a crash leaves the previous checkpoint intact.
+        """
+        state = {'source': self.source,
+                 'parameters': self.parameters,
+                 'page': page,
+                 'output': output_state}
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fid:
+            json.dump(state, fid)
+            fid.flush()
+            os.fsync(fid.fileno())
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        if path.exists(self.path):
+            os.remove(self.path)
+
+
+def checkpoint_parameters(parameters):
+    """
+    The parameters as they are stored in a checkpoint. Values that aren't
+    JSON, like calibrations and tilt curves, are compared by type only.
+    """
+    values = {k: v for k, v in parameters.items()
+              if k not in IGNORED_PARAMETERS}
+    return json.loads(json.dumps(values, default=_json_default,
+                                 sort_keys=True))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return type(value).__name__
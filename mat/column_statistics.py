@@ -0,0 +1,153 @@
+"""
+Running statistics of converted data, for quick-look reports.
+
+Converted samples update the count, NaN count, min, max, mean and standard
+deviation of each column, block after block, so memory doesn't grow with
+the file. Means and variances of blocks are merged with the pairwise
+formulas of Chan et al., which stay accurate over long files.
+"""
+
+from os import path
+from mat.output_stream import OutputStream
+from mat.time_converter import Iso8601
+import numpy as np
+
+
+SECONDS_PER_DAY = 86400
+
+
+class ColumnStatistics:
+    def __init__(self, columns):
+        n_columns = len(columns)
+        self.columns = columns
+        self.rows = 0
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.nan_count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+        self.start_time = None
+        self.end_time = None
+
+    def add(self, data, time):
+        """
+        data has one row per column and one column per sample, time is in
+        epoch seconds
+        """
+        n_samples = data.shape[1]
+        if n_samples == 0:
+            return
+        data = np.asarray(data, dtype=np.float64)
+        nan_count = np.count_nonzero(np.isnan(data), axis=1)
+        count = n_samples - nan_count
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(data, axis=1) / count
+            m2 = np.nansum((data - mean[:, None]) ** 2, axis=1)
+            delta = mean - self.mean
+            has_samples = count > 0
+            self.mean = np.where(has_samples,
+                                 self.mean + delta * count / total,
+                                 self.mean)
+            self.m2 = np.where(has_samples,
+                               self.m2 + m2
+                               + delta ** 2 * self.count * count / total,
+                               self.m2)
+        self.count = total
+        self.nan_count += nan_count
+        # fmin and fmax leave NaN out
+        self.min = np.fmin(self.min, np.fmin.reduce(data, axis=1))
+        self.max = np.fmax(self.max, np.fmax.reduce(data, axis=1))
+        if self.start_time is None:
+            self.start_time = float(time[0])
+        self.end_time = float(time[-1])
+        self.rows += n_samples
+
+    def report(self):
+        columns = {}
+        for i, column in enumerate(self.columns):
+            count = int(self.count[i])
+            columns[column] = {
+                'count': count,
+                'nan_count': int(self.nan_count[i]),
+                'min': _statistic(self.min[i], count),
+                'max': _statistic(self.max[i], count),
+                'mean': _statistic(self.mean[i], count),
+                'std': _statistic(np.sqrt(self.m2[i] / max(count, 1)), count)}
+        return {'rows': self.rows,
+                'start_time': iso_time(self.start_time),
+                'end_time': iso_time(self.end_time),
+                'columns': columns}
+
+
+def _statistic(value, count):
+    # None rather than NaN or inf, which aren't JSON
+    return float(value) if count else None
+
+
+def iso_time(seconds):
+    if seconds is None:
+        return None
+    return str(Iso8601().convert(np.array([seconds]))[0])
+
+
+class StatisticsStream(OutputStream):
+    """
+    Keeps the ColumnStatistics of each stream instead of writing it
+    """
+    def __init__(self):
+        self.streams = {}
+        self.rows = {}
+
+    def add_stream(self, data_product):
+        pass
+
+    def set_column_header(self, stream, column_header):
+        self.streams[stream] = ColumnStatistics(column_header.split(','))
+
+    def set_data_format(self, stream, data_format):
+        pass
+
+    def write(self, stream, data, time):
+        self._count_rows(stream, data)
+        self.streams[stream].add(data, time)
+
+
+def battery_trend(time, voltage):
+    """
+    The first, last and lowest battery voltage and the slope of a line
+    fit in volts per day. time is in epoch seconds.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    voltage = np.asarray(voltage, dtype=np.float64)
+    if len(voltage) == 0:
+        return None
+    slope = None
+    if np.ptp(time) > 0:
+        slope = float(np.polyfit(time - time[0], voltage, 1)[0]
+                      * SECONDS_PER_DAY)
+    return {'start': float(voltage[0]),
+            'end': float(voltage[-1]),
+            'min': float(voltage.min()),
+            'volts_per_day': slope}
+
+
+def file_report(file_path, streams, battery):
+    """
+    The quick-look report of a file as a JSON-able dict. streams maps the
+    stream names to their ColumnStatistics.
+    """
+    start_times = [s.start_time for s in streams.values()
+                   if s.start_time is not None]
+    end_times = [s.end_time for s in streams.values()
+                 if s.end_time is not None]
+    start = min(start_times) if start_times else None
+    end = max(end_times) if end_times else None
+    return {'file': path.basename(file_path),
+            'size': path.getsize(file_path),
+            'start_time': iso_time(start),
+            'end_time': iso_time(end),
+            'duration': end - start if start_times else None,
+            'battery': battery,
+            'streams': {k: v.report() for k, v in streams.items()}}
@@ -0,0 +1,128 @@
+"""
+Columnar output files, for analysis tools that would otherwise parse the
+CSV output back into a table.
+
+A file has one int64 time column in milliseconds since 1970-01-01 and one
+numeric column per channel. Rows are appended one block at a time, a data
+page for LID files, so memory stays bounded whatever the file size.
+
+Parquet is written with pyarrow when it is installed, one row group per
+block. Otherwise the columns go to a NumPy .npy file holding a structured
+array, which np.load or pandas.DataFrame read directly.
+"""
+
+import struct
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+    pq = None
+
+
+TIME_COLUMN = 'Time (ms)'
+COLUMNAR_FORMATS = ('parquet', 'npy')
+
+
+def parquet_available():
+    return pq is not None
+
+
+def columnar_file_factory(path_prefix, columns, output_format):
+    """
+    path_prefix is the output path without extension. columns is a list of
+    (name, dtype) tuples, time included. 'parquet' falls back to 'npy' when
+    there is no Parquet engine.
+    """
+    if output_format not in COLUMNAR_FORMATS:
+        raise ValueError('Unknown columnar format ' + str(output_format))
+    if output_format == 'parquet' and parquet_available():
+        return ParquetFile(path_prefix, columns)
+    return NpyFile(path_prefix, columns)
+
+
+def seconds_to_ms(seconds):
+    return np.round(np.asarray(seconds, dtype=np.float64) * 1000) \
+        .astype(np.int64)
+
+
+class ParquetFile:
+    extension = '.parquet'
+    _writer = None
+
+    def __init__(self, path_prefix, columns):
+        self.path = path_prefix + self.extension
+        self.dtypes = [np.dtype(dtype) for _, dtype in columns]
+        self.schema = pa.schema([(name, pa.from_numpy_dtype(dtype))
+                                 for (name, _), dtype
+                                 in zip(columns, self.dtypes)])
+        self.rows = 0
+        self._writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, columns):
+        """ columns are array-likes of equal length, in schema order """
+        arrays = [pa.array(np.asarray(c, dtype=dtype))
+                  for c, dtype in zip(columns, self.dtypes)]
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+        self._writer = None
+
+    def __del__(self):
+        self.close()
+
+
+class NpyFile:
+    """
+    The .npy header holds the row count, so it is written with room for
+    any count and rewritten in place by close().
+    """
+    extension = '.npy'
+    MAGIC = b'\x93NUMPY\x01\x00'
+    _file = None
+
+    def __init__(self, path_prefix, columns):
+        self.path = path_prefix + self.extension
+        self.dtype = np.dtype([(name, dtype) for name, dtype in columns])
+        self.rows = 0
+        self._header_length = None
+        self._file = open(self.path, 'wb')
+        self._file.write(self._header())
+
+    def _header(self):
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype),
+                       'fortran_order': False,
+                       'shape': (self.rows, )}).encode('latin1')
+        if self._header_length is None:
+            # 20 digits fit any row count, the total is 64 bytes aligned
+            length = len(self.MAGIC) + 2 + len(header) + 20 + 1
+            self._header_length = -(-length // 64) * 64
+        text_length = self._header_length - len(self.MAGIC) - 2
+        return (self.MAGIC
+                + struct.pack('<H', text_length)
+                + header.ljust(text_length - 1) + b'\n')
+
+    def write(self, columns):
+        """ columns are array-likes of equal length, in dtype order """
+        block = np.empty(len(columns[0]), dtype=self.dtype)
+        for name, values in zip(self.dtype.names, columns):
+            block[name] = values
+        self._file.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        if not self._file:
+            return
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+        self._file = None
+
+    def __del__(self):
+        self.close()
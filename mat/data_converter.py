@@ -1,12 +1,32 @@
+from mat.checkpoint import Checkpoint
+from mat.column_statistics import (battery_trend, file_report,
+                                   StatisticsStream)
 from mat.data_file_factory import load_data_file
 from mat.data_product import data_product_factory
+from mat.output_stream import (output_stream_factory, PageRecorder,
+                               TimeBins, TimedStream, TimeWindow)
+from mat.stage_timer import NULL_TIMER, StageTimer
+from mat.utils import epoch
+from bisect import bisect_left, bisect_right
 from mat.sensor import create_sensors, major_interval_info
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 from math import floor
 from pathlib import Path
 from .time_converter import create_time_converter
 import numpy as np
 
 
+ConvertedPage = namedtuple('ConvertedPage', [
+    'page',
+    'stream',
+    'time',
+    'data',
+    'columns']
+)
+
+
 def default_parameters():
     """
     If this were a stand alone dictionary, and not in a function, the user
@@ -23,7 +43,18 @@ def default_parameters():
             'split': None,
             'calibration': None,
             'overwrite': True,
-            'voltage': False}
+            'voltage': False,
+            'index_cache': False,
+            'workers': 1,
+            'hdf5_compression': 'gzip',
+            'hdf5_gzip_level': 4,
+            'columnar_dtype': 'float64',
+            'start_time': None,
+            'end_time': None,
+            'resume': False,
+            'timings': False,
+            'output_interval': None,
+            'output_statistics': 'mean'}
 
 
 class DataConverter:
@@ -31,13 +62,18 @@ class DataConverter:
         self.path = path
         self.parameters = parameters
         self.source_file = None
+        self.output_stream = None
+        self.voltage_path = None
         self.observers = []
+        self.checkpoint = None
+        self.timer = NULL_TIMER
         self._is_running = None
 
     def _load_source_file(self):
         if not self.source_file:
             self.source_file = load_data_file(self.path,
-                                              self.parameters['calibration'])
+                                              self.parameters['calibration'],
+                                              self.parameters['index_cache'])
         return self.source_file
 
     def cancel_conversion(self):
@@ -45,25 +81,226 @@ class DataConverter:
 
     def convert(self):
         self._is_running = True
+        self.timer = create_timer(self.parameters)
         self._load_source_file()
+        pages = self.page_range()
+        output_stream = output_stream_factory(self.path, self.parameters)
+        output_stream.n_pages = len(pages)
+        self.output_stream = output_stream
+        remaining = self._resume(output_stream, pages)
+        if self.parameters['timings']:
+            output_stream = TimedStream(output_stream, self.timer)
+        output_stream = self._time_bins(output_stream)
         outputs = data_product_factory(self.path,
                                        self._build_sensors(),
-                                       self.parameters)
+                                       self.parameters,
+                                       self._time_window(output_stream))
 
-        page_times = self.source_file.page_times()
-        for i in range(self.source_file.n_pages()):
-            if not self._is_running:
-                break  # pragma: no cover
-            page = self.source_file.page(i)
-            self._write_to_outputs(outputs, page, page_times[i])
-            percent = (i + 1) / self.source_file.n_pages() * 100
-            self._update_observers(percent)
+        try:
+            if self.parameters['workers'] > 1 and len(remaining) > 1:
+                self._convert_parallel(output_stream, remaining)
+            else:
+                self._convert_serial(outputs, remaining)
+            output_stream.flush()
+        finally:
+            self.output_stream.close()
+        if self.checkpoint and self._is_running:
+            self.checkpoint.remove()
         if self.parameters['voltage']:
             # this is a gross little hack because the voltages aren't stored in the "page" data
             file_path = Path(self.path)
-            parent = self.parameters['output_directory'] or file_path.parent
+            parent = Path(self.parameters['output_directory']
+                          or file_path.parent)
             outfile = parent / (file_path.stem + '_Voltage.csv')
-            write_voltage_file(outfile, page_times, self.source_file.page_voltages())
+            page_times = self.source_file.page_times()[pages.start:pages.stop]
+            voltages = self.source_file.page_voltages()[pages.start:pages.stop]
+            with self.timer.stage('write', 'Voltage'):
+                write_voltage_file(outfile, page_times, voltages)
+            self.voltage_path = str(outfile)
+
+    def page_range(self):
+        """
+        The pages overlapping the start_time / end_time window. Page times
+        are sorted, so both ends are found by bisection.
+        """
+        self._load_source_file()
+        page_times = self.source_file.page_times()
+        start, end = time_window(self.parameters)
+        first, last = 0, len(page_times)
+        if start is not None:
+            first = max(bisect_right(page_times, start) - 1, 0)
+        if end is not None:
+            last = bisect_left(page_times, end)
+        return range(first, max(first, last))
+
+    def _resume(self, output_stream, pages):
+        """
+        The pages left to convert. With the resume parameter, a checkpoint
+        is kept and a conversion matching a previous checkpoint continues
+        after its last page. Outputs that can't be resumed start over, as do
+        time binned outputs since their bins span pages.
+        """
+        if not self.parameters['resume'] or not output_stream.resumable \
+                or self.parameters['output_interval']:
+            return pages
+        self.checkpoint = Checkpoint(self.path, self.parameters)
+        state = self.checkpoint.load()
+        if state is None:
+            return pages
+        try:
+            output_stream.resume(state['output'])
+        except OSError:
+            return pages
+        return range(max(pages.start, state['page'] + 1), pages.stop)
+
+    def _page_written(self, i):
+        if self.checkpoint:
+            self.checkpoint.save(i, self.output_stream.checkpoint())
+        self._page_done(i)
+
+    def _time_window(self, output_stream):
+        start, end = time_window(self.parameters)
+        if start is None and end is None:
+            return output_stream
+        return TimeWindow(output_stream, start, end)
+
+    def _time_bins(self, output_stream):
+        """
+        With the output_interval parameter, in seconds, samples are reduced
+        to the output_statistics of each interval
+        """
+        if not self.parameters['output_interval']:
+            return output_stream
+        return TimeBins(output_stream,
+                        self.parameters['output_interval'],
+                        self.parameters['output_statistics'])
+
+    def iter_pages(self):
+        """
+        Yield a ConvertedPage for each data product of each page, in page
+        order, instead of writing files. time is in epoch seconds and data
+        has one row per sample and one column per entry of columns. Only
+        the page being yielded is kept in memory.
+        """
+        self._is_running = True
+        self.timer = create_timer(self.parameters)
+        self._load_source_file()
+        recorder = PageRecorder()
+        output_stream = self._time_bins(recorder)
+        outputs = data_product_factory(self.path,
+                                       self._build_sensors(),
+                                       self.parameters,
+                                       self._time_window(output_stream))
+        page_times = self.source_file.page_times()
+        i = None
+        for i in self.page_range():
+            if not self._is_running:
+                break  # pragma: no cover
+            page = self._read_page(i)
+            self._write_to_outputs(outputs, page, page_times[i])
+            yield from _converted_pages(recorder, i)
+            self._page_done(i)
+        # time bins held back at the end of the last page
+        output_stream.flush()
+        yield from _converted_pages(recorder, i)
+
+    def summarize(self):
+        """
+        Quick-look statistics of the file as a dict, see
+        mat.column_statistics. Pages are converted like convert() does but
+        nothing is formatted or written.
+        """
+        self._is_running = True
+        self.timer = create_timer(self.parameters)
+        self._load_source_file()
+        pages = self.page_range()
+        statistics = StatisticsStream()
+        outputs = data_product_factory(self.path,
+                                       self._build_sensors(),
+                                       self.parameters,
+                                       self._time_window(statistics))
+        if self.parameters['workers'] > 1 and len(pages) > 1:
+            self._convert_parallel(statistics, pages)
+        else:
+            self._convert_serial(outputs, pages)
+        page_times = self.source_file.page_times()[pages.start:pages.stop]
+        voltages = self.source_file.page_voltages()[pages.start:pages.stop]
+        return file_report(self.path,
+                           statistics.streams,
+                           battery_trend(page_times, voltages))
+
+    def to_dataframes(self):
+        """
+        A pandas DataFrame per data product, indexed by time
+        """
+        return pages_to_dataframes(self.iter_pages())
+
+    def output_paths(self):
+        paths = self.output_stream.output_paths() if self.output_stream else []
+        if self.voltage_path:
+            paths.append(self.voltage_path)
+        return paths
+
+    def timing_summary(self):
+        """
+        The StageTimer summary of the last conversion, None unless the
+        timings parameter is set
+        """
+        return self.timer.summary()
+
+    def rows_written(self):
+        if not self.output_stream:
+            return 0
+        return sum(self.output_stream.rows.values())
+
+    def _convert_serial(self, outputs, pages):
+        page_times = self.source_file.page_times()
+        for i in pages:
+            if not self._is_running:
+                break  # pragma: no cover
+            page = self._read_page(i)
+            self._write_to_outputs(outputs, page, page_times[i])
+            self._page_written(i)
+
+    def _convert_parallel(self, output_stream, pages):
+        """
+        Pages are demultiplexed, calibrated and derived by a pool of worker
+        processes. Only the writes are done here, in page order, so the
+        output files are the same as a serial conversion.
+        """
+        n_workers = self.parameters['workers']
+        initargs = (self.path, self.parameters)
+        with ProcessPoolExecutor(n_workers,
+                                 initializer=_init_page_worker,
+                                 initargs=initargs) as pool:
+            pending = deque()
+            next_page = pages.start
+            for i in pages:
+                # bound the number of converted pages waiting to be written
+                while next_page < pages.stop \
+                        and len(pending) < 2 * n_workers:
+                    pending.append(pool.submit(_convert_page, next_page))
+                    next_page += 1
+                if not self._is_running:
+                    for future in pending:
+                        future.cancel()
+                    break
+                writes, timer_counts = pending.popleft().result()
+                self.timer.merge(timer_counts)
+                for stream, data, time in writes:
+                    output_stream.write(stream, data, time)
+                self._page_written(i)
+
+    def _page_done(self, i):
+        pages = self.page_range()
+        percent = (i + 1 - pages.start) / len(pages) * 100
+        self._update_observers(percent)
+
+    def _read_page(self, i):
+        with self.timer.stage('read'):
+            page = self.source_file.page(i)
+        self.timer.add_bytes('read', '', page.nbytes)
+        return page
 
     def _build_sensors(self):
         header = self.source_file.header()
@@ -74,17 +311,29 @@ class DataConverter:
             seconds = floor((self.source_file.PAGE_SIZE
                              - self.source_file.mini_header_length())
                             / bytes) * major_interval
-        return create_sensors(header,
-                              self.source_file.calibration(),
-                              seconds)
+        sensors = create_sensors(header,
+                                 self.source_file.calibration(),
+                                 seconds)
+        if self.parameters['timings']:
+            for sensor in sensors:
+                sensor.timer = self.timer
+        return sensors
 
     def _write_to_outputs(self, outputs, page, page_time):
         for this_output in outputs:
-            this_output.process_page(page, page_time)
+            with self.timer.stage('derive', this_output.stream_name()):
+                this_output.process_page(page, page_time)
 
     def _update_observers(self, percent):
+        """
+        With the timings parameter, observers are also passed the
+        timing_summary() so far as stage_timings
+        """
+        timings = {}
+        if self.parameters['timings']:
+            timings['stage_timings'] = self.timing_summary()
         for observer in self.observers:
-            observer(percent_done=percent)
+            observer(percent_done=percent, **timings)
 
     def register_observer(self, observer):
         self.observers.append(observer)
@@ -97,6 +346,83 @@ class DataConverter:
         self.close_source()
 
 
+# state of a worker process of DataConverter._convert_parallel
+_page_worker = None
+
+
+def _init_page_worker(path, parameters):
+    global _page_worker
+    converter = DataConverter(path, parameters)
+    converter.timer = create_timer(parameters)
+    converter._load_source_file()
+    recorder = PageRecorder()
+    outputs = data_product_factory(path,
+                                   converter._build_sensors(),
+                                   parameters,
+                                   converter._time_window(recorder))
+    _page_worker = (converter, outputs, recorder)
+
+
+def _convert_page(i):
+    converter, outputs, recorder = _page_worker
+    page = converter._read_page(i)
+    page_time = converter.source_file.page_times()[i]
+    converter._write_to_outputs(outputs, page, page_time)
+    # the stage timings of the page go back with its writes
+    return recorder.pop_writes(), converter.timer.pop_counts()
+
+
+def _converted_pages(recorder, i):
+    for stream, data, time in recorder.pop_writes():
+        yield ConvertedPage(i,
+                            stream,
+                            time,
+                            data.T,
+                            recorder.column_headers[stream])
+
+
+def create_timer(parameters):
+    return StageTimer() if parameters['timings'] else NULL_TIMER
+
+
+def time_window(parameters):
+    """
+    start_time and end_time in epoch seconds, either may be None. They can
+    be given as numbers or as datetimes, naive datetimes are UTC.
+    """
+    return (_epoch_seconds(parameters['start_time']),
+            _epoch_seconds(parameters['end_time']))
+
+
+def _epoch_seconds(time):
+    if isinstance(time, datetime):
+        if time.tzinfo is not None:
+            return time.timestamp()
+        return epoch(time)
+    return time
+
+
+def pages_to_dataframes(pages):
+    """
+    Concatenate ConvertedPages into a dict of DataFrames keyed by stream
+    """
+    import pandas as pd
+    streams = {}
+    for page in pages:
+        times, data, columns = streams.setdefault(page.stream,
+                                                  ([], [], page.columns))
+        times.append(page.time)
+        data.append(page.data)
+    dataframes = {}
+    for stream, (times, data, columns) in streams.items():
+        index = pd.to_datetime(np.concatenate(times), unit='s')
+        index.name = 'Time'
+        dataframes[stream] = pd.DataFrame(np.concatenate(data),
+                                          index=index,
+                                          columns=columns)
+    return dataframes
+
+
 def write_voltage_file(path, times, voltages):
     time_converter = create_time_converter('iso8601')
     iso_times = time_converter.convert(np.array(times).astype(np.float64))
@@ -1,16 +1,27 @@
+from mat.file_format import sniff_file
 from mat.lid_data_file import LidDataFile
+from mat.lix import LID_FILE_V2
 
 
 DATA_FILE_TYPES = {'.lid': LidDataFile}
 
 
-def load_data_file(file_path, calibration=None):
+def load_data_file(file_path, calibration=None, index_cache=False):
     extension = file_path[-4:]
-    try:
-        klass = DATA_FILE_TYPES.get(extension)
-        return klass(file_path, calibration)
-    except TypeError:
+    klass = DATA_FILE_TYPES.get(extension)
+    if klass is None:
         raise WrongFileTypeError('Invalid Filename or extension')
+    # LIX files share the extension, they are told apart by their header
+    if _is_lix_file(file_path):
+        raise WrongFileTypeError('LIX file, convert it with mat.lix_pr')
+    return klass(file_path, calibration, index_cache)
+
+
+def _is_lix_file(file_path):
+    try:
+        return sniff_file(file_path).flavor == LID_FILE_V2
+    except OSError:
+        return False
 
 
 class WrongFileTypeError(Exception):
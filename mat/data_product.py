@@ -11,9 +11,11 @@ from collections import namedtuple
 SensorDataTime = namedtuple('SensorDataTime', ['data', 'time'])
 
 
-def data_product_factory(file_path, sensors, parameters):
+def data_product_factory(file_path, sensors, parameters, output_stream=None):
     """
-    Instantiate a data product subclass and pass it the necessary sensors
+    Instantiate the data product subclasses and pass them the necessary
+    sensors. output_type is one type or a list of types, all products share
+    the sensors so each page is converted once whatever the product count.
     """
     special_cases = {'compass': Compass,
                      'current': Current,
@@ -21,15 +23,20 @@ def data_product_factory(file_path, sensors, parameters):
                      'cable': Cable,
                      'vertical_orientation': VerticalOrientation}
     data_products = []
-    output_stream = output_stream_factory(file_path, parameters)
-
-    # special cases and accelmag are mutually exclusive, hence the if else
-    if parameters['output_type'] in special_cases.keys():
-        klass = special_cases[parameters['output_type']]
-        data_products.append(klass(sensors, parameters, output_stream))
-
-    # Check if any multi-sensors need bundling
-    else:
+    if output_stream is None:
+        output_stream = output_stream_factory(file_path, parameters)
+
+    output_types = output_type_list(parameters['output_type'])
+    for output_type in output_types:
+        if output_type in special_cases.keys():
+            klass = special_cases[output_type]
+            data_products.append(klass(sensors, parameters, output_stream))
+
+    # special cases and accelmag are mutually exclusive, unless both are
+    # asked for
+    special = [t for t in output_types if t in special_cases]
+    if not special or 'discrete' in output_types:
+        # Check if any multi-sensors need bundling
         for product in [AccelMag, DissolvedOxygen]:
             if set(product.REQUIRED_SENSORS).issubset([s.name for s in sensors]):
                 data_products.append(product(sensors, parameters, output_stream))
@@ -41,6 +48,19 @@ def data_product_factory(file_path, sensors, parameters):
     return data_products
 
 
+def output_type_list(output_type):
+    """
+    'current', ['current', 'ypr'] or 'current,ypr' -> ['current', 'ypr']
+    """
+    if isinstance(output_type, str):
+        output_type = output_type.split(',')
+    output_types = []
+    for t in output_type:
+        if t.strip() not in output_types:
+            output_types.append(t.strip())
+    return output_types
+
+
 def _remaining_sensors(sensors, data_products):
     used_sensors = [s for p in data_products for s in p.REQUIRED_SENSORS]
     used_sensors.extend([s for p in data_products for s in p.OPTIONAL_SENSORS])
@@ -72,8 +92,21 @@ class DataProduct(ABC):
         name = self.stream_name()
         self.output_stream.add_stream(name)
         self.output_stream.set_data_format(name, self.data_format())
+        self.output_stream.set_page_samples(name, self.samples_per_page())
         self.output_stream.set_column_header(name, self.column_header())
 
+    def samples_per_page(self):
+        """
+        Upper bound of the rows written for a full data page
+        """
+        samples = []
+        for sensor in self.sensors:
+            n = sensor.samples_per_page() // sensor.channels
+            if self.average:
+                n //= sensor.burst_count
+            samples.append(n)
+        return min(samples)
+
     def convert_sensors(self, data_page, page_time):
         converted = []
         for sensor in self.sensors:
@@ -0,0 +1,68 @@
+"""
+Tell the format of a logger file from its first bytes.
+
+A .lid file is either an old LID file or a LIX file, the newer flavor
+starting with a macro-header. Only the first LIX chunk is read, so large
+files in a download folder are classified without reading them. Results
+are cached by path, size and modification time.
+"""
+
+import os
+from collections import namedtuple
+from functools import lru_cache
+from mat.lid_data_file import LidDataFile
+from mat.lix import CS, LID_FILE_UNK, LID_FILE_V1, LID_FILE_V2, lid_file_flavor
+from mat.lix_dox import ParserLixDoxFile
+from mat.lix_tdo_v3 import ParserLixTdoFileV3
+from mat.lix_tdo_v4 import ParserLixTdoFileV4
+
+
+# LIX parsers of TDO files by macro-header revision
+TDO_PARSERS = {'3': ParserLixTdoFileV3,
+               '4': ParserLixTdoFileV4}
+# offset of the revision in a TDO macro-header
+TDO_RVN_OFFSET = 17
+
+
+# flavor: LID_FILE_V1, LID_FILE_V2 (LIX) or LID_FILE_UNK
+# logger_type: the LIX file type, eg 'TDO' or 'DO2', None for LID files
+# rvn: the TDO macro-header revision, eg '4', None otherwise
+# parser: LidDataFile, the LIX parser class, or None if there is none
+FileFormat = namedtuple('FileFormat', [
+    'flavor',
+    'logger_type',
+    'rvn',
+    'parser']
+)
+
+
+def sniff_file(path):
+    """
+    The FileFormat of a .lid file. Raises OSError if it can't be read.
+    """
+    if not path.endswith('.lid'):
+        return FileFormat(LID_FILE_UNK, None, None, None)
+    stat = os.stat(path)
+    return _sniff_file(path, stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=1024)
+def _sniff_file(path, size, mtime):
+    with open(path, 'rb') as f:
+        return header_format(f.read(CS))
+
+
+def header_format(bb):
+    """
+    The FileFormat of a .lid file starting with bytes bb
+    """
+    flavor = lid_file_flavor(bb[:3])
+    if flavor == LID_FILE_V1:
+        return FileFormat(flavor, None, None, LidDataFile)
+    logger_type = bb[:3].decode()
+    if logger_type in ('DO1', 'DO2'):
+        return FileFormat(flavor, logger_type, None, ParserLixDoxFile)
+    rvn = None
+    if len(bb) > TDO_RVN_OFFSET:
+        rvn = chr(bb[TDO_RVN_OFFSET])
+    return FileFormat(flavor, logger_type, rvn, TDO_PARSERS.get(rvn))
@@ -1,7 +1,6 @@
 from mat.sensor_data_file import SensorDataFile
-from math import ceil
-from mat.utils import parse_tags, epoch, write_sws_file, consecutive_numbers
-from datetime import datetime
+from mat.lid_page_index import scan_page_index, load_sidecar, save_sidecar
+from mat.utils import write_sws_file, consecutive_numbers
 import numpy as np
 
 
@@ -18,28 +17,43 @@ class LidDataFile(SensorDataFile):
     def n_pages(self):
         if self._n_pages is not None:
             return self._n_pages
-        ideal_n = ceil((self.file_size() - self.data_start) / self.PAGE_SIZE)
-        successful_reads = 0
-        try:
-            for n in range(ideal_n):
-                self._mini_headers.append(self._read_mini_header(n))
-                successful_reads += 1
-        except ValueError:
-            self.header_error = (successful_reads, ideal_n)
-        self._n_pages = successful_reads
+        page_index = self.page_index()
+        self.header_error = page_index.header_error
+        self._n_pages = page_index.n_pages
         return self._n_pages
 
+    def page_index(self):
+        if self._page_index is None:
+            self._page_index = self._load_page_index()
+        return self._page_index
+
+    def _load_page_index(self):
+        if self._index_cache:
+            page_index = load_sidecar(self._file_path)
+            if page_index is not None:
+                self._mini_header_length = page_index.mini_header_length
+                return page_index
+        page_index = scan_page_index(self.mapped_file(),
+                                     self.data_start,
+                                     self.PAGE_SIZE,
+                                     self.mini_header_length())
+        if self._index_cache:
+            save_sidecar(self._file_path, page_index)
+        return page_index
+
     def _load_page(self, i):
         if i >= self.n_pages():
             raise ValueError('page {} exceeds number of pages'.format(i))
 
         ind = (self.data_start
                + (i * self.PAGE_SIZE) + self.mini_header_length())
-        self._file.seek(ind)
-        data = np.fromfile(
-            self.file(),
-            dtype='<i2',
-            count=(self.PAGE_SIZE-self.mini_header_length())//2)
+        count = (self.PAGE_SIZE - self.mini_header_length()) // 2
+        count = min(count, (self.file_size() - ind) // 2)
+        # zero-copy, read-only view into the mapped file
+        data = np.frombuffer(self.mapped_file(),
+                             dtype='<i2',
+                             count=count,
+                             offset=ind)
         if i == self.n_pages()-1:
             stop_idx = consecutive_numbers(data, STOP_WITH_STRING_MARKER, 7)
             if stop_idx < len(data):
@@ -51,48 +65,28 @@ class LidDataFile(SensorDataFile):
     def page_times(self):
         if self._page_times:
             return self._page_times
-        page_start_times = []
-        for page_n in range(self.n_pages()):
-            time = self._mini_headers[page_n]['CLK']
-            page_time = datetime.strptime(time, '%Y-%m-%d %H:%M:%S')
-            epoch_time = epoch(page_time)
-            # The timestamp on all pages after the first have an
-            # extra second (permanent firmware bug)
-            if page_n > 0:
-                epoch_time -= 1
-            page_start_times.append(int(epoch_time))
-        self._page_times = page_start_times
+        page_start_times = self.page_index().times.copy()
+        # The timestamp on all pages after the first have an
+        # extra second (permanent firmware bug)
+        page_start_times[1:] -= 1
+        self._page_times = page_start_times.tolist()
         return self._page_times
 
     def page_voltages(self):
-        voltages = []
-        for page_n in range(self.n_pages()):
-            voltage_hex = self._mini_headers[page_n]['BAT']
-            voltages.append(int(voltage_hex, 16)/1000)
-        return voltages
-
-    def _read_mini_header(self, page):
-        file_position = self.file().tell()
-        self.file().seek(self.data_start + self.PAGE_SIZE * page)
-        header_string = self.file().read(self.mini_header_length())
-        self.file().seek(file_position)
-        header_string = header_string.decode('IBM437')
-        if not header_string.startswith('MHS'):
-            raise ValueError('MHS tag missing from mini-header')
-        header_string = header_string[5:-5]  # remove HDE\r\n and HDS\r\n
-        return parse_tags(header_string)
+        return self.page_index().voltages.tolist()
 
     def mini_header_length(self):
         if self._mini_header_length:
             return self._mini_header_length
-        file_position = self.file().tell()
-        self.file().seek(self.data_start)
-        this_line = self.file().readline().decode('IBM437')
-        if not this_line.startswith('MHS'):
+        first_page = self.mapped_file()[
+            self.data_start:self.data_start + self.PAGE_SIZE].tobytes()
+        if not first_page.startswith(b'MHS'):
             raise ValueError('MHS tag missing on first data page.')
-        while not this_line.startswith('MHE'):
-            this_line = self.file().readline().decode('IBM437')
-        end_pos = self._file.tell()
-        self.file().seek(file_position)
-        self._mini_header_length = end_pos-self.data_start
+        mhe = first_page.find(b'\nMHE')
+        if mhe == -1:
+            raise ValueError('MHE tag missing on first data page.')
+        end_of_line = first_page.find(b'\n', mhe + 1)
+        if end_of_line == -1:
+            end_of_line = len(first_page) - 1
+        self._mini_header_length = end_of_line + 1
         return self._mini_header_length
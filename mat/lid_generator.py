@@ -0,0 +1,249 @@
+"""
+Synthetic LID files of any size, for benchmarks and tests.
+
+A file has a header with a V3 (HSS) calibration, then 1 MiB data pages.
+Each page starts with a MHS mini-header holding the page CLK and BAT tags,
+followed by the samples of the enabled sensors. The samples are laid out
+by the same sample schedule the converter reads them with, so any sensor
+of AVAILABLE_SENSORS, interval and burst setting can be generated. The
+raw values are slowly varying signals with some noise, within the valid
+range of each sensor once converted.
+"""
+
+from datetime import datetime, timedelta
+from math import floor
+from mat.ascii85 import num_to_ascii85
+from mat.calibration_factories import DEFAULT_COEFFICIENTS
+from mat.header import Header
+from mat.lid_data_file import LidDataFile
+from mat.sensor import create_sensors, major_interval_info
+from mat.sensor_specification import AVAILABLE_SENSORS
+import numpy as np
+
+
+DATA_FILE_START = 0x8000
+# the sensors of a TCM current meter, sampled every 10 s in bursts of 8
+DEFAULT_TAGS = {'TMP': 1, 'ACL': 1, 'MGN': 1, 'PRS': 0, 'PHD': 0,
+                'TRI': 10, 'ORI': 10, 'BMR': 8, 'BMN': 8,
+                'PRR': 4, 'PRN': 4}
+DEFAULT_START_TIME = datetime(2020, 1, 1)
+# tags of the mini-header, in the order the logger writes them
+MINI_HEADER_TAGS = ['TMP', 'ACL', 'MGN', 'TRI', 'ORI', 'BMR', 'BMN',
+                    'BAT', 'PWC', 'STS', 'PRS', 'PHD', 'PRR', 'PRN',
+                    'DOS', 'DOP', 'DOT', 'WAT', 'DRI']
+ERASED = 0xff
+
+
+def lid_tags(tags=None):
+    """
+    DEFAULT_TAGS updated with tags. Sensors of AVAILABLE_SENSORS that
+    aren't mentioned are disabled.
+    """
+    all_tags = {s.enabled_tag: 0 for s in AVAILABLE_SENSORS}
+    all_tags.update(DEFAULT_TAGS)
+    all_tags.update(tags or {})
+    return all_tags
+
+
+def calibration_string(coefficients=None):
+    """
+    A V3 calibration block, 'HSSRVN13' then a 3 character tag and a 5
+    character ascii85 value per coefficient, then 'HSE'
+    """
+    if coefficients is None:
+        coefficients = {k: v for k, v in DEFAULT_COEFFICIENTS.items()
+                        if k != 'RVN'}
+    values = ''.join(tag + num_to_ascii85(value)
+                     for tag, value in coefficients.items())
+    return 'HSSRVN13' + values + 'HSE'
+
+
+def mini_header(tags, page_time, battery=3.7):
+    """
+    The mini-header of a page, all pages share the same layout
+    """
+    values = dict(tags, BAT='{:04x}'.format(round(battery * 1000)),
+                  PWC='0001', STS='0001')
+    lines = ['MHS', 'CLK ' + page_time.strftime('%Y-%m-%d %H:%M:%S')]
+    for tag in MINI_HEADER_TAGS:
+        if tag in values:
+            lines.append('{} {}'.format(tag, _tag_value(values[tag])))
+    lines.append('MHE')
+    return ('\r\n'.join(lines) + '\r\n').encode('IBM437')
+
+
+def _tag_value(value):
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def lid_header(tags, start_time, coefficients=None, serial='9999999'):
+    header = ('HDS\r\n'
+              'SER {}\r\n'
+              'FWV 1.8.32.5\r\n'
+              'DPL 1\r\n'
+              'DFS 0x{:04X}\r\n'
+              'STM 1970-01-01 00:00:00\r\n'
+              'ETM 4096-01-01 00:00:00\r\n'
+              'LED 1\r\n').format(serial, DATA_FILE_START).encode('IBM437')
+    header += mini_header(tags, start_time)
+    header += b'HDE\r\n' + calibration_string(coefficients).encode('IBM437')
+    if len(header) > DATA_FILE_START:
+        raise ValueError('Header too long')
+    return header.ljust(DATA_FILE_START, bytes([ERASED]))
+
+
+def page_seconds(tags):
+    """
+    The seconds of data in a page, a whole number of major intervals
+    """
+    header = _header(tags)
+    major_interval, n_bytes = major_interval_info(header)
+    mini_header_length = len(mini_header(tags, DEFAULT_START_TIME))
+    page_bytes = LidDataFile.PAGE_SIZE - mini_header_length
+    return floor(page_bytes / n_bytes) * major_interval
+
+
+def _header(tags):
+    header = Header('')
+    header._header = {k: v for k, v in tags.items()}
+    for tag in [s.enabled_tag for s in AVAILABLE_SENSORS]:
+        header._header[tag] = bool(tags.get(tag))
+    return header
+
+
+def write_lid_file(path,
+                   n_pages,
+                   tags=None,
+                   coefficients=None,
+                   start_time=DEFAULT_START_TIME,
+                   seed=0):
+    """
+    Write a LID file of n_pages full data pages. tags override
+    DEFAULT_TAGS, eg {'PRS': 1, 'BMN': 32}. Return the seconds per page.
+    """
+    tags = lid_tags(tags)
+    seconds = page_seconds(tags)
+    sensors = create_sensors(_header(tags), None, seconds)
+    n_samples = sum(len(s.sample_ind) for s in sensors)
+    rng = np.random.default_rng(seed)
+    with open(path, 'wb') as fid:
+        fid.write(lid_header(tags, start_time, coefficients))
+        for i in range(n_pages):
+            page_start = i * seconds
+            # CLK of every page after the first is one second late, like
+            # the logger firmware
+            clk = start_time + timedelta(seconds=page_start + (i > 0))
+            header = mini_header(tags, clk, 3.7 - 0.2 * i / max(n_pages, 1))
+            samples = np.zeros(n_samples, dtype='<i2')
+            for sensor in sensors:
+                time = sensor.full_sample_times()[::sensor.channels]
+                raw = raw_samples(sensor.name, page_start + time, rng)
+                samples[sensor.sample_ind] = raw.ravel(order='F')
+            page = np.full(LidDataFile.PAGE_SIZE, ERASED, dtype=np.uint8)
+            page[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+            data = samples.view(np.uint8)
+            page[len(header):len(header) + len(data)] = data
+            fid.write(page.tobytes())
+    return seconds
+
+
+def raw_samples(name, time, rng):
+    """
+    Raw values of a sensor at time (seconds from the start of the file),
+    one row per channel, as the logger stores them
+    """
+    signal = RAW_SIGNALS.get(name, _zeros)
+    return signal(np.asarray(time, dtype=np.float64), rng)
+
+
+def _noise(rng, n, scale):
+    return rng.normal(0, scale, n)
+
+
+def _zeros(time, rng):
+    return np.zeros((1, len(time)), dtype='<i2')
+
+
+def _temperature(time, rng):
+    # about 12 to 18 degrees C with the default thermistor calibration
+    raw = (40000 + 2000 * np.sin(2 * np.pi * time / 86400)
+           + _noise(rng, len(time), 10))
+    return _as_int16(raw, 0, 65535)[None, :]
+
+
+def _pressure(time, rng):
+    # a tide
+    raw = (3000 + 1000 * np.sin(2 * np.pi * time / 44712)
+           + _noise(rng, len(time), 5))
+    return _as_int16(raw, 0, 65535)[None, :]
+
+
+def _light(time, rng):
+    raw = 2000 + 1500 * np.sin(2 * np.pi * time / 86400)
+    return _as_int16(raw + _noise(rng, len(time), 20), 0, 4095)[None, :]
+
+
+def _accelerometer(time, rng):
+    # 1 g is 1024 counts, the meter tilts back and forth with the current
+    tilt = 0.3 + 0.25 * np.sin(2 * np.pi * time / 44712)
+    direction = 2 * np.pi * time / 3600
+    g = np.vstack([np.sin(tilt) * np.cos(direction),
+                   np.sin(tilt) * np.sin(direction),
+                   np.cos(tilt)]) * 1024
+    g += _noise(rng, g.size, 8).reshape(g.shape)
+    return _as_int16(g, -32768, 32767)
+
+
+def _magnetometer(time, rng):
+    heading = 2 * np.pi * time / 7200
+    field = np.vstack([400 * np.cos(heading),
+                       400 * np.sin(heading),
+                       np.full(len(time), -300.0)])
+    field += _noise(rng, field.size, 3).reshape(field.shape)
+    return _as_int16(field, -32768, 32767)
+
+
+def _bcd(values):
+    """
+    xx.xx values to two byte binary coded decimals
+    """
+    hundredths = np.clip(np.round(values * 100), 0, 9999).astype(np.int64)
+    digits = [hundredths // 10 ** i % 10 for i in range(4)]
+    raw = sum(d << (4 * i) for i, d in enumerate(digits))
+    return raw.astype(np.uint16).view('<i2')
+
+
+def _dissolved_oxygen(time, rng):
+    return _bcd(8 + np.sin(2 * np.pi * time / 86400)
+                + _noise(rng, len(time), 0.01))[None, :]
+
+
+def _dissolved_oxygen_percentage(time, rng):
+    return _bcd(90 + 5 * np.sin(2 * np.pi * time / 86400))[None, :]
+
+
+def _dissolved_oxygen_temperature(time, rng):
+    return _bcd(15 + 5 * np.sin(2 * np.pi * time / 86400))[None, :]
+
+
+def _water_detect(time, rng):
+    # millivolts, 3000 is 100% water
+    return _as_int16(np.full(len(time), 2900.0), 0, 3000)[None, :]
+
+
+def _as_int16(raw, low, high):
+    raw = np.clip(np.round(raw), low, high).astype(np.int64)
+    return raw.astype(np.uint16 if low >= 0 else np.int16).view('<i2')
+
+
+RAW_SIGNALS = {'Temperature': _temperature,
+               'Pressure': _pressure,
+               'Light': _light,
+               'Accelerometer': _accelerometer,
+               'Magnetometer': _magnetometer,
+               'DissolvedOxygen': _dissolved_oxygen,
+               'DissolvedOxygenPercentage': _dissolved_oxygen_percentage,
+               'DissolvedOxygenTemperature': _dissolved_oxygen_temperature,
+               'WaterDetect': _water_detect}
@@ -0,0 +1,173 @@
+"""
+Index of the mini-headers found at the start of every LID data page.
+
+All mini-headers are gathered from the memory-mapped file in one pass and
+their CLK and BAT tags are decoded in bulk into NumPy arrays. The index can
+optionally be saved next to the data file as a small sidecar, keyed by the
+file size and modification time, so reopening the same file skips the scan.
+"""
+
+import os
+from datetime import datetime
+from math import ceil
+import numpy as np
+from mat.utils import parse_tags, epoch
+
+
+SIDECAR_SUFFIX = '.idx'
+SIDECAR_VERSION = 1
+CLK_LENGTH = len('2018-05-25 08:27:07')
+BAT_LENGTH = len('0e5e')
+MHS_TAG = np.frombuffer(b'MHS', dtype=np.uint8)
+
+_HEX_VALUES = np.full(256, -1, dtype=np.int64)
+_HEX_VALUES[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_HEX_VALUES[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_VALUES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+
+class PageIndex:
+    """
+    times are the page CLK tags in epoch seconds, exactly as written by the
+    logger. voltages are the page BAT tags in volts.
+    """
+    def __init__(self, times, voltages, ideal_n_pages, mini_header_length):
+        self.times = times
+        self.voltages = voltages
+        self.ideal_n_pages = ideal_n_pages
+        self.mini_header_length = mini_header_length
+
+    @property
+    def n_pages(self):
+        return len(self.times)
+
+    @property
+    def header_error(self):
+        if self.n_pages < self.ideal_n_pages:
+            return self.n_pages, self.ideal_n_pages
+        return None
+
+
+def scan_page_index(mapped_file, data_start, page_size, mini_header_length):
+    """
+    Build a PageIndex from a uint8 memory map of a LID file. Pages are
+    indexed up to the first one without a readable mini-header.
+    """
+    ideal_n_pages = ceil((len(mapped_file) - data_start) / page_size)
+    starts = data_start + page_size * np.arange(ideal_n_pages)
+    starts = starts[starts + mini_header_length <= len(mapped_file)]
+    blocks = mapped_file[starts[:, None] + np.arange(mini_header_length)]
+    has_mhs = np.all(blocks[:, :len(MHS_TAG)] == MHS_TAG, axis=1)
+    if not np.all(has_mhs):
+        blocks = blocks[:np.argmin(has_mhs)]
+    try:
+        times, voltages = _decode_blocks(blocks)
+    except ValueError:
+        times, voltages = _decode_rows(blocks)
+    return PageIndex(times, voltages, ideal_n_pages, mini_header_length)
+
+
+def _decode_blocks(blocks):
+    """
+    Decode CLK and BAT for all mini-headers at once. All mini-headers in a
+    file share the same layout, so the tag columns of the first one are
+    used for every row. Raise ValueError if any row disagrees.
+    """
+    if len(blocks) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+    first = blocks[0].tobytes()
+    clk = _value_column(first, b'CLK', CLK_LENGTH)
+    bat = _value_column(first, b'BAT', BAT_LENGTH)
+    for tag, column, length in [(b'CLK ', clk, CLK_LENGTH),
+                                (b'BAT ', bat, BAT_LENGTH)]:
+        _check_column(blocks, column - len(tag), tag)
+        _check_column(blocks, column + length, b'\r\n')
+
+    clk_text = np.ascontiguousarray(blocks[:, clk:clk + CLK_LENGTH])
+    clk_text = clk_text.view('S{}'.format(CLK_LENGTH))[:, 0]
+    times = clk_text.astype('U').astype('datetime64[s]').astype(np.int64)
+
+    hex_digits = _HEX_VALUES[blocks[:, bat:bat + BAT_LENGTH]]
+    if np.any(hex_digits < 0):
+        raise ValueError('BAT tag is not hexadecimal')
+    millivolts = hex_digits @ (16 ** np.arange(BAT_LENGTH - 1, -1, -1))
+    return times, millivolts / 1000
+
+
+def _value_column(mini_header, tag, length):
+    column = mini_header.find(b'\r\n' + tag + b' ')
+    if column == -1:
+        raise ValueError('{} tag missing from mini-header'.format(tag))
+    return column + len(tag) + 3
+
+
+def _check_column(blocks, column, expected):
+    expected = np.frombuffer(expected, dtype=np.uint8)
+    if not np.all(blocks[:, column:column + len(expected)] == expected):
+        raise ValueError('mini-headers do not share the same layout')
+
+
+def _decode_rows(blocks):
+    """
+    One mini-header at a time, stopping at the first that can't be parsed.
+    """
+    times, voltages = [], []
+    for row in blocks:
+        header_string = row.tobytes().decode('IBM437')
+        try:
+            # remove MHS\r\n and MHE\r\n
+            tags = parse_tags(header_string[5:-5])
+            page_time = datetime.strptime(tags['CLK'], '%Y-%m-%d %H:%M:%S')
+            voltage = int(tags['BAT'], 16) / 1000
+        except (ValueError, KeyError):
+            break
+        times.append(int(epoch(page_time)))
+        voltages.append(voltage)
+    return (np.array(times, dtype=np.int64),
+            np.array(voltages, dtype=np.float64))
+
+
+def sidecar_path(file_path):
+    return str(file_path) + SIDECAR_SUFFIX
+
+
+def load_sidecar(file_path):
+    """
+    Return the PageIndex saved for file_path, or None if there is no
+    sidecar or it was written for a different version of the file.
+    """
+    try:
+        stat = os.stat(file_path)
+        with np.load(sidecar_path(file_path)) as sidecar:
+            if (sidecar['version'] != SIDECAR_VERSION
+                    or sidecar['file_size'] != stat.st_size
+                    or sidecar['mtime_ns'] != stat.st_mtime_ns):
+                return None
+            return PageIndex(sidecar['times'],
+                             sidecar['voltages'],
+                             int(sidecar['ideal_n_pages']),
+                             int(sidecar['mini_header_length']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_sidecar(file_path, page_index):
+    """
+    Saving is best effort, a read-only download folder is not an error.
+    """
+    path = sidecar_path(file_path)
+    tmp_path = path + '.tmp'
+    try:
+        stat = os.stat(file_path)
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     version=SIDECAR_VERSION,
+                     file_size=stat.st_size,
+                     mtime_ns=stat.st_mtime_ns,
+                     times=page_index.times,
+                     voltages=page_index.voltages,
+                     ideal_n_pages=page_index.ideal_n_pages,
+                     mini_header_length=page_index.mini_header_length)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
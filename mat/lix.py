@@ -1,3 +1,4 @@
+import mmap
 import os
 import socket
 from abc import abstractmethod, ABC
@@ -8,10 +9,14 @@ import datetime
 from datetime import timezone
 import traceback
 from functools import lru_cache
+import numpy as np
 
+from mat.column_statistics import (battery_trend, ColumnStatistics,
+                                   file_report)
+from mat.columnar_file import columnar_file_factory
 from mat.ddh import STATE_DDS_LID_CONVERT_PROGRESS, DDH_GUI_UDP_PORT
 from mat.pressure import Pressure
-from mat.temperature import Temperature
+from mat.temperature import MAX_INT16, Temperature, ZERO_KELVIN
 
 
 # --------------------------------------------
@@ -23,6 +28,10 @@ LID_FILE_UNK = 0
 LID_FILE_V1 = 1
 LID_FILE_V2 = 2
 
+# first bytes of LIX files, the ones of loggers with an old header too
+LIX_FILE_TYPES = (b'DO1', b'DO2', b'TDO', b'CTD')
+OLD_LIX_FILE_TYPES = (b'PRF', b'TAP')
+
 
 # size of a LIX file chunk and alternative shorter name
 LEN_LIX_FILE_CHUNK = 256
@@ -32,12 +41,26 @@ CS = LEN_LIX_FILE_CHUNK
 LEN_LIX_FILE_MICRO_HEADER = 8
 UHS = LEN_LIX_FILE_MICRO_HEADER
 
+# a micro-header: battery in mV, header index (from 1), padding count
+# (ECL) and time relative to the macro-header start
+MICRO_HEADER_DTYPE = np.dtype([('bat', '>u2'),
+                               ('idx', 'u1'),
+                               ('ecl', 'u1'),
+                               ('rt', '>u4')])
+
 
 # length in lix file that we reserve to store compressed CF_AREA
 LEN_LIX_FILE_CONTEXT = 64
 LEN_LIX_FILE_CONTEXT_V3 = 48
 
 
+# rows per row group in columnar output files
+COLUMNAR_BLOCK_ROWS = 65536
+
+# rows formatted and written at once in CSV output files
+CSV_BLOCK_ROWS = 65536
+
+
 g_verbose = True
 
 
@@ -57,6 +80,14 @@ class LixFileConverterT:
         # _p(f'raw T {raw_temperature} converted T {self.cnv.convert(raw_temperature)}')
         return self.cnv.convert(raw_temperature)
 
+    def convert_column(self, raw_temperature):
+        # a whole array at once, not cached
+        raw_temperature = np.asarray(raw_temperature)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = self.cnv.convert(raw_temperature)
+        # what convert() returns on ZeroDivisionError
+        return np.where(raw_temperature == MAX_INT16, ZERO_KELVIN, t)
+
 
 class LixFileConverterP:
     def __init__(self, a, b):
@@ -71,6 +102,10 @@ class LixFileConverterP:
     def convert(self, raw_pressure):
         return self.cnv.convert(raw_pressure)
 
+    def convert_column(self, raw_pressure):
+        # a whole array at once, not cached
+        return self.cnv.convert(np.asarray(raw_pressure))
+
 
 def id_lid_file_flavor(fp):
     """
@@ -84,20 +119,14 @@ def id_lid_file_flavor(fp):
 
     try:
         with open(fp, 'rb') as f:
-            # ft: file type
-            bb = f.read()
-            ft = bb[:3]
+            # ft: file type, the rest of the file is not needed
+            ft = f.read(3)
 
-            # pr: parser
-            if ft in (b'DO1', b'DO2', b'TDO', b'CTD'):
-                return LID_FILE_V2
-            elif ft in (b'PRF', b'TAP'):
+            if ft in OLD_LIX_FILE_TYPES:
                 print('**************************************')
                 print('ft LOGGER HEADER IS OLD, REFLASH IT ->', ft)
                 print('**************************************')
-                return LID_FILE_V2
-            else:
-                return LID_FILE_V1
+            return lid_file_flavor(ft)
 
     except (Exception,) as ex:
         traceback.print_exc()
@@ -105,6 +134,16 @@ def id_lid_file_flavor(fp):
         return LID_FILE_UNK
 
 
+def lid_file_flavor(ft):
+    """
+    :param ft: the first 3 bytes of a .lid file
+    :return: LID_FILE_V2 for LIX files, LID_FILE_V1 otherwise
+    """
+    if ft in LIX_FILE_TYPES or ft in OLD_LIX_FILE_TYPES:
+        return LID_FILE_V2
+    return LID_FILE_V1
+
+
 def lid_file_v2_has_sensor_data_type(fp, suf):
     if not fp.endswith('.lid'):
         return 0
@@ -112,8 +151,7 @@ def lid_file_v2_has_sensor_data_type(fp, suf):
     try:
         with open(fp, 'rb') as f:
             # ft: file type
-            bb = f.read()
-            ft = bb[:3]
+            ft = f.read(3)
 
             if suf == "_DissolvedOxygen" and ft in (b'DO1', b'DO2'):
                 return 1
@@ -234,8 +272,13 @@ def _seconds_between_two_time_str(a, b, fmt='%Y-%m-%dT%H:%M:%S.000'):
 
 
 class ParserLixFile(ABC):
+    # appended to the file name, without extension, to name the output
+    output_suffix = ''
+
     def __init__(self, file_path):
         self.file_path = file_path
+        # rows in the last columnar file created
+        self.n_rows = 0
         # all file bytes
         self.bb = bytes()
         # meta-data calculated at beginning
@@ -268,12 +311,29 @@ class ParserLixFile(ABC):
         )
         # dictionary measurements
         self.d_mm = dict()
-        # dictionary micro-headers
-        self.d_uh = dict()
+        # micro-headers, MICRO_HEADER_DTYPE array, and the positions of
+        # the ones with an unexpected header index
+        self.uh = np.zeros(0, dtype=MICRO_HEADER_DTYPE)
+        self.uh_anomalies = np.zeros(0, dtype=np.int64)
 
     def _load_file_bytes(self):
+        # memory mapped, _parse_data makes the only copy of the data
         with open(self.file_path, 'rb') as f:
-            self.bb = f.read()
+            self.bb = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_file_bytes(self):
+        # parsed values are copies, nothing refers to the mapping anymore
+        if isinstance(self.bb, mmap.mmap):
+            lix_close(self.bb)
+
+    def _load_and_parse(self):
+        self._load_file_bytes()
+        try:
+            self._get_file_length()
+            self._parse_macro_header()
+            self._parse_data()
+        finally:
+            self._close_file_bytes()
 
     def _get_file_length(self):
         # n: number of file chunks
@@ -317,84 +377,224 @@ class ParserLixFile(ABC):
         pass
 
     @abstractmethod
-    def _parse_data_mm(self, mm, i, t):
+    def _columnar_header(self):
+        # list of (column name, dtype), time in ms first
+        pass
+
+    @abstractmethod
+    def _columnar_columns(self):
+        # arrays matching _columnar_header()
         pass
 
-    def _parse_data_micro_headers(self, uh, i):
-        # 2B battery, 1B header index, 1B ECL, 4B epoch
-        bat = int.from_bytes(uh[i:i + 2], "big")
-        idx = uh[i + 2]
-        # warning to detect file is saved OK, idx start at 1
-        bn_uh = (idx - 1) % 256
-        bn_ex = (i / 8) % 256
-        if bn_uh != bn_ex:
+    def _create_columnar_file(self, output_format):
+        path_prefix = self.file_path[:-4] + self.output_suffix
+        f = columnar_file_factory(path_prefix,
+                                  self._columnar_header(),
+                                  output_format)
+        try:
+            for block in self._column_blocks():
+                f.write(block)
+        finally:
+            f.close()
+        self.n_rows = f.rows
+        _p(f'file converted {f.path}')
+        return f.path
+
+    def _column_blocks(self):
+        # _columnar_columns() by slices of up to COLUMNAR_BLOCK_ROWS rows
+        columns = self._columnar_columns()
+        for i in range(0, len(columns[0]), COLUMNAR_BLOCK_ROWS):
+            yield [c[i:i + COLUMNAR_BLOCK_ROWS] for c in columns]
+
+    def _statistics(self):
+        columns = [name for name, _ in self._columnar_header()[1:]]
+        statistics = ColumnStatistics(columns)
+        for block in self._column_blocks():
+            # time in ms first
+            statistics.add(np.array(block[1:], dtype=np.float64),
+                           block[0] / 1000)
+        self.n_rows = statistics.rows
+        return statistics
+
+    def _battery(self):
+        return battery_trend(*self.battery_table())
+
+    def battery_table(self):
+        # epoch seconds and volts of each data chunk, once parsed, as
+        # mat.data_converter.write_voltage_file takes them
+        start = lix_mah_time_utc_epoch(self.mah.timestamp)
+        return start + self.uh['rt'].astype(np.int64), self.uh['bat'] / 1000
+
+    def _parse_data_micro_headers(self, uh):
+        # uh: the micro-headers of all data chunks, (n, UHS) uint8
+        self.uh = lix_micro_headers(uh)
+        self.uh_anomalies = lix_micro_header_anomalies(self.uh)
+        _p(f"\n\tMICRO headers \t|  {len(self.uh)} detected")
+        if len(self.uh):
+            bat = self.uh['bat']
+            _p(f"\tbattery level \t|  {bat[0]} to {bat[-1]} mV")
+            _p(f"\trelative time \t|  {self.uh['rt'][-1]}")
+        if len(self.uh_anomalies):
+            # warning to detect file is saved OK, we no longer exit here
+            i = self.uh_anomalies[0]
             _p(f"*********************")
-            _p(f"warning: micro_header index {bn_uh} vs. expected {bn_ex}")
+            _p(f"warning: {len(self.uh_anomalies)} micro_header indexes "
+               f"not as expected, first at #{i} "
+               f"index {self.uh['idx'][i]} vs. expected {(i + 1) % 256}")
             _p(f"*********************")
-            # we no longer exit here
-            # sys.exit(1)
-
-        ecl = uh[i + 3]
-        rt = int.from_bytes(uh[i + 4:i + 8], "big")
-        _p(f"\n\tMICRO header \t|  detected")
-        _p("\tbattery level \t|  0x{:04x} = {} mV".format(bat, bat))
-        _p("\theader index  \t|  0x{:02x} = {}".format(idx, idx))
-        _p("\tpadding count \t|  0x{:02x} = {}".format(ecl, ecl))
-        _p("\trelative time \t|  0x{:08x} = {}".format(rt, rt))
-        self.d_uh[rt] = {"bat": bat, "idx": idx, "ecl": ecl}
 
     def _parse_data(self):
 
-        # skip macro-header
-        data = self.bb[:self.len_file]
-        data = data[CS:]
+        # skip macro-header, only the last chunk is padded
+        data = lix_chunks(self.bb)[1:]
+        padding = np.zeros(len(data), dtype=np.int64)
+        if len(data):
+            padding[-1] = len(data) * (CS - UHS) - self.len_mm
 
-        # prepare buffers measurement and microheaders
-        mm = bytes()
-        uh = bytes()
-
-        # n: number of chunks
-        # iterate to build micro_headers and measurements byte arrays
-        n = ceil(len(data) / CS)
-        for i in range(0, CS * n, CS):
-            uh += data[i:i+UHS]
-            mm += data[i+UHS:i+CS]
+        # build measurements byte array
+        mm = lix_data_bytes(data, padding)
 
         # -------------------------------
-        # parse dictionary micro_headers
+        # parse micro_headers
         # -------------------------------
-        for i in range(0, len(uh), UHS):
-            self._parse_data_micro_headers(uh, i)
+        self._parse_data_micro_headers(data[:, :UHS])
 
         # debug, only up to micro-headers
         # sys.exit(0)
 
-        # -----------------------------------
-        # parse dictionary data measurements
-        # -----------------------------------
-        i = 0
-        ta = 0
-        print('i vs len_mm', i, self.len_mm)
-        while i < self.len_mm:
-            i, t = self._parse_data_mm(mm, i, ta)
-            if i == -1:
-                break
-            ta += t
-
-            # communicate to GUI
-            # removed, this seemed to stressful
-            # _emit_conversion_progress(i, self.len_mm, self.file_path)
-
-    def convert(self, verbose=False):
+        self._parse_measurements(mm)
+
+    @abstractmethod
+    def _parse_measurements(self, mm):
+        # mm: the measurement bytes, micro-headers and padding left out
+        pass
+
+    def convert(self, verbose=False, output_format='csv'):
         # normally called by convert_lix_file() from lix_pr.py
+        # output_format: 'csv' or one of the columnar formats
         global g_verbose
         g_verbose = verbose
-        print(f'debug, convert verbose = {g_verbose}')
-        self._load_file_bytes()
-        self._get_file_length()
-        self._parse_macro_header()
-        self._parse_data()
-        self._create_csv_file()
+        _p(f'debug, convert verbose = {g_verbose}')
+        self._load_and_parse()
+        if output_format != 'csv':
+            return self._create_columnar_file(output_format)
+        return self._create_csv_file()
+
+    def summarize(self, verbose=False):
+        # quick-look statistics as a dict, nothing is written
+        global g_verbose
+        g_verbose = verbose
+        self._load_and_parse()
+        stream = self.output_suffix.lstrip('_')
+        return file_report(self.file_path,
+                           {stream: self._statistics()},
+                           self._battery())
+
+
+def lix_close(bb):
+    """
+    Closes the memory mapping of a LIX file. After a parse error, the views
+    of it in the traceback keep it open until they are freed, so the parse
+    error is raised rather than a BufferError.
+    """
+    try:
+        bb.close()
+    except BufferError:
+        pass
+
+
+def lix_chunks(bb):
+    """
+    The bytes of a LIX file, bytes or mmap, as a (n_chunks, CS) uint8 array.
+    It is a view of bb when the file is whole chunks long.
+    """
+    a = np.frombuffer(bb, dtype=np.uint8)
+    n = ceil(len(a) / CS)
+    if len(a) == n * CS:
+        return a.reshape(n, CS)
+    chunks = np.zeros((n, CS), dtype=np.uint8)
+    chunks.reshape(-1)[:len(a)] = a
+    return chunks
+
+
+def lix_data_bytes(chunks, padding):
+    """
+    The measurements of data chunks, micro-headers and padding bytes left
+    out, as one bytearray. padding is the count of padding bytes at the end
+    of each chunk. The bytearray is the only copy made.
+    """
+    n, width = len(chunks), CS - UHS
+    if n == 0:
+        return bytearray()
+    lengths = (width - np.minimum(padding, width)).astype(np.int64)
+    mm = bytearray(n * width)
+    out = np.frombuffer(mm, dtype=np.uint8)
+    out.reshape(n, width)[:] = chunks[:, UHS:]
+    # usually only the last chunk is padded, otherwise compact the data
+    padded = np.flatnonzero(lengths[:-1] < width)
+    first = padded[0] if len(padded) else n - 1
+    end = first * width + lengths[first]
+    for i in range(first + 1, n):
+        out[end:end + lengths[i]] = out[i * width:i * width + lengths[i]]
+        end += lengths[i]
+    # the bytearray can't be resized while viewed
+    del out
+    del mm[end:]
+    return mm
+
+
+def lix_micro_headers(uh):
+    """
+    Micro-headers, a (n, UHS) uint8 array, as a MICRO_HEADER_DTYPE array.
+    Always a copy, uh may be a view of the file mapping
+    """
+    uh = np.array(uh, dtype=np.uint8, order='C')
+    return uh.view(MICRO_HEADER_DTYPE).reshape(-1)
+
+
+def lix_micro_header_anomalies(uh):
+    """
+    The positions of the micro-headers whose index doesn't follow, the
+    index of the micro-header at position i should be (i + 1) % 256
+    """
+    expected = np.arange(1, len(uh) + 1) % 256
+    return np.flatnonzero(uh['idx'] != expected)
+
+
+def lix_csv_times(seconds, milliseconds=0):
+    """
+    ISO 8601 times, to the millisecond and without the trailing Z, of arrays
+    of epoch seconds and of milliseconds to add to them
+    """
+    t = (np.asarray(seconds, dtype=np.int64).astype('datetime64[s]')
+         + np.asarray(milliseconds, dtype=np.int64).astype('timedelta64[ms]'))
+    return np.datetime_as_string(t, unit='ms')
+
+
+def lix_nan_rows(columns):
+    """
+    The count of rows with a NaN in any floating point column
+    """
+    nan = np.zeros(len(columns[0]), dtype=bool)
+    for c in columns:
+        if c.dtype.kind == 'f':
+            nan |= np.isnan(c)
+    return int(np.count_nonzero(nan))
+
+
+def write_lix_csv(csv_path, header, row_format, columns):
+    """
+    Writes a CSV file, CSV_BLOCK_ROWS rows at a time. columns are arrays of
+    the same length, row_format the str.format() of one row of them.
+    """
+    n_nan = lix_nan_rows(columns)
+    if n_nan:
+        _p(f'*** detected nan in {n_nan} rows')
+    with open(csv_path, 'w') as f:
+        f.write(header)
+        for i in range(0, len(columns[0]), CSV_BLOCK_ROWS):
+            block = [c[i:i + CSV_BLOCK_ROWS].tolist() for c in columns]
+            f.write(''.join(map(row_format.format, *block)))
 
 
 def _emit_conversion_progress(i, size, name):
@@ -1,8 +1,10 @@
 import sys
-from datetime import datetime
+import numpy as np
+from mat.columnar_file import TIME_COLUMN
 from mat.lix import (ParserLixFile, CS,
                      LEN_LIX_FILE_CONTEXT, _p,
-                     lix_mah_time_to_str, lix_mah_time_utc_epoch, LEN_LIX_FILE_CONTEXT_V3)
+                     lix_mah_time_to_str, lix_mah_time_utc_epoch,
+                     LEN_LIX_FILE_CONTEXT_V3, lix_csv_times, write_lix_csv)
 
 
 LEN_LIX_FILE_CC_AREA = 5
@@ -18,13 +20,20 @@ def do16_to_float(d):
     return f
 
 
+def do16_column_to_float(d):
+    # d: array of values such as 0x8003
+    f = (d & 0x7FFF) * 0.01
+    return np.where(d & 0x8000, -f, f)
+
+
 def is_a_do2_file(p):
     with open(p, 'rb') as f:
-        b = f.read()
-        return b[:3] == b'DO2'
+        return f.read(3) == b'DO2'
 
 
 class ParserLixDoxFile(ParserLixFile):
+    output_suffix = '_DissolvedOxygen'
+
     def __init__(self, file_path):
         super().__init__(file_path)
 
@@ -61,6 +70,23 @@ class ParserLixDoxFile(ParserLixFile):
 
 
 
+    def _parse_measurements(self, mm):
+        # -----------------------------------
+        # parse dictionary data measurements
+        # -----------------------------------
+        i = 0
+        ta = 0
+        _p(f'i vs len_mm {i} {self.len_mm}')
+        while i < self.len_mm:
+            i, t = self._parse_data_mm(mm, i, ta)
+            if i == -1:
+                break
+            ta += t
+
+            # communicate to GUI
+            # removed, this seemed to stressful
+            # _emit_conversion_progress(i, self.len_mm, self.file_path)
+
     def _parse_data_mm(self, mm, i, _):
         # DOX loggers they don't use mask
         _p(f"\n\tmeasurement #   |  {self.mm_i}")
@@ -86,46 +112,52 @@ class ParserLixDoxFile(ParserLixFile):
         is_do2 = self.mah.file_type.decode() == 'DO2'
 
         # CSV file header
-        csv_path = (self.file_path[:-4] + '_DissolvedOxygen.csv')
-        f_csv = open(csv_path, 'w')
+        csv_path = (self.file_path[:-4] + self.output_suffix + '.csv')
         cols = 'ISO 8601 Time,' \
                'Dissolved Oxygen (mg/l),Dissolved Oxygen (%),' \
                'DO Temperature (C)\n'
         if is_do2:
             cols = cols.replace('\n', ',Water Detect (%)\n')
-        f_csv.write(cols)
-
-        # ct: cumulative time
-        for t, m in self.d_mm.items():
-            # m : b'\x80\x03\x80(\x07\x04\x00\x11'
-            # m = dos -0.04 dop -0.40 dot 17.97
-            dos = do16_to_float(int.from_bytes(m[0:2], "big"))
-            dop = do16_to_float(int.from_bytes(m[2:4], "big"))
-            dot = do16_to_float(int.from_bytes(m[4:6], "big"))
-            wat = 0
-            if is_do2:
-                # wat is directly in mV
-                wat = int.from_bytes(m[6:8], "big")
-                wat = int((wat / 3000) * 100)
-
-            # calculate times
-            str_t = datetime.utcfromtimestamp(t).isoformat() + ".000Z"
-
-            # only two decimals
-            dos = '{:.2f}'.format(dos)
-            dop = '{:.2f}'.format(dop)
-            dot = '{:.2f}'.format(dot)
-            wat = '{:.2f}'.format(wat) if is_do2 else ''
-            if is_do2:
-                s = f'{str_t},{dos},{dop},{dot},{wat}\n'
-            else:
-                s = f'{str_t},{dos},{dop},{dot}\n'
-
-            f_csv.write(s)
-
-        # close the file
-        f_csv.close()
+
+        # only two decimals, wat is only in DO2 files
+        columns = self._columns()
+        row = '{}Z,{:.2f},{:.2f},{:.2f}\n'
+        if is_do2:
+            row = '{}Z,{:.2f},{:.2f},{:.2f},{:.2f}\n'
+        write_lix_csv(csv_path, cols, row,
+                      [lix_csv_times(columns[0])] + columns[1:])
 
         # return the name of the file
         _p(f'file converted {csv_path}')
         return csv_path
+
+    def _columnar_header(self):
+        cols = [(TIME_COLUMN, 'int64'),
+                ('Dissolved Oxygen (mg/l)', 'float64'),
+                ('Dissolved Oxygen (%)', 'float64'),
+                ('DO Temperature (C)', 'float64')]
+        if self.mah.file_type.decode() == 'DO2':
+            cols.append(('Water Detect (%)', 'float64'))
+        return cols
+
+    def _columns(self):
+        # t, dos, dop, dot and, for DO2 files, wat arrays of the measurements
+        is_do2 = self.mah.file_type.decode() == 'DO2'
+        n = 8 if is_do2 else 6
+        mm = b''.join(self.d_mm.values())
+        # a measurement cut by the end of the file is left out
+        k = len(mm) // n
+        words = np.frombuffer(mm, dtype='>u2', count=k * n // 2)
+        words = words.reshape(k, n // 2).astype(np.int64)
+        t = np.array(list(self.d_mm), dtype=np.int64)[:k]
+        # m = dos -0.04 dop -0.40 dot 17.97
+        columns = [t] + [do16_column_to_float(words[:, i]) for i in range(3)]
+        if is_do2:
+            # wat is directly in mV
+            columns.append(((words[:, 3] / 3000) * 100).astype(np.int64))
+        return columns
+
+    def _columnar_columns(self):
+        columns = self._columns()
+        columns[0] = columns[0] * 1000
+        return columns
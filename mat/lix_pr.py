@@ -1,9 +1,8 @@
 import sys
 import traceback
 
+from mat.file_format import sniff_file, TDO_PARSERS
 from mat.lix_dox import ParserLixDoxFile
-from mat.lix_tdo_v3 import ParserLixTdoFileV3
-from mat.lix_tdo_v4 import ParserLixTdoFileV4
 
 
 # ---------------------------
@@ -13,36 +12,29 @@ from mat.lix_tdo_v4 import ParserLixTdoFileV4
 
 def get_tdo_parser(rvn):
     # rvn: 52
-    rvn = chr(rvn)
-    if rvn == '3':
-        return ParserLixTdoFileV3
-    elif rvn == '4':
-        return ParserLixTdoFileV4
+    return TDO_PARSERS.get(chr(rvn))
 
 
+def get_lix_parser(fp, more_columns=0):
+    # fp: absolute file_path, routed by its sniffed macro-header
+    ff = sniff_file(fp)
 
+    # pr: parser
+    pr = ff.parser
+    if pr is ParserLixDoxFile:
+        return pr(fp)
+    if pr not in TDO_PARSERS.values():
+        raise ValueError(f'unknown LIX file revision {ff.rvn}')
+    return pr(fp, more_columns)
 
-def convert_lix_file(fp, more_columns=0, verbose=0):
+
+def convert_lix_file(fp, more_columns=0, verbose=0, output_format='csv'):
     # fp: absolute file_path
+    # output_format: 'csv', 'parquet' or 'npy'
     try:
-        with open(fp, 'rb') as f:
-            # ft: file type
-            bb = f.read()
-
-            print('bb', len(bb))
-
-            ft = bb[:3]
-
-            # pr: parser
-            if ft in (b'DO1', b'DO2'):
-                pr = ParserLixDoxFile
-                pr = pr(fp)
-            else:
-                rvn_scc = bb[17]
-                pr = get_tdo_parser(rvn_scc)
-                pr = pr(fp, more_columns)
-            pr.convert(verbose=verbose)
-            return 0
+        pr = get_lix_parser(fp, more_columns)
+        pr.convert(verbose=verbose, output_format=output_format)
+        return 0
 
     except (Exception, ) as ex:
         traceback.print_exc()
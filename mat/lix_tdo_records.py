@@ -0,0 +1,113 @@
+"""
+Decoding of the measurements of TDO LIX files, in two passes.
+
+A measurement is a time mask then the sensor data. The mask is 1 byte, or
+2 when MASK_TIME_EXTENDED is set, its low 6 (or 14) bits are the seconds
+since the previous measurement. The sensor data is the temperature, spn
+pressure samples and Ax, Ay, Az, 2 bytes big-endian each.
+
+The first pass only walks the masks to find where the sensor data of each
+measurement starts. The second one reads every sensor value at these
+offsets at once, into columnar arrays.
+"""
+
+from collections import namedtuple
+import numpy as np
+from mat.lix import _p
+
+
+# marks if 1 or 2 bytes of time
+MASK_TIME_EXTENDED = 0x40
+
+LEN_BYTES_T = 2
+LEN_BYTES_A = 6
+
+# old files ended poorly (firmware v4.1.23) are followed by zeros
+ZERO_RUN = bytes(5)
+
+
+# time: seconds since the start of the file
+# temperature: raw ADC counts
+# pressure: raw ADC counts, one row per measurement and spn columns
+# ax, ay, az: signed accelerometer counts
+TdoRecords = namedtuple('TdoRecords', [
+    'time',
+    'temperature',
+    'pressure',
+    'ax',
+    'ay',
+    'az']
+)
+
+
+def decode_tdo_records(mm, spn):
+    """
+    The TdoRecords of the measurement bytes mm. Like the measurement dict
+    the parsers used to fill, a measurement with the same time as the
+    previous one replaces it.
+    """
+    n = 2 * spn + LEN_BYTES_T + LEN_BYTES_A
+    offsets, time = scan_tdo_records(mm, n)
+    # a measurement cut by the end of the file is left out
+    complete = offsets + n <= len(mm)
+    offsets, time = offsets[complete], time[complete]
+    last_of_time = np.append(time[1:] != time[:-1], True)
+    offsets, time = offsets[last_of_time], time[last_of_time]
+    return gather_tdo_records(mm, offsets, time, spn)
+
+
+def scan_tdo_records(mm, n):
+    """
+    First pass, the offsets of the sensor data of the measurements, n
+    bytes long, and their time. Stops at the end of mm or at a run of zeros.
+    """
+    offsets = []
+    times = []
+    i = 0
+    ta = 0
+    len_mm = len(mm)
+    while i < len_mm:
+        b = mm[i]
+        if b == 0 and mm[i:i + len(ZERO_RUN)] == ZERO_RUN:
+            xc = (i / len_mm) * 100
+            _p(f'warning: stopped LID file parsing at {xc} % '
+               f'because string of zeros')
+            break
+        if b & MASK_TIME_EXTENDED:
+            ta += ((b & 0x3F) << 8) + mm[i + 1]
+            i += 2
+        else:
+            ta += b & 0x3F
+            i += 1
+        offsets.append(i)
+        times.append(ta)
+        i += n
+    return (np.array(offsets, dtype=np.int64),
+            np.array(times, dtype=np.int64))
+
+
+def gather_tdo_records(mm, offsets, time, spn):
+    """
+    Second pass, every sensor value of the measurements at offsets
+    """
+    data = np.frombuffer(mm, dtype=np.uint8)
+    pressure = np.empty((len(offsets), spn), dtype=np.int64)
+    for i in range(spn):
+        pressure[:, i] = _word(data, offsets + LEN_BYTES_T + 2 * i)
+    accelerometer = offsets + LEN_BYTES_T + 2 * spn
+    return TdoRecords(time,
+                      _word(data, offsets),
+                      pressure,
+                      _signed(_word(data, accelerometer)),
+                      _signed(_word(data, accelerometer + 2)),
+                      _signed(_word(data, accelerometer + 4)))
+
+
+def _word(data, offsets):
+    # 2 bytes big-endian at each offset
+    return (data[offsets].astype(np.int64) << 8) | data[offsets + 1]
+
+
+def _signed(words):
+    # two's complement
+    return np.where(words & 0x8000, words - 0x10000, words)
@@ -1,13 +1,14 @@
-import bisect
+from collections import namedtuple
 from mat.ascii85 import ascii85_to_num
-import datetime
+import numpy as np
+from mat.columnar_file import TIME_COLUMN
 
 from mat.lix import (ParserLixFile, CS, LEN_LIX_FILE_CONTEXT, _p,
                      lix_mah_time_to_str,
                      LixFileConverterT, LixFileConverterP,
                      lix_macro_header_start_time_to_seconds,
-                     lix_decode_sensor_measurement,
-                     lix_raw_sensor_measurement_to_int, LEN_LIX_FILE_CONTEXT_V3)
+                     LEN_LIX_FILE_CONTEXT_V3, lix_csv_times, write_lix_csv)
+from mat.lix_tdo_records import decode_tdo_records
 
 # flag debug
 debug = 0
@@ -16,63 +17,60 @@ debug = 0
 LEN_LIX_FILE_CC_AREA = 5 * 29
 LEN_LIX_FILE_CF_AREA = 5 * 13
 
-LEN_BYTES_T = 2
-LEN_BYTES_A = 6
 
-# marks if 1 or 2 bytes of time
-MASK_TIME_EXTENDED = 0x40
+# raw temperature ADC counts from -20°C to 50°C, every 1°C
+PRF_LUT = [
+   56765, 56316, 55850, 55369, 54872, 54359,
+   53830, 53285, 52724, 52148, 51557, 50951,
+   50331, 49697, 49048, 48387, 47714, 47028,
+   46331, 45623, 44906, 44179, 43445, 42703,
+   41954, 41199, 40440, 39676, 38909, 38140,
+   37370, 36599, 35828, 35059, 34292, 33528,
+   32768, 32012, 31261, 30517, 29780, 29049,
+   28327, 27614, 26909, 26214, 25530, 24856,
+   24192, 23541, 22900, 22272, 21655, 21051,
+   20459, 19880, 19313, 18759, 18218, 17689,
+   17174, 16670, 16180, 15702, 15236, 14782,
+   14341, 13912, 13494, 13088, 12693
+]
+
+# searchsorted needs it sorted
+_PRF_LUT_SORTED = np.array(PRF_LUT[::-1])
 
 
 def prf_compensate_pressure(rp, rt, prc, prd):
-    # rp: raw Pressure ADC counts
-    # rt: raw Temperature ADC counts
+    # rp: raw Pressure ADC counts, a value or an array
+    # rt: raw Temperature ADC counts, same shape as rp
     # prc: temperature coefficient of pressure sensor = counts / °C
     # prd: reference temperature for pressure sensor = °C
     # cp: corrected Pressure ADC counts
     # ct: closest Temperature = °C
 
-    # define lookup table, from -20°C to 50°C
-    lut = [
-       56765, 56316, 55850, 55369, 54872, 54359,
-       53830, 53285, 52724, 52148, 51557, 50951,
-       50331, 49697, 49048, 48387, 47714, 47028,
-       46331, 45623, 44906, 44179, 43445, 42703,
-       41954, 41199, 40440, 39676, 38909, 38140,
-       37370, 36599, 35828, 35059, 34292, 33528,
-       32768, 32012, 31261, 30517, 29780, 29049,
-       28327, 27614, 26909, 26214, 25530, 24856,
-       24192, 23541, 22900, 22272, 21655, 21051,
-       20459, 19880, 19313, 18759, 18218, 17689,
-       17174, 16670, 16180, 15702, 15236, 14782,
-       14341, 13912, 13494, 13088, 12693
-    ]
-
-    # bisect needs a sorted list
-    lut.reverse()
-
-    # use vt to look up the closest temperature in degrees C, indexed T, i_t
-    i_t = len(lut) - bisect.bisect(lut, rt)
+    # use rt to look up the closest temperature in degrees C, indexed T, i_t
+    i_t = len(PRF_LUT) - np.searchsorted(_PRF_LUT_SORTED, rt, side='right')
 
     # use index of closest value (i_m) to get the T in °C, aka ct
     ct = i_t - 20
 
     # corrected pressure ADC counts
     cp = rp - (prc * (ct - prd))
-
-    # _p('\n\nprfCompnsatePressure')
-    # _p(f'rp {rp}')
-    # _p(f'rt {rt}')
-    # _p(f'prc {prc}')
-    # _p(f'prd {prd}')
-    # _p(f'i_t {i_t}')
-    # _p(f'ct {ct}')
-    # _p(f'cp {cp}')
+    return cp
 
 
-    return cp
+# one row per pressure sample, the values of its measurement repeated
+# i: index of the sample in its measurement, spn: samples per measurement
+# ct: cumulative and et: elapsed time (s), rt: raw temperature,
+# rp: raw and cp: compensated pressure ADC counts, vt: temperature (C),
+# vp: pressure and kp: compensated pressure (dbar), ax, ay, az
+TdoSamples = namedtuple('TdoSamples', [
+    'i', 'spn', 'ct', 'et', 'rt', 'rp', 'vt', 'vp', 'cp', 'kp',
+    'ax', 'ay', 'az']
+)
 
 
 class ParserLixTdoFileV3(ParserLixFile):
+    output_suffix = '_TDO'
+
     def __init__(self, file_path, more_columns=0):
         super().__init__(file_path)
         self.prc = 0
@@ -160,104 +158,33 @@ class ParserLixTdoFileV3(ParserLixFile):
         _p(f'{pad}dhu = {dhu}')
         _p(f'{pad}psm = {self.mah_context.psm}')
 
-    def _parse_data_mm(self, mm, i, ta):
-
-        # mm: all measurement bytes, NO micro_headers, YES masks
-        _p(f"\n\tmeasurement \t|  #{self.mm_i}")
-
-
-        # debug, find old files ended poorly
-        # happened in some in cases in firmware version v4.1.23
-        if mm[i:i+5] == b'\x00\x00\x00\x00\x00':
-            xc = (i / len(mm)) * 100
-            print(f'warning: stopped LID file parsing at {xc} % because string of zeros')
-            return -1, None
-
-
-        # calculated chunk number (blocks of 256)
-        j = int(i / 248) + 1
-        _p(f"\tchunk idx \t\t|  #{j}")
-        chunk_idx = j
-
-
-        # get current byte in big array of measurements and time mask
-        j = i
-        f_te = mm[i] & MASK_TIME_EXTENDED
-        # lm: len_mask
-        lm = 0
-        if f_te == 0:
-            t = 0x3F & mm[i]
-            lm = 1
-            i += 1
-            _p('\tlen. mask\t\t|  1 -> ts = 0x{:02x} = {}'.format(t, t))
-        else:
-            t = ((0x3F & mm[i]) << 8) + mm[i+1]
-            lm = 2
-            i += 2
-            _p('\tlen. mask\t\t|  2 -> te = 0x{:04x} = {}'.format(t, t))
-
-
-        # calculate pressure measurement number of bytes
-        np = 2 * self.mah_context.spn
-        n = np + LEN_BYTES_T + LEN_BYTES_A
-        _p(f"\tlen. sensors\t|  {n}")
-
-
-        # build dictionary measurements, self.sm is for future features
-        self.d_mm[ta + t] = (mm[i:i + n], self.sm)
-
-
-        # keep track of how many measurements we decoded
-        self.mm_i += 1
-
-
-        # display postions of bytes involved
-        _p(f'\tindex bytes \t|  {(chunk_idx * 256) + 8 + j}:{(chunk_idx * 256) + 8 + n+i} ({n+i-j})')
-
-
-        # debug this measurement
-        c = mm[j:n+i]
-        # for a, b in enumerate(c):
-        #      print(a, '0x{:02x}'.format(b))
-        if lm == 1:
-            _p('\t\tmask 0x{:02x} = {}'.format(c[0], c[0]))
-        elif lm == 2:
-            _p('\t\tmask 0x{:02x}{:02x}'.format(c[0], c[1]))
+    def _parse_measurements(self, mm):
+        # two passes, see mat.lix_tdo_records
+        self.records = decode_tdo_records(mm, self.mah_context.spn)
+        self.mm_i = len(self.records.time)
+        _p(f"\n\tmeasurements \t|  {self.mm_i} decoded")
 
-        s = '\t\tT 0x{:02x}{:02x}'.format(c[lm + 0], c[lm + 1])
-        hs = int(s[-4:], 16)
-        _p(f'{s} = {hs}')
-        s = '\t\tP 0x{:02x}{:02x}'.format(c[lm + 2], c[lm + 3])
-        hs = int(s[-4:], 16)
-        _p(f'{s} = {hs}')
-        s = '\t\tX 0x{:02x}{:02x}'.format(c[lm + 4], c[lm + 5])
-        hs = int(s[-4:], 16)
-        _p(f'{s} = {hs}')
 
 
-        # return current index of measurements' array
-        return i + n, t
-
-
-
-    def _create_csv_file(self):
+    def _converters(self):
         # use the calibration coefficients to create objects
-        np = LEN_LIX_FILE_CC_AREA
+        n = LEN_LIX_FILE_CC_AREA
         tmr = ascii85_to_num(self.mah.cc_area[10:15].decode())
         tma = ascii85_to_num(self.mah.cc_area[15:20].decode())
         tmb = ascii85_to_num(self.mah.cc_area[20:25].decode())
         tmc = ascii85_to_num(self.mah.cc_area[25:30].decode())
         tmd = ascii85_to_num(self.mah.cc_area[30:35].decode())
-        pra = ascii85_to_num(self.mah.cc_area[np-20:np-15].decode())
-        prb = ascii85_to_num(self.mah.cc_area[np-15:np-10].decode())
+        pra = ascii85_to_num(self.mah.cc_area[n-20:n-15].decode())
+        prb = ascii85_to_num(self.mah.cc_area[n-15:n-10].decode())
         lct = LixFileConverterT(tma, tmb, tmc, tmd, tmr)
         lcp = LixFileConverterP(pra, prb)
+        return lct, lcp
 
+    def _create_csv_file(self):
         # ---------------
         # csv file header
         # ---------------
-        csv_path = (self.file_path[:-4] + '_TDO.csv')
-        f_csv = open(csv_path, 'w')
+        csv_path = (self.file_path[:-4] + self.output_suffix + '.csv')
         cols = 'ISO 8601 Time,' \
                'Temperature (C),Pressure (dbar),Ax,Ay,Az\n'
         if self.more_columns:
@@ -265,80 +192,78 @@ class ParserLixTdoFileV3(ParserLixFile):
                    'raw ADC Temp,raw ADC Pressure,' \
                    'Temperature (C),Pressure (dbar),Compensated ADC Pressure,' \
                    'Compensated Pressure (dbar),Ax,Ay,Az\n'
-        f_csv.write(cols)
 
         # get first time
         epoch = lix_macro_header_start_time_to_seconds(self.mah.timestamp_str)
-        last_ct = 0
-
-        # debug all measurements
-        # print('\ndictionary measurements')
-        # print(self.d_mm)
-
-        # self.d_mm: dictionary {cumulative_time: (sensor_data, sensor_mask)}
-        for ct, v_sm in self.d_mm.items():
-
-            v, sm = v_sm
-
-            # needed arrays for pressure
-            rpe, cpe = [], []
-
-            # temperature in ADC counts
-            rt = lix_raw_sensor_measurement_to_int(v[0:2])
-
-            # temperature floating point format
-            vt = '{:06.3f}'.format(float(lct.convert(rt)))
 
-            # pressure: up to 'np' samples
-            np = int((len(v) - (LEN_BYTES_T + LEN_BYTES_A)) / 2)
-            for i in range(np):
-                # rp: raw ADC pressure
-                rp = lix_raw_sensor_measurement_to_int(v[2 + (i * 2):(2 + (i * 2)) + 2])
-                rpe.append(rp)
+        # every column is converted at once
+        sm = self._samples()
 
-                # cp: compensated ADC pressure, uses PRC / PRD
-                cp = prf_compensate_pressure(rp, rt, self.prc, self.prd)
-                cpe.append(cp)
+        # timestamp, sub_t: 'X.250' -> 250 for each sample index
+        sub_t = [int('{:.3f}'.format(i / sm.spn)[-3:]) for i in range(sm.spn)]
+        t = lix_csv_times(epoch + sm.ct, np.array(sub_t, dtype=np.int64)[sm.i])
 
-            # accelerometer
-            vax = lix_decode_sensor_measurement('Ax', v[-6:-4])
-            vay = lix_decode_sensor_measurement('Ay', v[-4:-2])
-            vaz = lix_decode_sensor_measurement('Az', v[-2:])
-
-            # CSV file writing
-            for i in range(np):
-                # convert raw pressure to decibar using PRA / PRB
-                vp = '{:06.3f}'.format(lcp.convert(rpe[i])[0])
-                # convert compensated pressure to decibar using PRA / PRB
-                kp = '{:06.3f}'.format(lcp.convert(cpe[i])[0])
-
-                # timestamp
-                sub_t = '{:.3f}'.format(i / np)
-                # sub_t: 'X.250' -> '250'
-                sub_t = sub_t[-3:]
-                t = datetime.datetime.utcfromtimestamp(epoch + ct).isoformat() + f'.{sub_t}Z'
-
-                # elapsed and cumulative time
-                et = ct - last_ct
-                last_ct = ct
-                s = f'{t},{vt},{vp},{vax},{vay},{vaz}\n'
-                if self.more_columns:
-                    s = f'{t},{et},{ct},{rt},{rpe[i]},{vt},{vp},{cpe[i]},'\
-                        f'{kp},{vax},{vay},{vaz}\n'
-
-                # detect conversion errors
-                if 'nan' in s:
-                    print('*** detected nan in row')
-
-                f_csv.write(s)
-
-        # close the file
-        f_csv.close()
+        # CSV file writing, by blocks
+        row = '{}Z,{:06.3f},{:06.3f},{},{},{}\n'
+        columns = [t, sm.vt, sm.vp, sm.ax, sm.ay, sm.az]
+        if self.more_columns:
+            row = '{}Z,{},{},{},{},{:06.3f},{:06.3f},{},{:06.3f},{},{},{}\n'
+            columns = [t, sm.et, sm.ct, sm.rt, sm.rp, sm.vt, sm.vp, sm.cp,
+                       sm.kp, sm.ax, sm.ay, sm.az]
+        write_lix_csv(csv_path, cols, row, columns)
 
         # return name of CSV file
         _p(f'file converted {csv_path}')
         return csv_path
 
+    def _samples(self):
+        # the TdoSamples of the decoded records
+        lct, lcp = self._converters()
+        r = self.records
+        n, spn = r.pressure.shape
+        ct = np.repeat(r.time, spn)
+        rt = np.repeat(r.temperature, spn)
+        rp = r.pressure.ravel()
+        cp = prf_compensate_pressure(rp, rt, self.prc, self.prd)
+        return TdoSamples(np.tile(np.arange(spn), n), spn,
+                          ct, np.diff(ct, prepend=0),
+                          rt, rp,
+                          np.repeat(lct.convert_column(r.temperature), spn),
+                          lcp.convert_column(rp),
+                          cp, lcp.convert_column(cp),
+                          np.repeat(r.ax, spn), np.repeat(r.ay, spn),
+                          np.repeat(r.az, spn))
+
+    def _columnar_header(self):
+        cols = [(TIME_COLUMN, 'int64'),
+                ('Temperature (C)', 'float64'),
+                ('Pressure (dbar)', 'float64'),
+                ('Ax', 'int64'), ('Ay', 'int64'), ('Az', 'int64')]
+        if self.more_columns:
+            cols = [(TIME_COLUMN, 'int64'),
+                    ('elapsed time (s)', 'int64'),
+                    ('agg. time(s)', 'int64'),
+                    ('raw ADC Temp', 'int64'),
+                    ('raw ADC Pressure', 'int64'),
+                    ('Temperature (C)', 'float64'),
+                    ('Pressure (dbar)', 'float64'),
+                    ('Compensated ADC Pressure', 'float64'),
+                    ('Compensated Pressure (dbar)', 'float64'),
+                    ('Ax', 'int64'), ('Ay', 'int64'), ('Az', 'int64')]
+        return cols
+
+    def _columnar_columns(self):
+        # same values as the CSV file, not rounded
+        epoch = lix_macro_header_start_time_to_seconds(self.mah.timestamp_str)
+        sm = self._samples()
+        # pressure samples are spread evenly over one second
+        t = (epoch + sm.ct) * 1000 + np.round(sm.i * 1000 / sm.spn)
+        columns = [t.astype(np.int64), sm.vt, sm.vp, sm.ax, sm.ay, sm.az]
+        if self.more_columns:
+            columns = [t.astype(np.int64), sm.et, sm.ct, sm.rt, sm.rp,
+                       sm.vt, sm.vp, sm.cp, sm.kp, sm.ax, sm.ay, sm.az]
+        return columns
+
 
 if __name__ == '__main__':
     rp = 11056
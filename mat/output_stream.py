@@ -1,12 +1,29 @@
 from os import path
-from .time_converter import create_time_converter
+import os
+from .columnar_file import (columnar_file_factory, seconds_to_ms,
+                             TIME_COLUMN)
+from .time_converter import create_time_converter, format_fixed
 from pathlib import Path
 import h5py
+import numpy as np
+import re
 from datetime import datetime
+from string import Formatter
+
+
+# a '{:0.4f}' style replacement field that has a printf equivalent
+FORMAT_FIELD = re.compile(r'\{:([0-9]*\.?[0-9]*[efgEFG])\}')
+# a '0.4f' style format spec, for format_fixed
+FIXED_SPEC = re.compile(r'0?\.([0-9]+)f')
+# the statistics TimeBins can compute
+BIN_STATISTICS = ('mean', 'min', 'max', 'std')
 
 
 def output_stream_factory(file_path, parameters):
-    output_types = {'csv': CsvStream, 'hdf5': HDF5Stream}
+    output_types = {'csv': CsvStream,
+                    'hdf5': HDF5Stream,
+                    'parquet': ColumnarStream,
+                    'npy': ColumnarStream}
     stream_class = output_types.get(parameters['output_format'])
     if stream_class is None:
         raise ValueError('Unknown output type' + parameters['output_format'])
@@ -14,10 +31,15 @@ def output_stream_factory(file_path, parameters):
 
 
 class OutputStream:
+    # whether checkpoint() and resume() are implemented
+    resumable = False
+
     def __init__(self, file_path, parameters):
         self.file_path = file_path
         self.parameters = parameters
         self.streams = {}
+        self.rows = {}
+        self.n_pages = None
         self.time_converter = create_time_converter(parameters['time_format'])
 
     def add_stream(self, data_product):
@@ -30,27 +52,311 @@ class OutputStream:
     def set_data_format(self, stream, data_format):
         self.streams[stream].data_format = data_format
 
+    def set_page_samples(self, stream, samples):
+        pass
+
     def write(self, stream, data, time):
-        time = self.time_converter.convert(time)
+        self._count_rows(stream, data)
+        time = self.time_converter.format_bytes(time)
         self.streams[stream].write(data, time)
 
+    def _count_rows(self, stream, data):
+        self.rows[stream] = self.rows.get(stream, 0) + data.shape[1]
+
+    def output_paths(self):
+        return []
+
+    def checkpoint(self):
+        """
+        Flush the output to disk and return a JSON-able state that resume()
+        can continue from
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def resume(self, state):
+        """
+        Continue the output of an interrupted conversion from a checkpoint()
+        state, before any stream is added. Raises OSError if the output
+        files are gone.
+        """
+        raise NotImplementedError  # pragma: no cover
+
+    def _checkpoint_state(self, streams):
+        start_time = getattr(self.time_converter, 'start_time', None)
+        if start_time is not None:
+            start_time = float(start_time)
+        return {'rows': dict(self.rows),
+                'start_time': start_time,
+                'streams': streams}
+
+    def _resume_state(self, state):
+        self.rows = dict(state['rows'])
+        if state['start_time'] is not None:
+            # elapsed times count from the first sample of the conversion
+            self.time_converter.start_time = state['start_time']
+
+    def flush(self):
+        """
+        Write out the samples a stream holds back, at the end of a conversion
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PageRecorder(OutputStream):
+    """
+    Keeps the raw (stream, data, time) writes of a data page in memory so
+    they can be replayed on a real output stream, in page order, by the
+    process that owns the output files.
+    """
+    def __init__(self):
+        self.writes = []
+        self.column_headers = {}
+
+    def add_stream(self, data_product):
+        pass
+
+    def set_column_header(self, stream, column_header):
+        self.column_headers[stream] = column_header.split(',')
+
+    def set_data_format(self, stream, data_format):
+        pass
+
+    def write(self, stream, data, time):
+        self.writes.append((stream, data, time))
+
+    def pop_writes(self):
+        writes, self.writes = self.writes, []
+        return writes
+
+
+class TimeWindow(OutputStream):
+    """
+    Passes the samples with start <= time < end on to another output
+    stream. start or end may be None for an open window.
+    """
+    def __init__(self, output_stream, start, end):
+        self.output_stream = output_stream
+        self.start = -np.inf if start is None else start
+        self.end = np.inf if end is None else end
+
+    def add_stream(self, data_product):
+        self.output_stream.add_stream(data_product)
+
+    def set_column_header(self, stream, column_header):
+        self.output_stream.set_column_header(stream, column_header)
+
+    def set_data_format(self, stream, data_format):
+        self.output_stream.set_data_format(stream, data_format)
+
+    def set_page_samples(self, stream, samples):
+        self.output_stream.set_page_samples(stream, samples)
+
+    def write(self, stream, data, time):
+        inside = (time >= self.start) & (time < self.end)
+        if not np.all(inside):
+            # only pages at the edges of the window are trimmed
+            if not np.any(inside):
+                return
+            data, time = data[:, inside], time[inside]
+        self.output_stream.write(stream, data, time)
+
+
+class TimeBins(OutputStream):
+    """
+    Reduces the samples of each stream to statistics over time bins before
+    passing them on to another output stream. Bins are interval seconds
+    long, aligned on multiples of interval since the epoch, and the time of
+    a bin is its start. The samples of the last bin of a write are held
+    back until a later sample falls in another bin, so bins can span pages,
+    or until flush().
+
+    With statistics other than the mean, each column becomes one column per
+    statistic, named '<column> <statistic>'.
+    """
+    def __init__(self, output_stream, interval, statistics='mean'):
+        if isinstance(statistics, str):
+            statistics = statistics.split(',')
+        statistics = [s.strip() for s in statistics]
+        unknown = set(statistics) - set(BIN_STATISTICS)
+        if unknown or not statistics:
+            raise ValueError('Unknown statistics ' + ','.join(unknown))
+        if not interval > 0:
+            raise ValueError('The output interval must be positive')
+        self.output_stream = output_stream
+        self.interval = interval
+        self.statistics = statistics
+        self.pending = {}
+
+    def add_stream(self, data_product):
+        self.output_stream.add_stream(data_product)
+
+    def set_column_header(self, stream, column_header):
+        if self.statistics != ['mean']:
+            column_header = self._columns(column_header, '{} {}')
+        self.output_stream.set_column_header(stream, column_header)
+
+    def set_data_format(self, stream, data_format):
+        self.output_stream.set_data_format(
+            stream, self._columns(data_format, '{}'))
+
+    def _columns(self, columns, column_format):
+        return ','.join(column_format.format(column, statistic)
+                        for column in columns.split(',')
+                        for statistic in self.statistics)
+
+    def set_page_samples(self, stream, samples):
+        self.output_stream.set_page_samples(stream, samples)
+
+    def write(self, stream, data, time):
+        if stream in self.pending:
+            held_data, held_time = self.pending.pop(stream)
+            data = np.hstack((held_data, data))
+            time = np.concatenate((held_time, time))
+        if len(time) == 0:
+            return
+        bins = np.floor(time / self.interval)
+        last = np.flatnonzero(bins != bins[-1])
+        last = last[-1] + 1 if len(last) else 0
+        self.pending[stream] = (data[:, last:].copy(), time[last:].copy())
+        if last:
+            self._write_bins(stream, data[:, :last], time[:last])
+
+    def _write_bins(self, stream, data, time):
+        data, time = bin_statistics(data, time, self.interval,
+                                    self.statistics)
+        self.output_stream.write(stream, data, time)
+
+    def flush(self):
+        for stream, (data, time) in self.pending.items():
+            self._write_bins(stream, data, time)
+        self.pending = {}
+        self.output_stream.flush()
+
+
+def bin_statistics(data, time, interval, statistics=('mean',)):
+    """
+    Reduce data, one row per channel, to one column per time bin of
+    interval seconds holding samples. time must be sorted. NaN samples are
+    left out, the std is the population standard deviation. Return the
+    statistics, one row per channel and statistic, and the bin start times.
+    """
+    bins = np.floor(time / interval)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    is_nan = np.isnan(data)
+    has_nan = is_nan.any()
+    values = np.where(is_nan, 0, data) if has_nan else data
+    counts = np.add.reduceat(~is_nan, starts, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        reduced = {'mean': np.add.reduceat(values, starts, axis=1) / counts}
+        if 'min' in statistics:
+            reduced['min'] = np.fmin.reduceat(data, starts, axis=1)
+        if 'max' in statistics:
+            reduced['max'] = np.fmax.reduceat(data, starts, axis=1)
+        if 'std' in statistics:
+            sizes = np.diff(np.r_[starts, len(time)])
+            deviations = data - np.repeat(reduced['mean'], sizes, axis=1)
+            if has_nan:
+                deviations[is_nan] = 0
+            squares = np.add.reduceat(deviations ** 2, starts, axis=1)
+            reduced['std'] = np.sqrt(squares / counts)
+    n_bins = len(starts)
+    columns = np.stack([reduced[s] for s in statistics], axis=1)
+    return columns.reshape(-1, n_bins), bins[starts] * interval
+
+
+class TimedStream(OutputStream):
+    """
+    Times the writes of another output stream with a StageTimer
+    """
+    def __init__(self, output_stream, timer):
+        self.output_stream = output_stream
+        self.timer = timer
+
+    def add_stream(self, data_product):
+        self.output_stream.add_stream(data_product)
+
+    def set_column_header(self, stream, column_header):
+        self.output_stream.set_column_header(stream, column_header)
+
+    def set_data_format(self, stream, data_format):
+        self.output_stream.set_data_format(stream, data_format)
+
+    def set_page_samples(self, stream, samples):
+        self.output_stream.set_page_samples(stream, samples)
+
+    def write(self, stream, data, time):
+        with self.timer.stage('write', stream):
+            self.output_stream.write(stream, data, time)
+        self.timer.add_bytes('write', stream, data.nbytes + time.nbytes)
+
 
 class CsvStream(OutputStream):
+    resumable = True
+
+    def __init__(self, file_path, parameters):
+        super().__init__(file_path, parameters)
+        self._resumed = {}
+
     def add_stream(self, data_product):
         self.streams[data_product] = CsvFile(
             self.file_path, data_product, self.parameters
         )
+        if data_product in self._resumed:
+            self.streams[data_product].resume(self._resumed[data_product])
+
+    def output_paths(self):
+        return [p for f in self.streams.values() for p in f.output_paths]
+
+    def checkpoint(self):
+        return self._checkpoint_state({name: csv_file.checkpoint()
+                                       for name, csv_file
+                                       in self.streams.items()})
+
+    def resume(self, state):
+        streams = state['streams']
+        for csv_state in streams.values():
+            for output_path in csv_state['output_paths']:
+                if not path.exists(output_path):
+                    raise FileNotFoundError(output_path)
+            # truncate() would pad a file that lost rows with zero bytes
+            last_paths = csv_state['output_paths'][-1:]
+            for output_path in last_paths:
+                if path.getsize(output_path) < csv_state['size']:
+                    raise OSError('shorter than its checkpoint: '
+                                  + output_path)
+        # the rows of the pages after the checkpoint are dropped
+        for csv_state in streams.values():
+            if csv_state['output_paths']:
+                os.truncate(csv_state['output_paths'][-1], csv_state['size'])
+        self._resume_state(state)
+        self._resumed = streams
+
+    def close(self):
+        for csv_file in self.streams.values():
+            csv_file.close()
 
 
 class HDF5Stream(OutputStream):
+    # upper bound of the bytes in one chunk of a dataset
+    MAX_CHUNK_BYTES = 1024 ** 2
+    # rows in one chunk when the samples per page aren't known
+    DEFAULT_CHUNK_ROWS = 4096
+    resumable = True
+
     def __init__(self, file_path, parameters):
         super().__init__(file_path, parameters)
         self.hdf_file = None
+        self._hdf = None
+        self.page_samples = {}
+        self._resumed = False
 
     def file(self):
         if not self.hdf_file:
             self.create_hdf_file()
-        return h5py.File(self.hdf_file, 'r+')
+        return self._hdf
 
     def create_hdf_file(self):
         file_path = Path(self.file_path)
@@ -59,60 +365,176 @@ class HDF5Stream(OutputStream):
         else:
             parent = file_path.parent
         hdf_path = (parent / file_path.stem).with_suffix('.hdf5')
+        if self._resumed:
+            self._hdf = h5py.File(hdf_path, 'r+')
+            self.hdf_file = hdf_path
+            return
         if hdf_path.exists() and not self.parameters['overwrite']:
             raise FileExistsError(str(file_path.name))
-        with h5py.File(hdf_path, 'w') as file:
-            file.attrs['Source File'] = file_path.name
-            file.attrs['Conversion Date'] = datetime.now().isoformat()[:-7]
+        self._hdf = h5py.File(hdf_path, 'w')
+        self._hdf.attrs['Source File'] = file_path.name
+        self._hdf.attrs['Conversion Date'] = datetime.now().isoformat()[:-7]
         self.hdf_file = hdf_path
 
+    def output_paths(self):
+        return [str(self.hdf_file)] if self.hdf_file else []
+
     def add_stream(self, data_product):
-        with self.file() as file:
-            file.create_group(data_product)
+        self.file().require_group(data_product)
 
-    def set_column_header(self, stream, column_header):
-        with self.file() as file:
-            file[stream].create_dataset(
-                'Time',
-                (0, ),
-                maxshape=(None, ),
-                dtype='float64',
-                # dtype='S23',
-                compression='gzip',
-                shuffle=True
-            )
-            file[stream]['Time'].attrs['Time format'] = \
-                'Seconds since 1970-01-01T00:00:00'
-
-            channels = column_header.split(',')
-            file[stream].create_dataset(
-                'Data',
-                (0, len(channels)),
-                maxshape=(None, len(channels)),
-                compression='gzip',
-                shuffle=True
-            )
-            file[stream]['Data'].attrs['Columns'] = column_header
+    def checkpoint(self):
+        if self._hdf:
+            self._hdf.flush()
+            os.fsync(self._hdf.id.get_vfd_handle())
+        return self._checkpoint_state({})
 
-    def write(self, stream, data, time):
-        with self.file() as file:
-            ds_data = file[stream]['Data']
-            ds_time = file[stream]['Time']
+    def resume(self, state):
+        """
+        The datasets are kept, write() continues after the checkpoint rows
+        and close() trims the rows of later pages
+        """
+        self._resumed = True
+        try:
+            self.create_hdf_file()
+        except OSError:
+            self._resumed = False
+            raise
+        self._resume_state(state)
+
+    def set_page_samples(self, stream, samples):
+        self.page_samples[stream] = samples
 
-            ds_shape = ds_data.shape
-            new_length = ds_shape[0] + data.shape[1]
+    def _compression(self):
+        compression = self.parameters['hdf5_compression']
+        if compression == 'gzip':
+            return {'compression': 'gzip',
+                    'compression_opts': self.parameters['hdf5_gzip_level'],
+                    'shuffle': True}
+        if compression == 'lzf':
+            return {'compression': 'lzf', 'shuffle': True}
+        if compression is None:
+            return {}
+        raise ValueError('Unknown hdf5 compression ' + str(compression))
 
-            ds_data.resize((new_length, ds_shape[1]))
+    def set_column_header(self, stream, column_header):
+        """
+        Datasets are preallocated for all pages when the page count and the
+        samples per page are known, and trimmed to size by close().
+        Otherwise they start empty and write() grows them.
+        """
+        channels = column_header.split(',')
+        page_samples = self.page_samples.get(stream, 0)
+        chunk_rows = max(1, min(page_samples or self.DEFAULT_CHUNK_ROWS,
+                                self.MAX_CHUNK_BYTES // (8 * len(channels))))
+        length = page_samples * (self.n_pages or 0)
+        group = self.file()[stream]
+        if 'Data' in group:
+            # resumed
+            return
+        group.create_dataset(
+            'Time',
+            (length, ),
+            maxshape=(None, ),
+            dtype='float64',
+            chunks=(chunk_rows, ),
+            **self._compression()
+        )
+        group['Time'].attrs['Time format'] = \
+            'Seconds since 1970-01-01T00:00:00'
+
+        group.create_dataset(
+            'Data',
+            (length, len(channels)),
+            maxshape=(None, len(channels)),
+            dtype='float32',
+            chunks=(chunk_rows, len(channels)),
+            **self._compression()
+        )
+        group['Data'].attrs['Columns'] = column_header
+
+    def write(self, stream, data, time):
+        start = self.rows.get(stream, 0)
+        self._count_rows(stream, data)
+        end = self.rows[stream]
+        ds_data = self.file()[stream]['Data']
+        ds_time = self.file()[stream]['Time']
+        if end > ds_data.shape[0]:
+            new_length = max(end, ds_data.shape[0] + ds_data.chunks[0])
+            ds_data.resize((new_length, ds_data.shape[1]))
             ds_time.resize((new_length, ))
-            ds_data[ds_shape[0]:, :] = data.T
-            # ds_time[ds_shape[0]:] = \
-            #     np.string_(self.time_converter.convert(time))
-            ds_time[ds_shape[0]:] = time
+        ds_data[start:end, :] = data.T
+        ds_time[start:end] = time
 
     def set_data_format(self, stream, data_format):
         # not required in hdf5
         pass
 
+    def close(self):
+        if not self._hdf:
+            return
+        for stream in self._hdf:
+            rows = self.rows.get(stream, 0)
+            self._hdf[stream]['Data'].resize(
+                (rows, self._hdf[stream]['Data'].shape[1]))
+            self._hdf[stream]['Time'].resize((rows, ))
+        self._hdf.close()
+        self._hdf = None
+
+    def __del__(self):
+        self.close()
+
+
+class ColumnarStream(OutputStream):
+    """
+    One columnar file per data product, with times as int64 milliseconds
+    whatever the time format. Each page is appended as a row group.
+    """
+    def add_stream(self, data_product):
+        self.streams[data_product] = None
+
+    def set_column_header(self, stream, column_header):
+        destination, file_prefix = output_prefix(self.file_path,
+                                                 self.parameters)
+        path_prefix = path.join(destination,
+                                '{}_{}'.format(file_prefix, stream))
+        if self._exists(path_prefix) and not self.parameters['overwrite']:
+            raise FileExistsError(path.basename(path_prefix))
+        dtype = self.parameters['columnar_dtype']
+        columns = [(TIME_COLUMN, 'int64')]
+        columns += [(name, dtype) for name in column_header.split(',')]
+        self.streams[stream] = columnar_file_factory(
+            path_prefix, columns, self.parameters['output_format'])
+
+    def _exists(self, path_prefix):
+        return any(path.exists(path_prefix + extension)
+                   for extension in ('.parquet', '.npy'))
+
+    def set_data_format(self, stream, data_format):
+        # values are stored, not formatted
+        pass
+
+    def write(self, stream, data, time):
+        self._count_rows(stream, data)
+        self.streams[stream].write([seconds_to_ms(time)] + list(data))
+
+    def output_paths(self):
+        return [f.path for f in self.streams.values() if f]
+
+    def close(self):
+        for columnar_file in self.streams.values():
+            if columnar_file:
+                columnar_file.close()
+
+
+def output_prefix(file_path, parameters):
+    """
+    The output directory and the start of the output file names
+    """
+    destination = parameters['output_directory'] or path.dirname(file_path)
+    if parameters['file_name']:
+        return destination, parameters['file_name']
+    return destination, path.basename(file_path).split('.')[0]
+
 
 class CsvFile:
     def __init__(self, file_path, stream_name, parameters):
@@ -125,14 +547,12 @@ class CsvFile:
         self.write_count = 0
         self.output_file_name = ''
         self.output_path = ''
+        self.output_paths = []
+        self._file = None
 
     def next_file_path(self):
-        dir_name = path.dirname(self.file_path)
-        destination = self.parameters['output_directory'] or dir_name
-        if self.parameters['file_name']:
-            file_prefix = self.parameters['file_name']
-        else:
-            file_prefix = path.basename(self.file_path).split('.')[0]
+        destination, file_prefix = output_prefix(self.file_path,
+                                                 self.parameters)
         file_num = self.write_count // self.split
         file_num_str = '_{}'.format(file_num) if self.split != 100000 else ''
         self.output_file_name = '{}_{}{}.csv'.format(file_prefix,
@@ -147,13 +567,103 @@ class CsvFile:
                     and not self.parameters['overwrite']:
                 raise FileExistsError(self.output_file_name)
             self._write_header()
-
-        data_format = '{},' + self.data_format + '\n'
-        with open(self.output_path, 'a') as fid:
-            for i in range(data.shape[1]):
-                fid.write(data_format.format(time[i], *data[:, i]))
+            self.output_paths.append(self.output_path)
+        self._file.write(self._format_page(data, time))
         self.write_count += 1
 
+    def checkpoint(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        return {'write_count': self.write_count,
+                'output_paths': list(self.output_paths),
+                'size': self._file.tell() if self._file else 0}
+
+    def resume(self, state):
+        """
+        Append to the last output file, CsvStream.resume truncated it
+        """
+        self.write_count = state['write_count']
+        self.output_paths = list(state['output_paths'])
+        if self.output_paths:
+            self.output_path = self.output_paths[-1]
+            self.output_file_name = path.basename(self.output_path)
+            self._file = open(self.output_path, 'a')
+
+    def _format_page(self, data, time):
+        """
+        Format all rows of a page a column at a time, time is a byte string
+        array. The output is the same as str.format.
+        """
+        n_rows = data.shape[1]
+        if n_rows == 0:
+            return ''
+        columns = iter([np.asarray(time, dtype='S')] + list(data))
+        pieces = []
+        row_format = '{},' + self.data_format + '\n'
+        for literal, field, spec, _ in Formatter().parse(row_format):
+            if literal:
+                pieces.append(literal.encode())
+            if field is not None:
+                pieces.append(format_column(next(columns), spec))
+        return join_text_columns(pieces, n_rows).decode()
+
     def _write_header(self):
-        with open(self.output_path, 'w') as fid:
-            fid.write(self.column_header + '\n')
+        self.close()
+        self._file = open(self.output_path, 'w')
+        self._file.write(self.column_header + '\n')
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+
+    def __del__(self):
+        self.close()
+
+
+def format_column(values, spec):
+    """
+    The text of format(x, spec) for every x of values, as a byte string
+    array. Byte strings are kept as they are.
+    """
+    if values.dtype.kind == 'S' and not spec:
+        return values
+    fixed = FIXED_SPEC.fullmatch(spec)
+    if fixed:
+        return format_fixed(values, int(fixed.group(1)))
+    printf = printf_format('{:' + spec + '}' if spec else '{}')
+    if printf is None:
+        text = np.array([format(x, spec) for x in values])
+    else:
+        text = np.char.mod(printf, values)
+    return text.astype('S')
+
+
+def join_text_columns(pieces, n_rows):
+    """
+    Concatenate, row after row, byte string arrays of n_rows strings and
+    constant byte strings into one bytes object
+    """
+    blocks = []
+    for piece in pieces:
+        if isinstance(piece, bytes):
+            piece = np.full(n_rows, piece, dtype='S{}'.format(len(piece)))
+        piece = np.ascontiguousarray(piece)
+        blocks.append(piece.view(np.uint8).reshape(n_rows, -1))
+    block = np.hstack(blocks)
+    # byte strings are padded with zeros
+    return block[block != 0].tobytes()
+
+
+def printf_format(data_format):
+    """
+    Translate a str.format string made of '{}' and '{:0.4f}' style fields
+    to the equivalent printf-style string, or None if there is none.
+    eg '{},{:0.4f}\n' -> '%s,%0.4f\n'
+    """
+    printf = data_format.replace('%', '%%').replace('{}', '%s')
+    printf = FORMAT_FIELD.sub(r'%\1', printf)
+    if '{' in printf or '}' in printf:
+        return None
+    return printf
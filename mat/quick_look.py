@@ -0,0 +1,66 @@
+"""
+Quick-look reports of logger files, to pick the ones worth converting.
+
+For each LID or LIX file, the report has the time span, the battery trend
+and, per output stream, the count, NaN count, min, max, mean and standard
+deviation of every column. Files are converted in memory, nothing is
+written.
+
+python -m mat.quick_look 'dl_files/**/*.lid'
+"""
+
+import argparse
+import json
+import sys
+from mat.batch_converter import find_logger_files
+from mat.data_converter import DataConverter, default_parameters
+from mat.file_format import sniff_file
+from mat.lix import LID_FILE_V2
+from mat.lix_pr import get_lix_parser
+
+
+def summarize_file(path, parameters=None):
+    """
+    The quick-look report of a LID or LIX file as a dict. parameters are
+    DataConverter parameters for LID files, average and output_type change
+    the statistics.
+    """
+    if sniff_file(path).flavor == LID_FILE_V2:
+        return get_lix_parser(path).summarize()
+    converter = DataConverter(path, parameters or default_parameters())
+    try:
+        return converter.summarize()
+    finally:
+        converter.close_source()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Statistics of Lowell Instruments logger files, the '
+                    'report is written to stdout as JSON')
+    parser.add_argument('path', help='folder or glob pattern')
+    parser.add_argument('--extension', default='lid')
+    parser.add_argument('--output-type', default='discrete',
+                        help='one type or a comma separated list')
+    parser.add_argument('--no-average', action='store_true')
+    args = parser.parse_args(argv)
+
+    parameters = default_parameters()
+    parameters['output_type'] = args.output_type
+    parameters['average'] = not args.no_average
+    reports = []
+    status = 0
+    for path in find_logger_files(args.path, args.extension):
+        try:
+            reports.append(summarize_file(path, parameters))
+        except Exception as ex:
+            reports.append({'file': path,
+                            'error': '{}: {}'.format(type(ex).__name__, ex)})
+            status = 1
+    json.dump(reports, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,20 @@
 from mat.sensor_specification import AVAILABLE_SENSORS
+from mat.stage_timer import NULL_TIMER
 import numpy as np
+from collections import namedtuple
 from math import floor
-from heapq import merge
-from itertools import chain
+from numpy.lib.stride_tricks import as_strided
+from functools import lru_cache
+
+
+# samples of a sensor repeat every period page samples, at the same offsets
+# (an index array, width samples) from start + k * period. The offsets are
+# made of groups of one sample per channel, runs lists the evenly spaced
+# groups as (offset, groups, stride) tuples, None if there are too many.
+Demux = namedtuple('Demux', ['start', 'period', 'offsets', 'width',
+                             'n_periods', 'runs'])
+# above this many runs per period, gathering the samples is faster
+MAX_DEMUX_RUNS = 8
 
 
 def create_sensors(header, calibration, seconds):
@@ -11,8 +23,13 @@ def create_sensors(header, calibration, seconds):
     individual sensor sequences depend on the order of all the sensors.
     """
     sensors = _build_sensors(header, calibration, seconds)
-    time_and_order = _time_and_order(sensors)
-    _load_sequence_into_sensors(sensors, time_and_order)
+    key = _schedule_key(sensors)
+    schedule = _sample_schedule(seconds, key)
+    for sensor, sample_ind, demux in zip(sensors,
+                                         schedule,
+                                         _demux_plans(seconds, key)):
+        sensor.sample_ind = sample_ind
+        sensor.demux = demux
     _add_temperature_dependency(sensors)
     return sensors
 
@@ -37,25 +54,105 @@ def _sensor_factory(sensor_spec, header, calibration, seconds):
         return Sensor(sensor_spec, header, calibration, seconds)
 
 
-def _time_and_order(sensors):
+def _schedule_key(sensors):
     """
-    Return a fully combined time and sensor-order sequence for 'sensors'.
-    The output is a list of tuples containing the sample time and order
-    sorted by time, then by order.
+    Everything that determines the sample schedule of a page, taken from
+    the header tags (TRI/ORI/DRI, BMR/BMN, PRR/PRN and enabled sensors)
     """
-    time_and_order = []
-    for sensor in sensors:
-        sample_times = sensor.full_sample_times()
-        sensor_time_order = [(t, sensor.order) for t in sample_times]
-        time_and_order.append(sensor_time_order)
-    return list(merge(*time_and_order))
+    return tuple((s.order, s.channels, s.interval, s.burst_rate, s.burst_count)
+                 for s in sensors)
 
 
-def _load_sequence_into_sensors(sensors, time_and_order):
-    for sensor in sensors:
-        sample_ind = [i for i, s in enumerate(time_and_order)
-                      if s[1] == sensor.order]
-        sensor.sample_ind = np.array(sample_ind)
+@lru_cache(maxsize=32)
+def _sample_schedule(seconds, schedule_key):
+    """
+    Return a tuple with the page sample indices of each sensor. Samples are
+    interleaved by sample time, then by sensor order. The result is cached
+    because whole fleets of loggers share one configuration.
+    """
+    if not schedule_key:
+        return ()
+    times = [full_sample_times(seconds, *key[1:]) for key in schedule_key]
+    orders = [np.full(len(t), key[0]) for t, key in zip(times, schedule_key)]
+    sort_ind = np.lexsort((np.concatenate(orders), np.concatenate(times)))
+    position = np.empty(len(sort_ind), dtype=np.int64)
+    position[sort_ind] = np.arange(len(sort_ind))
+    schedule = np.split(position, np.cumsum([len(t) for t in times])[:-1])
+    for sample_ind in schedule:
+        sample_ind.flags.writeable = False
+    return tuple(schedule)
+
+
+@lru_cache(maxsize=32)
+def _demux_plans(seconds, schedule_key):
+    """
+    A Demux, or None, for each sensor of _sample_schedule
+    """
+    schedule = _sample_schedule(seconds, schedule_key)
+    return tuple(demux_plan(sample_ind, key[1])
+                 for sample_ind, key in zip(schedule, schedule_key))
+
+
+def demux_plan(sample_ind, channels):
+    """
+    Find the shortest period of the sample indices, in whole samples of
+    the sensor. Schedules repeat every major interval, the page is then
+    demultiplexed with a reshape rather than a gather of every sample.
+    Return None if the indices aren't periodic.
+    """
+    n = len(sample_ind)
+    widths = np.arange(channels, n // 2 + 1, channels)
+    if not len(widths):
+        return None
+    # cheap test of the first samples of every candidate width at once
+    head = np.arange(min(4 * channels, n - widths[-1]))
+    shifts = sample_ind[widths[:, None] + head] - sample_ind[head]
+    candidates = widths[np.all(shifts == shifts[:, :1], axis=1)]
+    for width in candidates:
+        period = sample_ind[width] - sample_ind[0]
+        if np.all(sample_ind[width:] - sample_ind[:-width] == period):
+            break
+    else:
+        return None
+    offsets = sample_ind[:width] - sample_ind[0]
+    return Demux(int(sample_ind[0]), int(period), offsets, int(width),
+                 n // width, _group_runs(offsets, channels))
+
+
+def _group_runs(offsets, channels):
+    """
+    Split the channel groups of a period into runs of evenly spaced groups,
+    as (offset, groups, stride) tuples. None if the channels of a group
+    aren't next to each other or if there are more than MAX_DEMUX_RUNS runs.
+    """
+    groups = offsets.reshape(-1, channels)
+    if not np.all(groups - groups[:, :1] == np.arange(channels)):
+        return None
+    starts = groups[:, 0].tolist()
+    runs = []
+    i = 0
+    while i < len(starts):
+        stride = starts[i + 1] - starts[i] if i + 1 < len(starts) else 1
+        n = 1
+        while (i + n < len(starts)
+               and starts[i + n] - starts[i + n - 1] == stride):
+            n += 1
+        runs.append((starts[i], n, stride if n > 1 else channels))
+        i += n
+    if len(runs) > MAX_DEMUX_RUNS:
+        return None
+    return tuple(runs)
+
+
+def full_sample_times(seconds, channels, interval, burst_rate, burst_count):
+    """
+    The elapsed time in seconds from the start of the data page when a
+    sensor samples. n channel sensors return n times per sample.
+    """
+    interval_start = np.arange(0, seconds, interval)
+    burst_offset = np.arange(burst_count) / burst_rate
+    times = (interval_start[:, None] + burst_offset[None, :]).ravel()
+    return np.repeat(times, channels)
 
 
 def _add_temperature_dependency(sensors):
@@ -74,14 +171,16 @@ def major_interval_info(header):
     a major interval.
     """
     major_interval = header.major_interval()
-    sensors = create_sensors(header, None, major_interval)
     n_bytes = 0
-    for s in sensors:
-        n_bytes += s.samples_per_page() * 2
+    for s in _build_sensors(header, None, major_interval):
+        n_bytes += len(s.full_sample_times()) * 2
     return major_interval, n_bytes
 
 
 class Sensor:
+    # a StageTimer when the conversion stages are timed
+    timer = NULL_TIMER
+
     def __init__(self, sensor_spec, header, calibration, seconds):
         self.sensor_spec = sensor_spec
         self.name = sensor_spec.name
@@ -92,10 +191,17 @@ class Sensor:
         self.burst_count = header.tag(sensor_spec.burst_count_tag) or 1
         self.data_type = sensor_spec.data_type
         self.sample_ind = None
+        self.demux = None
         self.seconds = seconds
         self.order = sensor_spec.order
-        self.cache = {'page_time': None, 'data': None}
+        # the last converted page, shared by all the data products
+        self.cache = {'page': None,
+                      'page_time': None,
+                      'average': None,
+                      'data': None}
         self._full_sample_times_cache = None
+        # work arrays of _check_range and _masked_mean, reused page after page
+        self._buffers = {}
         if calibration:
             self.converter = sensor_spec.converter(calibration)
 
@@ -105,10 +211,12 @@ class Sensor:
         sensor samples. n channel sensors return n times per sample.
         """
         if self._full_sample_times_cache is None:
-            times = [[interval+burst/self.burst_rate]*self.channels
-                     for interval in range(0, self.seconds, self.interval)
-                     for burst in range(self.burst_count)]
-            self._full_sample_times_cache = list(chain.from_iterable(times))
+            self._full_sample_times_cache = full_sample_times(
+                self.seconds,
+                self.channels,
+                self.interval,
+                self.burst_rate,
+                self.burst_count)
         return self._full_sample_times_cache
 
     def _parse_page(self, data_page):
@@ -116,60 +224,187 @@ class Sensor:
         Return raw data and time as a tuple
         """
         index = np.searchsorted(self.sample_ind, len(data_page))
-        sample_ind = self.sample_ind[:index]
-        sensor_data = self._remove_partial_burst(data_page[sample_ind])
-        sensor_data = self._reshape_to_n_channels(sensor_data)
-        sensor_data = sensor_data.astype(self.data_type)
+        samples_per_burst = self.burst_count * self.channels
+        n_samples = floor(index / samples_per_burst) * samples_per_burst
+        sensor_data = self._demultiplex(data_page, n_samples)
+        sensor_data = self._as_data_type(sensor_data)
+        # a copy only for 3-d blocks, whose periods can't be flattened
+        sensor_data = sensor_data.reshape(self.channels, -1)
+        sensor_data = sensor_data[:, :n_samples // self.channels]
         n_samples = sensor_data.shape[1]
         time = self._sample_times()[:n_samples]
         return sensor_data, time
 
-    def _remove_partial_burst(self, sensor_data):
-        samples_per_burst = self.burst_count * self.channels
-        n_bursts = floor(len(sensor_data) / samples_per_burst)
-        return sensor_data[:n_bursts * samples_per_burst]
+    def _demultiplex(self, data_page, n_samples):
+        """
+        The page samples of the sensor, one row per channel, at least
+        n_samples of them. A periodic schedule of evenly spaced channel
+        groups is cut out of the page as a strided view, (channels, samples)
+        when the periods line up and (channels, periods, groups) otherwise.
+        Groups spaced unevenly are a few such views joined by one copy.
+        Other schedules and pages ending in the middle of a period are
+        gathered sample by sample, which is the only copy too.
+        """
+        demux = self.demux
+        if demux and demux.runs is not None:
+            # the page may end after the last sample of the last period
+            span = int(demux.offsets[-1]) + 1
+            n_periods = min(-(-n_samples // demux.width),
+                            demux.n_periods,
+                            max(len(data_page) - demux.start - span
+                                + demux.period, 0) // demux.period)
+            if n_periods * demux.width >= n_samples:
+                block = data_page[demux.start:
+                                  demux.start + (n_periods - 1) * demux.period
+                                  + span]
+                return self._channel_groups(block, n_periods)
+        sensor_data = data_page[self.sample_ind[:n_samples]]
+        return self._reshape_to_n_channels(sensor_data)
+
+    def _channel_groups(self, block, n_periods):
+        demux = self.demux
+        step = block.strides[0]
+        views = []
+        for offset, n_groups, stride in demux.runs:
+            if len(demux.runs) == 1 and (n_groups == 1
+                                         or n_groups * stride == demux.period):
+                # the groups are evenly spaced across periods too
+                stride = demux.period if n_groups == 1 else stride
+                return as_strided(block,
+                                  shape=(self.channels, n_periods * n_groups),
+                                  strides=(step, stride * step),
+                                  writeable=False)
+            views.append(as_strided(block[offset:],
+                                    shape=(self.channels, n_periods, n_groups),
+                                    strides=(step, demux.period * step,
+                                             stride * step),
+                                    writeable=False))
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views, axis=2)
+
+    def _as_data_type(self, sensor_data):
+        data_type = np.dtype(self.data_type)
+        if (sensor_data.dtype.kind in 'iu' and data_type.kind in 'iu'
+                and sensor_data.dtype.itemsize == data_type.itemsize
+                and sensor_data.dtype.isnative):
+            # int16 <-> uint16 wrap around the same way as astype
+            return sensor_data.view(data_type)
+        return sensor_data.astype(data_type, order='C', copy=False)
 
     def _sample_times(self):
         """
         1-d sample times. If a sensor has n channels, only one time is returned
         for each sample
         """
-        full_sample_times = self.full_sample_times()
-        full_sample_times = self._reshape_to_n_channels(full_sample_times)
-        return full_sample_times[0, :]
+        sample_times = self._reshape_to_n_channels(self.full_sample_times())
+        # a copy, callers shift the times in place
+        return sample_times[0, :].copy()
 
     def _average_bursts(self, data, time):
+        """
+        The mean of each burst, ignoring NaN like np.nanmean. Bursts are
+        averaged with a plain mean, then only the bursts holding a NaN (their
+        mean is NaN) are averaged again over their valid samples.
+        """
         if self.burst_count == 1:
             return data, time
-        data = np.nanmean(
-            np.reshape(data, (self.channels, -1, self.burst_count)),
-            axis=2)
+        bursts = np.reshape(data, (self.channels, -1, self.burst_count))
+        data = np.mean(bursts, axis=2)
         time = time[::self.burst_count]
+        has_nan = np.isnan(data)
+        n_nan = np.count_nonzero(has_nan)
+        if n_nan * 2 > has_nan.size:
+            data = self._masked_mean(bursts)
+        elif n_nan:
+            data[has_nan] = self._masked_mean(bursts[has_nan])
         return data, time
 
+    def _masked_mean(self, bursts):
+        """
+        np.nanmean over the last axis, in reused work arrays
+        """
+        is_nan = self._scratch('is_nan', bursts.shape, bool)
+        filled = self._scratch('filled', bursts.shape, bursts.dtype)
+        np.isnan(bursts, out=is_nan)
+        np.copyto(filled, bursts)
+        np.copyto(filled, 0, where=is_nan)
+        sums = np.sum(filled, axis=-1)
+        counts = self.burst_count - np.count_nonzero(is_nan, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.true_divide(sums, counts, out=sums)
+
+    def _scratch(self, name, shape, dtype):
+        """
+        A work array kept from page to page, reallocated when the page
+        shape changes (usually only for the last page)
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape \
+                or buffer.dtype != np.dtype(dtype):
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+        return buffer
+
     def _reshape_to_n_channels(self, data):
         return np.reshape(data, (self.channels, -1), order='F')
 
     def samples_per_page(self):
         return len(self.sample_ind)
 
-    def convert(self, data_page, average, page_time):
-        if self.cache['page_time'] == page_time:
+    def _cached(self, data_page, average, page_time):
+        """
+        The converted data and time if this page was already converted,
+        otherwise None. The page is compared by identity, the same page
+        object is passed to every data product.
+        """
+        if (self.cache['page'] is data_page
+                and self.cache['page_time'] == page_time
+                and self.cache['average'] == average):
             return self.cache['data']
-        raw_data, time = self._parse_page(data_page)
-        data = self.converter.convert(raw_data)
-        data = self._check_range(data)
+        return None
+
+    def _cache(self, data_page, average, page_time, data):
+        self.cache = {'page': data_page,
+                      'page_time': page_time,
+                      'average': average,
+                      'data': data}
+        return data
+
+    def convert(self, data_page, average, page_time):
+        cached = self._cached(data_page, average, page_time)
+        if cached is not None:
+            return cached
+        raw_data, time = self._demux(data_page)
+        with self.timer.stage('calibrate', self.name):
+            data = self.converter.convert(raw_data)
+            data = self._check_range(data)
         if average:
-            data, time = self._average_bursts(data, time)
+            data, time = self._average(data, time)
         time += page_time
-        self.cache = {'page_time': page_time, 'data': (data, time)}
-        return self.cache['data']
+        return self._cache(data_page, average, page_time, (data, time))
+
+    def _demux(self, data_page):
+        with self.timer.stage('demux', self.name):
+            raw_data, time = self._parse_page(data_page)
+        self.timer.add_bytes('demux', self.name, raw_data.nbytes)
+        return raw_data, time
+
+    def _average(self, data, time):
+        with self.timer.stage('average', self.name):
+            return self._average_bursts(data, time)
 
     def _check_range(self, data):
         valid_range = self.sensor_spec.valid_range
-        not_valid = np.logical_or(data < valid_range[0], data > valid_range[1])
+        not_valid = self._scratch('not_valid', data.shape, bool)
+        above = self._scratch('above', data.shape, bool)
+        np.less(data, valid_range[0], out=not_valid)
+        np.greater(data, valid_range[1], out=above)
+        np.logical_or(not_valid, above, out=not_valid)
+        if not np.any(not_valid):
+            return data
         data[not_valid] = np.nan
-        if np.any(not_valid) and self.sensor_spec.channels > 1:
+        if self.sensor_spec.channels > 1:
             # in multi channel sensors, delete the other samples in the other
             # channels when a bad sample is encountered
             bad_cols = np.unique(np.where(not_valid)[1])
@@ -185,29 +420,34 @@ class TempDependantSensor(Sensor):
     def convert(self, data_page, average, page_time):
         if not self.temperature:
             return super().convert(data_page, average, page_time)
-        raw_data, time = self._parse_page(data_page)
+        cached = self._cached(data_page, average, page_time)
+        if cached is not None:
+            return cached
+        raw_data, time = self._demux(data_page)
         time += page_time
         temp, temp_time = self.temperature.convert(data_page,
                                                    average,
                                                    page_time)
-        temp_interp = np.interp(time, temp_time, temp[0, :])
-        data = self.converter.convert(raw_data, temp_interp)
+        with self.timer.stage('calibrate', self.name):
+            temp_interp = np.interp(time, temp_time, temp[0, :])
+            data = self.converter.convert(raw_data, temp_interp)
         if average:
-            data, time = self._average_bursts(data, time)
-        return data, time
+            data, time = self._average(data, time)
+        return self._cache(data_page, average, page_time, (data, time))
 
 
 class PressureSensor(Sensor):
     def convert(self, data_page, average, page_time):
-        if self.cache['page_time'] == page_time:
-            return self.cache['data']
-        raw_data, time = self._parse_page(data_page)
-        data = self.converter.convert(raw_data)
-        data = self._check_range(data)
+        cached = self._cached(data_page, average, page_time)
+        if cached is not None:
+            return cached
+        raw_data, time = self._demux(data_page)
+        with self.timer.stage('calibrate', self.name):
+            data = self.converter.convert(raw_data)
+            data = self._check_range(data)
         if self.burst_count < self._header.tag('BMN'):
             data[0, self.burst_count-1:np.size(data, 1):self.burst_count] = np.nan
         if average:
-            data, time = self._average_bursts(data, time)
+            data, time = self._average(data, time)
         time += page_time
-        self.cache = {'page_time': page_time, 'data': (data, time)}
-        return self.cache['data']
+        return self._cache(data_page, average, page_time, (data, time))
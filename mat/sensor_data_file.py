@@ -4,25 +4,32 @@
 from mat.header import Header
 from mat.calibration_factories import calibration_from_string
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+import numpy as np
 
 
 FULL_HEADER_LENGTH = 1000
 
 
 class SensorDataFile(ABC):
-    def __init__(self, file_path, calibration=None):
+    # number of page views kept by page(), a page view costs no memory
+    # beyond the mapped file, so this only bounds the bookkeeping
+    PAGE_CACHE_SIZE = 8
+
+    def __init__(self, file_path, calibration=None, index_cache=False):
         self._file_path = file_path
+        self._index_cache = index_cache
         self._file = None
+        self._mapped_file = None
         self._header = None
         self.header_error = None
         self._calibration = calibration
         self._page_times = None
-        self._cached_page = None
-        self._cached_page_n = None
+        self._page_cache = OrderedDict()
         self._file_size = None
         self._mini_header_length = None
         self._samples_per_page = None
-        self._mini_headers = []
+        self._page_index = None
         self._n_pages = None
         self._n_pages = self.n_pages()
         if self.data_bytes() == 0:
@@ -50,11 +57,14 @@ class SensorDataFile(ABC):
         pass  # pragma: no cover
 
     def page(self, i):
-        if self._cached_page_n == i:
-            return self._cached_page
-        self._cached_page_n = i
-        self._cached_page = self._load_page(i)
-        return self._cached_page
+        if i in self._page_cache:
+            self._page_cache.move_to_end(i)
+            return self._page_cache[i]
+        page = self._load_page(i)
+        self._page_cache[i] = page
+        if len(self._page_cache) > self.PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+        return page
 
     def header(self):
         if self._header:
@@ -81,6 +91,17 @@ class SensorDataFile(ABC):
             self._file = open(self._file_path, 'rb')
         return self._file
 
+    def mapped_file(self):
+        """
+        Read-only uint8 memory map of the whole file. Slices of it are views,
+        so pages can be served without copying or extra syscalls.
+        """
+        if self._mapped_file is None:
+            self._mapped_file = np.memmap(self._file_path,
+                                          dtype=np.uint8,
+                                          mode='r')
+        return self._mapped_file
+
     def file_size(self):
         if self._file_size:
             return self._file_size
@@ -104,6 +125,9 @@ class SensorDataFile(ABC):
         if self._file:
             self._file.close()
         self._file = None
+        # the map is released once the last page view is garbage collected
+        self._page_cache.clear()
+        self._mapped_file = None
 
     def __del__(self):
         if self._file:
@@ -0,0 +1,132 @@
+"""
+Opt-in timing of the stages of a conversion.
+
+The wall time, call count and bytes of each stage are accumulated per
+sensor, data product or output stream:
+
+read       getting a data page from the source file. Pages are memory
+           mapped, the disk is mostly read when demux first touches them
+demux      gathering the raw samples of a sensor out of a page
+calibrate  raw values to physical units, with the valid range check
+average    burst averaging
+derive     data products math (orientation, tilt curve, ...)
+write      formatting and writing the output
+
+Stages nest, the time of a stage doesn't include the stages it calls, so
+the stage times add up to the conversion time. When timing is off, the
+NULL_TIMER is used, its stages do nothing.
+"""
+
+from time import perf_counter
+
+
+STAGES = ('read', 'demux', 'calibrate', 'average', 'derive', 'write')
+
+
+class StageTimer:
+    def __init__(self):
+        # (stage, name) -> [seconds, calls, bytes]
+        self.counts = {}
+        self._running = []
+
+    def stage(self, stage, name=''):
+        """
+        Context manager timing a stage. name is the sensor, data product or
+        stream the stage is run for.
+        """
+        return _Stage(self, stage, name)
+
+    def add_bytes(self, stage, name, n_bytes):
+        self._count(stage, name)[2] += n_bytes
+
+    def _count(self, stage, name):
+        count = self.counts.get((stage, name))
+        if count is None:
+            count = self.counts[(stage, name)] = [0.0, 0, 0]
+        return count
+
+    def pop_counts(self):
+        """
+        Return and reset the counts, to send them to another process
+        """
+        counts, self.counts = self.counts, {}
+        return counts
+
+    def merge(self, counts):
+        for key, (seconds, calls, n_bytes) in counts.items():
+            count = self._count(*key)
+            count[0] += seconds
+            count[1] += calls
+            count[2] += n_bytes
+
+    def summary(self):
+        """
+        {'stages': {stage: totals}, 'details': {stage: {name: totals}}}
+        where totals is {'seconds': ..., 'calls': ..., 'bytes': ...}
+        """
+        stages = {}
+        details = {}
+        for (stage, name), (seconds, calls, n_bytes) in self.counts.items():
+            totals = {'seconds': seconds, 'calls': calls, 'bytes': n_bytes}
+            if name:
+                details.setdefault(stage, {})[name] = totals
+            stage_totals = stages.setdefault(
+                stage, {'seconds': 0.0, 'calls': 0, 'bytes': 0})
+            for key, value in totals.items():
+                stage_totals[key] += value
+        return {'stages': stages, 'details': details}
+
+
+class _Stage:
+    __slots__ = ('timer', 'key', 'start', 'nested')
+
+    def __init__(self, timer, stage, name):
+        self.timer = timer
+        self.key = (stage, name)
+        self.start = None
+        self.nested = 0.0
+
+    def __enter__(self):
+        self.timer._running.append(self)
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = perf_counter() - self.start
+        running = self.timer._running
+        running.pop()
+        if running:
+            running[-1].nested += elapsed
+        count = self.timer._count(*self.key)
+        count[0] += elapsed - self.nested
+        count[1] += 1
+        return False
+
+
+class NullTimer:
+    def stage(self, stage, name=''):
+        return _NULL_STAGE
+
+    def add_bytes(self, stage, name, n_bytes):
+        pass
+
+    def pop_counts(self):
+        return {}
+
+    def merge(self, counts):
+        pass
+
+    def summary(self):
+        return None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+NULL_TIMER = NullTimer()
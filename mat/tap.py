@@ -1,13 +1,17 @@
 import datetime
+import mmap
 import os
 import sys
 import humanize
+import numpy as np
 from functools import lru_cache
-from math import ceil, floor
+from math import floor
 from dateutil.tz import tzlocal, tzutc
 from humanize import naturaldelta
 
 from mat.ascii85 import ascii85_to_num
+from mat.lix import (lix_chunks, lix_close, lix_data_bytes,
+                     lix_micro_headers)
 from mat.pressure import Pressure
 from mat.temperature import Temperature
 
@@ -396,11 +400,7 @@ def _parse_chunk_type(b: bytes, ic) -> dict:
 
     # check header index
     hdr_idx = b[i]
-    global g_header_index
-    if g_header_index % 256 != hdr_idx:
-        e = f'warning: g_header_index {g_header_index} does not match hdr_idx {hdr_idx}'
-        _p(e)
-    g_header_index += 1
+    _check_header_index(hdr_idx)
     _p("\theader index \t|  0x{:02x} = {}".format(hdr_idx, hdr_idx))
     i += 1
 
@@ -427,29 +427,55 @@ def _parse_chunk_type(b: bytes, ic) -> dict:
     return di
 
 
+def _check_header_index(hdr_idx):
+    global g_header_index
+    if g_header_index % 256 != hdr_idx:
+        _p(f'warning: g_header_index {g_header_index} '
+           f'does not match hdr_idx {hdr_idx}')
+    g_header_index += 1
+
+
+def _check_header_indexes(uh):
+    # _check_header_index() of micro-headers at once
+    global g_header_index
+    expected = (g_header_index + np.arange(len(uh))) % 256
+    for i in np.flatnonzero(uh['idx'] != expected).tolist():
+        _p(f'warning: g_header_index {g_header_index + i} '
+           f'does not match hdr_idx {uh["idx"][i]}')
+    g_header_index += len(uh)
+
+
 def _parse_file_lix(filepath):
 
-    # load file input as bytes
+    # load file input as memory mapped chunks
     _p(f"converting file {filepath}")
     with open(filepath, "rb") as fi:
         # all of them
-        bytes_file = fi.read()
+        bytes_file = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _parse_chunks_lix(bytes_file)
+    finally:
+        # the data is a copy, the chunk views are gone with their frame
+        lix_close(bytes_file)
+
+
+def _parse_chunks_lix(bytes_file):
+    chunks = lix_chunks(bytes_file)
 
     # calculate variables
     global _fresh
     _fresh = True
-    sc = PRF_FILE_CHUNK_SIZE
-    number_of_chunks = ceil(len(bytes_file) / sc)
+    number_of_chunks = len(chunks)
     _p(f"file length = {len(bytes_file)}")
     _p(f"file chunks = {number_of_chunks}")
     d = dict()
-    d['all_sensor_data'] = bytes()
 
-    # -----------------------
-    # loop chunks in a file
-    # -----------------------
-    for ic in range(number_of_chunks):
-        bytes_chunk = bytes_file[ic * sc: (ic * sc) + sc]
+    # ------------------------------------------------------
+    # loop chunks in a file, one by one only for the
+    # macro-header and to display them when verbose
+    # ------------------------------------------------------
+    for ic in range(number_of_chunks if g_verbose else 1):
+        bytes_chunk = chunks[ic].tobytes()
         # ---------------------------------
         # parse chunk type: macro or micro
         # ---------------------------------
@@ -459,8 +485,15 @@ def _parse_file_lix(filepath):
         if _ct['header_type'] == 'macro':
             d['macro_header'] = _ct
             _show_bytes(bytes_chunk, 8)
-        if _ct['header_type'] == 'micro':
-            d['all_sensor_data'] += _ct['data_bytes']
+
+    # all micro chunks data at once, byte 3 is their padding count
+    data_chunks = chunks[1:] if 'macro_header' in d else chunks
+    d['all_sensor_data'] = lix_data_bytes(data_chunks, data_chunks[:, 3])
+
+    # chunks the loop above skipped, their index is still checked
+    if not g_verbose:
+        _check_header_indexes(
+            lix_micro_headers(chunks[1:, :LEN_MICRO_HEADER]))
 
     # dictionary with bot header info and all BINARY data
     return d
@@ -3,6 +3,8 @@ import numpy as np
 
 
 EPOCH = np.datetime64('1970-01-01T00:00:00.000')
+DIGITS = np.frombuffer(b'0123456789', dtype=np.uint8)
+MS_SUFFIX_LENGTH = len('.000')
 
 
 def create_time_converter(time_format):
@@ -19,28 +21,39 @@ class TimeConverter(ABC):
         pass  # pragma: no cover
 
     @abstractmethod
+    def format_bytes(self, time):
+        """
+        Return the times as a fixed-width byte string array
+        """
+        pass  # pragma: no cover
+
     def convert(self, time):
-        pass
+        return self.format_bytes(time).astype('U')
 
 
 class Iso8601(TimeConverter):
     def header_str(self):
         return 'ISO 8601 Time'
 
-    def convert(self, time):
-        time_objects = EPOCH + (time * 1000).astype('timedelta64[ms]')
-        time_strings = np.datetime_as_string(time_objects)
-        return time_strings
+    def format_bytes(self, time):
+        # truncated to the millisecond, like a cast to timedelta64[ms]
+        ms = (np.asarray(time) * 1000).astype(np.int64)
+        seconds, ms = np.divmod(ms, 1000)
+        return join_seconds_ms(seconds, ms, self._format_seconds)
+
+    def _format_seconds(self, seconds):
+        return np.datetime_as_string(
+            seconds.astype('datetime64[s]')).astype('S')
 
 
 class Legacy(Iso8601):
     def header_str(self):
         return 'Date,Time'
 
-    def convert(self, time):
-        time_strings = super().convert(time)
+    def _format_seconds(self, seconds):
+        time_strings = super()._format_seconds(seconds)
         # replace the "T" with a ","
-        time_strings[..., None].view('U1')[..., 10] = ','
+        time_strings[..., None].view('S1')[..., 10] = b','
         return time_strings
 
 
@@ -48,8 +61,8 @@ class Posix(TimeConverter):
     def header_str(self):
         return 'POSIX Time'
 
-    def convert(self, time):
-        return ['{:0.3f}'.format(x) for x in time]
+    def format_bytes(self, time):
+        return format_decimal_seconds(time)
 
 
 class Elapsed(TimeConverter):
@@ -59,7 +72,145 @@ class Elapsed(TimeConverter):
     def header_str(self):
         return 'Elapsed Seconds'
 
-    def convert(self, time):
+    def format_bytes(self, time):
         if self.start_time is None:
             self.start_time = time[0]
-        return ['{:0.3f}'.format(x-self.start_time) for x in time]
+        return format_decimal_seconds(np.asarray(time) - self.start_time)
+
+
+def join_seconds_ms(seconds, ms, format_seconds):
+    """
+    Byte strings made of a whole second prefix followed by '.mmm'.
+    format_seconds turns an array of seconds into a byte string array, it
+    is called once for the distinct seconds of the page rather than for
+    every sample.
+    """
+    unique, inverse = np.unique(seconds, return_inverse=True)
+    prefixes = format_seconds(unique)
+    lengths = np.char.str_len(prefixes)
+    width = int(lengths.max()) if len(lengths) else 0
+    table = np.zeros((len(unique), width + MS_SUFFIX_LENGTH), np.uint8)
+    table[:, :width] = prefixes.view(np.uint8).reshape(
+        len(unique), prefixes.dtype.itemsize)[:, :width]
+    out = table[inverse.ravel()]
+    columns = lengths[inverse.ravel()][:, None] + np.arange(MS_SUFFIX_LENGTH)
+    out[np.arange(len(out))[:, None], columns] = _ms_suffix(ms)
+    return out.view('S{}'.format(out.shape[1])).ravel()
+
+
+def _ms_suffix(ms):
+    suffix = np.empty((len(ms), MS_SUFFIX_LENGTH), np.uint8)
+    suffix[:, 0] = ord('.')
+    suffix[:, 1] = DIGITS[ms // 100]
+    suffix[:, 2] = DIGITS[ms // 10 % 10]
+    suffix[:, 3] = DIGITS[ms % 10]
+    return suffix
+
+
+def format_integers(values):
+    """
+    Non-negative integers as left aligned byte strings
+    """
+    n_digits = len(str(values.max())) if len(values) else 1
+    powers = 10 ** np.arange(n_digits - 1, -1, -1, dtype=np.int64)
+    digits = DIGITS[values[:, None] // powers % 10]
+    lengths = np.maximum(np.sum(values[:, None] >= powers, axis=1), 1)
+    columns = np.arange(n_digits) + (n_digits - lengths)[:, None]
+    out = np.where(columns < n_digits,
+                   np.take_along_axis(digits,
+                                      np.minimum(columns, n_digits - 1),
+                                      axis=1),
+                   0).astype(np.uint8)
+    return out.view('S{}'.format(n_digits)).ravel()
+
+
+def format_decimal_seconds(time):
+    """
+    The same text as '{:0.3f}'.format(x) for every x, as byte strings
+    """
+    time = np.asarray(time, dtype=np.float64)
+    if len(time) == 0 or np.any(time < 0) or not np.all(np.isfinite(time)):
+        return _format_slow(time)
+    seconds = np.floor(time)
+    ms = round_ms(time - seconds)
+    carry = ms == 1000
+    seconds[carry] += 1
+    ms[carry] = 0
+    return join_seconds_ms(seconds.astype(np.int64), ms, format_integers)
+
+
+def round_ms(fraction):
+    """
+    Round fraction * 1000 half to even, using the exact binary value of
+    each fraction in [0, 1) as str.format does, not a rounded product
+    """
+    mantissa, exponent = np.frexp(fraction)
+    # fraction == numerator / 2 ** shift, with shift >= 53
+    numerator = np.ldexp(mantissa, 53).astype(np.int64) * 1000
+    shift = 53 - exponent.astype(np.int64)
+    # numerator < 2 ** 63, larger shifts leave less than half a ms
+    small = shift > 63
+    shift = np.minimum(shift, 63)
+    ms = numerator >> shift
+    remainder = numerator - (ms << shift)
+    half = np.int64(1) << (shift - 1)
+    ms += (remainder > half) | ((remainder == half) & (ms % 2 == 1))
+    ms[small] = 0
+    return ms
+
+
+def format_fixed(values, decimals):
+    """
+    The same text as '{:0.<decimals>f}'.format(x) for every x, as byte
+    strings. Values whose rounding the scaled float can't settle, near a
+    tie, too large or not finite, are formatted one by one.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10 ** decimals
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = np.abs(values) * scale
+        fraction = scaled - np.floor(scaled)
+        # the product is off by up to half an ulp of scaled
+        slow = ~(np.abs(fraction - 0.5) > scaled * 2.0 ** -50)
+        slow |= ~(scaled < 2.0 ** 52)
+    scaled[slow] = 0
+    rounded = np.rint(scaled).astype(np.int64)
+    text = concat_bytes([np.where(np.signbit(values), b'-', b''),
+                         format_integers(rounded // scale)]
+                        + _fraction_digits(rounded % scale, decimals))
+    if np.any(slow):
+        slow_text = _format_slow(values[slow], '{{:0.{}f}}'.format(decimals))
+        width = max(text.dtype.itemsize, slow_text.dtype.itemsize)
+        text = text.astype('S{}'.format(width))
+        text[slow] = slow_text
+    return text
+
+
+def _fraction_digits(fraction, decimals):
+    # [b'.', digits] or nothing for no decimals
+    if decimals == 0:
+        return []
+    powers = 10 ** np.arange(decimals - 1, -1, -1, dtype=np.int64)
+    digits = DIGITS[fraction[:, None] // powers % 10]
+    return [np.full(len(fraction), b'.'),
+            digits.view('S{}'.format(decimals)).ravel()]
+
+
+def concat_bytes(arrays):
+    """
+    Concatenate byte string arrays of the same length element by element
+    """
+    n = len(arrays[0])
+    block = np.hstack([np.ascontiguousarray(a, dtype='S').view(np.uint8)
+                       .reshape(n, -1) for a in arrays])
+    # byte strings are padded with zeros
+    filled = block != 0
+    lengths = np.count_nonzero(filled, axis=1)
+    width = max(int(lengths.max()), 1) if n else 1
+    out = np.zeros((n, width), np.uint8)
+    out[np.arange(width) < lengths[:, None]] = block[filled]
+    return out.view('S{}'.format(width)).ravel()
+
+
+def _format_slow(time, time_format='{:0.3f}'):
+    return np.array([time_format.format(x) for x in time], dtype='S')
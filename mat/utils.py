@@ -205,7 +205,7 @@ def lowell_cmd_dir_ans_to_dict(ls, ext, match=True):
 
 def write_sws_file(path, data):
     # the data are in int16 format. Convert back to 8 bit ascii values
-    data.dtype = np.uint8
+    data = data.view(np.uint8)
 
     # strip any nulls, etc.
     sws = ''.join([chr(x) for x in data if chr(x).isprintable()])
@@ -31,6 +31,16 @@ setup(name='mat',
           'pandas',
           'python-dateutil'
       ],
+      extras_require={
+          'parquet': ['pyarrow'],
+      },
+      entry_points={
+          'console_scripts': [
+              'mat-convert = mat.batch_converter:main',
+              'mat-benchmark = mat.benchmark:main',
+              'mat-quick-look = mat.quick_look:main',
+          ],
+      },
       classifiers=[
           "Development Status :: 3 - Alpha",
           "Environment :: MacOS X",
@@ -0,0 +1,72 @@
+import json
+import shutil
+from mat.batch_converter import (BatchConverter, convert_file,
+                                 find_logger_files, main)
+from mat.data_converter import default_parameters
+from tests.utils import (reference_file, write_lix_dox_file,
+                         write_lix_tdo_file, lix_tdo_measurement)
+
+
+def copy_reference_files(tmp_path, names):
+    for name in names:
+        shutil.copy(reference_file(name), str(tmp_path / name))
+    return str(tmp_path)
+
+
+class TestBatchConverter:
+    def test_find_logger_files(self, tmp_path):
+        folder = copy_reference_files(tmp_path, ['test.lid', 'bad.lid'])
+        assert len(find_logger_files(folder)) == 2
+        assert len(find_logger_files(folder + '/t*.lid')) == 1
+
+    def test_convert_largest_first(self, tmp_path):
+        names = ['test.lid', 'two_page_file.lid', 'bad.lid']
+        folder = copy_reference_files(tmp_path, names)
+        converter = BatchConverter(find_logger_files(folder),
+                                   default_parameters(),
+                                   workers=2)
+        percents = []
+        converter.register_observer(
+            lambda percent_done, result: percents.append(percent_done))
+        results = converter.convert()
+        assert [r.path.split('/')[-1] for r in results] == \
+            ['two_page_file.lid', 'test.lid', 'bad.lid']
+        assert [r.status for r in results] == ['ok', 'ok', 'error']
+        assert results[0].rows == 2700 + 180
+        assert sorted(p.split('/')[-1] for p in results[0].output_paths) == \
+            ['two_page_file_AccelMag.csv', 'two_page_file_Temperature.csv']
+        assert 'ValueError' in results[2].error
+        assert percents[-1] == 100
+
+    def test_main(self, tmp_path, capsys):
+        folder = copy_reference_files(tmp_path, ['test.lid'])
+        output_directory = tmp_path / 'out'
+        output_directory.mkdir()
+        assert main([folder, '--workers', '1', '--voltage',
+                     '--output-directory', str(output_directory)]) == 0
+        results = json.loads(capsys.readouterr().out)
+        assert results[0]['status'] == 'ok'
+        assert len(results[0]['output_paths']) == 3
+        assert (output_directory / 'test_Voltage.csv').exists()
+
+    def test_main_lix(self, tmp_path, capfd):
+        write_lix_tdo_file(str(tmp_path / 'tdo.lid'),
+                           [lix_tdo_measurement(1, 30000, [20000])] * 10)
+        write_lix_dox_file(str(tmp_path / 'dox.lid'), [(100, 200, 1797)] * 4)
+        assert main([str(tmp_path), '--workers', '1']) == 0
+        results = json.loads(capfd.readouterr().out)
+        assert sorted(r['rows'] for r in results) == [4, 10]
+
+    def test_convert_lix_columnar(self, tmp_path):
+        tdo_path = str(tmp_path / 'tdo.lid')
+        dox_path = str(tmp_path / 'dox.lid')
+        write_lix_tdo_file(tdo_path,
+                           [lix_tdo_measurement(1, 30000, [20000])] * 10)
+        write_lix_dox_file(dox_path, [(100, 200, 1797)] * 4)
+        parameters = default_parameters()
+        parameters['output_format'] = 'npy'
+        tdo = convert_file(tdo_path, parameters)
+        dox = convert_file(dox_path, parameters)
+        assert (tdo.status, tdo.rows) == ('ok', 10)
+        assert tdo.output_paths == [str(tmp_path / 'tdo_TDO.npy')]
+        assert (dox.status, dox.rows) == ('ok', 4)
@@ -0,0 +1,37 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from mat.benchmark import main, parse_tags, run_benchmarks
+
+
+class TestBenchmark:
+    def test_run_benchmarks(self):
+        report = run_benchmarks(1, ['discrete'], ['csv', 'npy'],
+                                {'BMN': 16, 'BMR': 16})
+        assert report['file']['pages'] == 1
+        assert report['file']['tags']['BMN'] == 16
+        assert [r['output_format'] for r in report['results']] == \
+            ['csv', 'npy']
+        for result in report['results']:
+            assert result['error'] is None
+            assert result['rows'] > 0
+            assert result['pages_per_second'] > 0
+            assert result['mb_per_second'] > 0
+
+    def test_error(self):
+        report = run_benchmarks(1, ['current'], ['csv'])
+        assert report['results'][0]['error'].startswith('AttributeError')
+
+    def test_main(self):
+        with TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            assert main(['--pages', '1',
+                         '--output-type', 'cable',
+                         '--output-format', 'hdf5',
+                         '--output', output]) == 0
+            with open(output) as fid:
+                assert json.load(fid)['results'][0]['output_type'] == 'cable'
+
+    def test_parse_tags(self):
+        assert parse_tags('BMN=32, PRS=1') == {'BMN': 32, 'PRS': 1}
+        assert parse_tags('') == {}
@@ -0,0 +1,37 @@
+import numpy as np
+from mat.column_statistics import battery_trend, ColumnStatistics
+
+
+class TestColumnStatistics:
+    def test_blocks_match_numpy(self):
+        rng = np.random.default_rng(0)
+        data = rng.normal(1000, 5, (2, 1000))
+        data[1, ::7] = np.nan
+        time = np.arange(1000.0)
+        statistics = ColumnStatistics(['A', 'B'])
+        for start in range(0, 1000, 300):
+            statistics.add(data[:, start:start + 300],
+                           time[start:start + 300])
+        report = statistics.report()
+        assert report['rows'] == 1000
+        assert report['end_time'] == '1970-01-01T00:16:39.000'
+        b = report['columns']['B']
+        assert b['nan_count'] == 143
+        assert b['count'] == 857
+        assert np.isclose(b['mean'], np.nanmean(data[1]))
+        assert np.isclose(b['std'], np.nanstd(data[1]))
+        assert b['min'] == np.nanmin(data[1])
+        assert b['max'] == np.nanmax(data[1])
+
+    def test_all_nan(self):
+        statistics = ColumnStatistics(['A'])
+        statistics.add(np.full((1, 3), np.nan), np.arange(3.0))
+        column = statistics.report()['columns']['A']
+        assert column['nan_count'] == 3
+        assert column['mean'] is None and column['min'] is None
+
+    def test_battery_trend(self):
+        trend = battery_trend([0, 86400, 172800], [3.6, 3.5, 3.4])
+        assert trend['start'] == 3.6 and trend['min'] == 3.4
+        assert np.isclose(trend['volts_per_day'], -0.1)
+        assert battery_trend([], []) is None
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mat.columnar_file import (columnar_file_factory, parquet_available,
+                               seconds_to_ms, NpyFile, TIME_COLUMN)
+
+
+COLUMNS = [(TIME_COLUMN, 'int64'), ('Ax (g)', 'float32')]
+
+
+class TestColumnarFile:
+    def test_npy_blocks(self, tmp_path):
+        f = columnar_file_factory(str(tmp_path / 'out'), COLUMNS, 'npy')
+        f.write([[1000, 2000], [0.5, 1.5]])
+        f.write([np.array([3000]), np.array([2.5])])
+        f.close()
+        data = np.load(str(tmp_path / 'out.npy'))
+        assert data.shape == (3, )
+        assert list(data[TIME_COLUMN]) == [1000, 2000, 3000]
+        assert list(data['Ax (g)']) == [0.5, 1.5, 2.5]
+        assert pd.DataFrame(data).columns[1] == 'Ax (g)'
+
+    def test_npy_header_is_aligned(self, tmp_path):
+        f = NpyFile(str(tmp_path / 'out'), COLUMNS)
+        f.close()
+        with open(f.path, 'rb') as fid:
+            header = fid.read(f._header_length)
+        assert len(header) % 64 == 0
+        assert np.load(f.path).shape == (0, )
+
+    def test_parquet(self, tmp_path):
+        f = columnar_file_factory(str(tmp_path / 'out'), COLUMNS, 'parquet')
+        f.write([[1000, 2000], [0.5, 1.5]])
+        f.write([[3000], [2.5]])
+        f.close()
+        if not parquet_available():
+            assert f.path.endswith('.npy')
+            return
+        data = pd.read_parquet(f.path)
+        assert list(data[TIME_COLUMN]) == [1000, 2000, 3000]
+        assert data['Ax (g)'].dtype == np.float32
+        import pyarrow.parquet as pq
+        assert pq.ParquetFile(f.path).num_row_groups == 2
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            columnar_file_factory(str(tmp_path / 'out'), COLUMNS, 'feather')
+
+    def test_seconds_to_ms(self):
+        assert list(seconds_to_ms([1.0005, 2.25])) == [1000, 2250]
@@ -2,9 +2,17 @@
 # Copyright (c) 2018 Lowell Instruments, LLC, some rights reserved
 
 
-from unittest import TestCase
+import os
+from datetime import datetime
+from tempfile import TemporaryDirectory
+import h5py
+import numpy as np
+import pandas as pd
+from unittest import TestCase, mock
 from mat.data_converter import DataConverter, default_parameters
 from mat.data_file_factory import load_data_file, WrongFileTypeError
+from mat.columnar_file import parquet_available
+from mat.sensor import Sensor
 from tests.utils import reference_file, compare_files
 from tests.utils import assert_compare_expected_file
 from mat.tiltcurve import TiltCurve
@@ -159,3 +167,325 @@ class TestDataConverter(TestCase):
                       reference_file('test_AccelMag-posix.csv.expect'))
         compare_files(reference_file('calley_Temperature.csv'),
                       reference_file('test_Temperature-posix.csv.expect'))
+
+    def test_parallel_conversion(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['workers'] = 2
+        dc = DataConverter(full_file_path, parameters)
+        percents = []
+        dc.register_observer(lambda percent_done: percents.append(percent_done))
+        dc.convert()
+        assert percents == [50, 100]
+        parameters['workers'] = 1
+        parameters['file_name'] = 'serial'
+        DataConverter(full_file_path, parameters).convert()
+        for stream in ['AccelMag', 'Temperature']:
+            assert_compare_expected_file('two_page_file_{}.csv'.format(stream),
+                                         'serial_{}.csv'.format(stream))
+            os.remove(reference_file('serial_{}.csv'.format(stream)))
+
+    def test_hdf5(self):
+        full_file_path = reference_file('two_page_file.lid')
+        hdf_path = reference_file('two_page_file.hdf5')
+        parameters = default_parameters()
+        parameters['output_format'] = 'hdf5'
+        for compression in ['gzip', 'lzf', None]:
+            parameters['hdf5_compression'] = compression
+            DataConverter(full_file_path, parameters).convert()
+            with h5py.File(hdf_path, 'r') as file:
+                assert file['AccelMag']['Data'].shape == (2700, 6)
+                assert file['AccelMag']['Data'].compression == compression
+                assert file['Temperature']['Time'].shape == (180, )
+                assert file['Temperature']['Time'][-1] == 1535711626
+            os.remove(hdf_path)
+
+    def test_npy(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['output_format'] = 'npy'
+        parameters['columnar_dtype'] = 'float32'
+        converter = DataConverter(full_file_path, parameters)
+        converter.convert()
+        temperature = np.load(reference_file('two_page_file_Temperature.npy'))
+        assert temperature.dtype['Time (ms)'] == np.int64
+        assert temperature.dtype['Temperature (C)'] == np.float32
+        assert temperature.shape == (180, )
+        assert temperature['Time (ms)'][-1] == 1535711626000
+        assert converter.rows_written() == 2700 + 180
+        for output_path in converter.output_paths():
+            os.remove(output_path)
+
+    def test_parquet(self):
+        if not parquet_available():
+            self.skipTest('no Parquet engine')
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['output_format'] = 'parquet'
+        DataConverter(full_file_path, parameters).convert()
+        parquet_path = reference_file('two_page_file_AccelMag.parquet')
+        accel_mag = pd.read_parquet(parquet_path)
+        assert accel_mag.shape == (2700, 7)
+        assert accel_mag.columns[0] == 'Time (ms)'
+        assert accel_mag['Time (ms)'].dtype == np.int64
+        os.remove(parquet_path)
+        os.remove(reference_file('two_page_file_Temperature.parquet'))
+
+    def test_iter_pages(self):
+        full_file_path = reference_file('two_page_file.lid')
+        pages = list(DataConverter(full_file_path,
+                                   default_parameters()).iter_pages())
+        assert [(p.page, p.stream) for p in pages] == \
+            [(0, 'AccelMag'), (0, 'Temperature'),
+             (1, 'AccelMag'), (1, 'Temperature')]
+        assert pages[0].data.shape == (1350, 6)
+        assert pages[0].columns[0] == 'Ax (g)'
+        assert len(pages[3].time) == 90
+        assert pages[3].time[-1] == 1535711626
+
+    def test_to_dataframes(self):
+        full_file_path = reference_file('two_page_file.lid')
+        dataframes = DataConverter(full_file_path,
+                                   default_parameters()).to_dataframes()
+        assert dataframes['AccelMag'].shape == (2700, 6)
+        temperature = dataframes['Temperature']
+        assert list(temperature.columns) == ['Temperature (C)']
+        assert temperature.index[-1] == pd.Timestamp(1535711626, unit='s')
+
+    def test_time_window(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['start_time'] = 1535711536.5
+        parameters['end_time'] = datetime(2018, 8, 31, 10, 33, 20)
+        converter = DataConverter(full_file_path, parameters)
+        assert converter.page_range() == range(1, 2)
+        dataframes = converter.to_dataframes()
+        temperature = dataframes['Temperature']
+        assert temperature.shape == (4, 1)
+        assert temperature.index[0] >= pd.Timestamp(1535711536.5, unit='s')
+        assert temperature.index[-1] < pd.Timestamp(1535711600, unit='s')
+        assert dataframes['AccelMag'].shape == (63, 6)
+
+    def test_time_window_conversion(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['start_time'] = 1535711600
+        for workers in [1, 2]:
+            parameters['workers'] = workers
+            converter = DataConverter(full_file_path, parameters)
+            converter.convert()
+            assert converter.rows_written() == 41 + 2
+        for output_path in converter.output_paths():
+            os.remove(output_path)
+
+    def test_multiple_output_types(self):
+        full_file_path = reference_file('test.lid')
+        tilt_file_path = reference_file('tiltcurve/TCM-1, 1BalSalt.cal')
+        parameters = default_parameters()
+        parameters['tilt_curve'] = TiltCurve(tilt_file_path)
+        with TemporaryDirectory() as single, TemporaryDirectory() as multi:
+            parameters['output_directory'] = single
+            for output_type in ['current', 'ypr', 'discrete']:
+                parameters['output_type'] = output_type
+                DataConverter(full_file_path, parameters).convert()
+            parameters['output_directory'] = multi
+            parameters['output_type'] = ['current', 'ypr', 'discrete']
+            dc = DataConverter(full_file_path, parameters)
+            with mock.patch.object(Sensor, '_parse_page',
+                                   autospec=True,
+                                   side_effect=Sensor._parse_page) as parse:
+                dc.convert()
+            # accelerometer, magnetometer and temperature, once per page
+            assert parse.call_count == 3 * dc.source_file.n_pages()
+            assert sorted(os.listdir(multi)) == sorted(os.listdir(single))
+            for name in os.listdir(multi):
+                with open(os.path.join(single, name)) as expected, \
+                        open(os.path.join(multi, name)) as new:
+                    assert new.read() == expected.read()
+
+    def test_resume(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['resume'] = True
+        parameters['time_format'] = 'elapsed'
+        with TemporaryDirectory() as full, TemporaryDirectory() as resumed:
+            parameters['output_directory'] = full
+            DataConverter(full_file_path, parameters).convert()
+            parameters['output_directory'] = resumed
+            dc = DataConverter(full_file_path, parameters)
+            dc.register_observer(lambda percent_done: dc.cancel_conversion())
+            dc.convert()
+            assert os.path.exists(dc.checkpoint.path)
+            # rows of an interrupted page, after the checkpoint
+            for name in os.listdir(resumed):
+                if name.endswith('.csv'):
+                    with open(os.path.join(resumed, name), 'a') as fid:
+                        fid.write('0.000,1.0\n')
+            dc = DataConverter(full_file_path, parameters)
+            with mock.patch.object(Sensor, '_parse_page',
+                                   autospec=True,
+                                   side_effect=Sensor._parse_page) as parse:
+                dc.convert()
+            # only the second page is converted
+            assert parse.call_count == 3
+            assert not os.path.exists(dc.checkpoint.path)
+            for name in os.listdir(full):
+                with open(os.path.join(full, name)) as expected, \
+                        open(os.path.join(resumed, name)) as new:
+                    assert new.read() == expected.read()
+
+    def test_resume_lost_rows(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['resume'] = True
+        with TemporaryDirectory() as full, TemporaryDirectory() as resumed:
+            parameters['output_directory'] = full
+            DataConverter(full_file_path, parameters).convert()
+            parameters['output_directory'] = resumed
+            dc = DataConverter(full_file_path, parameters)
+            dc.register_observer(lambda percent_done: dc.cancel_conversion())
+            dc.convert()
+            # rows of the checkpoint page that never reached the disk
+            for name in os.listdir(resumed):
+                if name.endswith('.csv'):
+                    path = os.path.join(resumed, name)
+                    os.truncate(path, os.path.getsize(path) - 10)
+            dc = DataConverter(full_file_path, parameters)
+            with mock.patch.object(Sensor, '_parse_page',
+                                   autospec=True,
+                                   side_effect=Sensor._parse_page) as parse:
+                dc.convert()
+            # both pages are converted again
+            assert parse.call_count == 6
+            for name in os.listdir(full):
+                with open(os.path.join(full, name)) as expected, \
+                        open(os.path.join(resumed, name)) as new:
+                    assert new.read() == expected.read()
+
+    def test_resume_hdf5(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['resume'] = True
+        parameters['output_format'] = 'hdf5'
+        with TemporaryDirectory() as full, TemporaryDirectory() as resumed:
+            parameters['output_directory'] = full
+            DataConverter(full_file_path, parameters).convert()
+            parameters['output_directory'] = resumed
+            dc = DataConverter(full_file_path, parameters)
+            dc.register_observer(lambda percent_done: dc.cancel_conversion())
+            dc.convert()
+            DataConverter(full_file_path, parameters).convert()
+            name = 'two_page_file.hdf5'
+            with h5py.File(os.path.join(full, name), 'r') as expected, \
+                    h5py.File(os.path.join(resumed, name), 'r') as new:
+                for stream in expected:
+                    for dataset in ['Time', 'Data']:
+                        assert np.array_equal(new[stream][dataset][:],
+                                              expected[stream][dataset][:])
+
+    def test_resume_other_parameters(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['resume'] = True
+        with TemporaryDirectory() as directory:
+            parameters['output_directory'] = directory
+            dc = DataConverter(full_file_path, parameters)
+            dc.register_observer(lambda percent_done: dc.cancel_conversion())
+            dc.convert()
+            # a checkpoint of another conversion is ignored
+            parameters['average'] = False
+            dc = DataConverter(full_file_path, parameters)
+            dc.convert()
+            parameters['resume'] = False
+            expected = DataConverter(full_file_path, parameters)
+            expected.convert()
+            assert dc.rows_written() == expected.rows_written()
+
+    def test_timings(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['timings'] = True
+        with TemporaryDirectory() as directory:
+            parameters['output_directory'] = directory
+            dc = DataConverter(full_file_path, parameters)
+            observed = []
+            dc.register_observer(
+                lambda percent_done, stage_timings: observed.append(
+                    stage_timings))
+            dc.convert()
+        summary = dc.timing_summary()
+        assert set(summary['stages']) == {'read', 'demux', 'calibrate',
+                                          'average', 'derive', 'write'}
+        assert summary['stages']['read']['calls'] == 2
+        assert summary['stages']['read']['bytes'] > 0
+        assert 'Temperature' in summary['details']['write']
+        assert observed[-1] == summary
+
+    def test_timings_parallel(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['timings'] = True
+        parameters['workers'] = 2
+        with TemporaryDirectory() as directory:
+            parameters['output_directory'] = directory
+            dc = DataConverter(full_file_path, parameters)
+            dc.convert()
+        summary = dc.timing_summary()
+        assert summary['stages']['read']['calls'] == 2
+        assert summary['stages']['demux']['calls'] > 0
+
+    def test_timings_off(self):
+        full_file_path = reference_file('two_page_file.lid')
+        with TemporaryDirectory() as directory:
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            dc = DataConverter(full_file_path, parameters)
+            dc.convert()
+        assert dc.timing_summary() is None
+
+    def test_output_interval(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        with TemporaryDirectory() as directory:
+            parameters['output_directory'] = directory
+            DataConverter(full_file_path, parameters).convert()
+            output_path = os.path.join(directory,
+                                       'two_page_file_Temperature.csv')
+            samples = pd.read_csv(output_path)
+            parameters['output_interval'] = 600
+            parameters['output_statistics'] = 'mean,std'
+            DataConverter(full_file_path, parameters).convert()
+            binned = pd.read_csv(output_path)
+        time = pd.to_datetime(samples.iloc[:, 0])
+        groups = samples.iloc[:, 1].groupby(time.dt.floor('600s'))
+        assert list(binned.columns[1:]) == ['Temperature (C) mean',
+                                            'Temperature (C) std']
+        assert np.allclose(binned.iloc[:, 1], groups.mean(), atol=1e-4)
+        assert np.allclose(binned.iloc[:, 2], groups.std(ddof=0), atol=1e-4)
+
+    def test_output_interval_iter_pages(self):
+        full_file_path = reference_file('two_page_file.lid')
+        parameters = default_parameters()
+        parameters['output_interval'] = 600
+        dc = DataConverter(full_file_path, parameters)
+        frames = dc.to_dataframes()
+        expected = DataConverter(full_file_path,
+                                 default_parameters()).to_dataframes()
+        temperature = expected['Temperature']['Temperature (C)']
+        means = temperature.groupby(temperature.index.floor('600s')).mean()
+        assert np.allclose(frames['Temperature']['Temperature (C)'], means)
+
+    def test_summarize(self):
+        full_file_path = reference_file('two_page_file.lid')
+        dc = DataConverter(full_file_path, default_parameters())
+        report = dc.summarize()
+        temperature = DataConverter(full_file_path, default_parameters()) \
+            .to_dataframes()['Temperature']['Temperature (C)']
+        statistics = report['streams']['Temperature']['columns']
+        assert report['streams']['Temperature']['rows'] == len(temperature)
+        assert np.isclose(statistics['Temperature (C)']['mean'],
+                          temperature.mean())
+        assert np.isclose(statistics['Temperature (C)']['std'],
+                          temperature.std(ddof=0))
+        assert report['battery']['start'] > 0
+        assert report['duration'] > 0
@@ -0,0 +1,46 @@
+import os
+import pytest
+from mat.data_file_factory import load_data_file, WrongFileTypeError
+from mat.file_format import header_format, sniff_file
+from mat.lid_data_file import LidDataFile
+from mat.lix import LID_FILE_UNK, LID_FILE_V1, LID_FILE_V2
+from mat.lix_dox import ParserLixDoxFile
+from mat.lix_tdo_v4 import ParserLixTdoFileV4
+from tests.utils import (reference_file, write_lix_dox_file,
+                         write_lix_tdo_file, lix_tdo_measurement)
+
+
+class TestFileFormat:
+    def test_lid_file(self):
+        file_format = sniff_file(reference_file('test.lid'))
+        assert file_format.flavor == LID_FILE_V1
+        assert file_format.parser is LidDataFile
+
+    def test_lix_files(self, tmp_path):
+        tdo_path = str(tmp_path / 'tdo.lid')
+        write_lix_tdo_file(tdo_path, [lix_tdo_measurement(1, 30000, [20000])],
+                           rvn=4)
+        dox_path = str(tmp_path / 'dox.lid')
+        write_lix_dox_file(dox_path, [(100, 200, 0x8003, 1500)], do2=True)
+        assert sniff_file(tdo_path) == (LID_FILE_V2, 'TDO', '4',
+                                        ParserLixTdoFileV4)
+        assert sniff_file(dox_path) == (LID_FILE_V2, 'DO2', None,
+                                        ParserLixDoxFile)
+        with pytest.raises(WrongFileTypeError):
+            load_data_file(dox_path)
+
+    def test_unknown_revision(self):
+        file_format = header_format(b'TDO' + bytes(14) + b'9')
+        assert file_format.flavor == LID_FILE_V2
+        assert file_format.parser is None
+
+    def test_other_extension(self):
+        assert sniff_file('file.csv').flavor == LID_FILE_UNK
+
+    def test_rewritten_file(self, tmp_path):
+        path = str(tmp_path / 'file.lid')
+        write_lix_dox_file(path, [(100, 200, 0x8003, 1500)])
+        assert sniff_file(path).logger_type == 'DO1'
+        write_lix_tdo_file(path, [lix_tdo_measurement(1, 30000, [20000])])
+        os.utime(path, ns=(1, 1))
+        assert sniff_file(path).logger_type == 'TDO'
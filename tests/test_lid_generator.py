@@ -0,0 +1,39 @@
+import os
+from tempfile import TemporaryDirectory
+import numpy as np
+from mat.data_converter import DataConverter, default_parameters
+from mat.data_file_factory import load_data_file
+from mat.lid_generator import write_lid_file, DEFAULT_START_TIME
+from mat.utils import epoch
+
+
+class TestLidGenerator:
+    def test_file_layout(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'synthetic.lid')
+            seconds = write_lid_file(path, 3, {'BMN': 16, 'BMR': 16})
+            data_file = load_data_file(path)
+            assert data_file.n_pages() == 3
+            assert data_file.header().tag('BMN') == 16
+            assert data_file.calibration().coefficients['TMR'] == 10000
+            start = epoch(DEFAULT_START_TIME)
+            assert data_file.page_times() == \
+                [start, start + seconds, start + 2 * seconds]
+            assert np.all(data_file.page_voltages() <= np.float64(3.7))
+            data_file.close()
+
+    def test_conversion(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'synthetic.lid')
+            write_lid_file(path, 2, {'PRS': 1, 'PHD': 1})
+            parameters = default_parameters()
+            parameters['output_directory'] = directory
+            converter = DataConverter(path, parameters)
+            pages = list(converter.iter_pages())
+            converter.close_source()
+        assert {p.stream for p in pages} == \
+            {'AccelMag', 'Temperature', 'Pressure', 'Light'}
+        for page in pages:
+            assert not np.any(np.isnan(page.data))
+            if page.stream == 'Temperature':
+                assert np.all((page.data > 10) & (page.data < 20))
@@ -0,0 +1,64 @@
+import shutil
+import numpy as np
+from mat.data_file_factory import load_data_file
+from mat.lid_page_index import (scan_page_index, sidecar_path, load_sidecar,
+                                _decode_rows)
+from tests.utils import reference_file
+
+
+class TestLidPageIndex:
+    def test_scan_two_page_file(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        page_index = data_file.page_index()
+        assert page_index.n_pages == 2
+        assert page_index.header_error is None
+        assert page_index.times.tolist() == [1535708941, 1535710292]
+        assert data_file.page_times() == [1535708941, 1535710291]
+
+    def test_bulk_and_row_decoding_agree(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        mapped = data_file.mapped_file()
+        length = data_file.mini_header_length()
+        starts = data_file.data_start + data_file.PAGE_SIZE * np.arange(2)
+        blocks = mapped[starts[:, None] + np.arange(length)]
+        times, voltages = _decode_rows(blocks)
+        page_index = data_file.page_index()
+        assert np.array_equal(times, page_index.times)
+        assert np.array_equal(voltages, page_index.voltages)
+
+    def test_truncated_page_is_not_indexed(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        mapped = data_file.mapped_file()
+        end = data_file.data_start + data_file.PAGE_SIZE + 3
+        page_index = scan_page_index(mapped[:end],
+                                     data_file.data_start,
+                                     data_file.PAGE_SIZE,
+                                     data_file.mini_header_length())
+        assert page_index.n_pages == 1
+        assert page_index.header_error == (1, 2)
+
+    def test_sidecar_round_trip(self, tmp_path):
+        path = str(tmp_path / 'two_page_file.lid')
+        shutil.copy(reference_file('two_page_file.lid'), path)
+        scanned = load_data_file(path, index_cache=True)
+        assert load_sidecar(path) is not None
+        reopened = load_data_file(path, index_cache=True)
+        assert reopened.page_times() == scanned.page_times()
+        assert reopened.page_voltages() == scanned.page_voltages()
+        assert reopened.mini_header_length() == \
+            scanned.mini_header_length()
+
+    def test_stale_sidecar_is_ignored(self, tmp_path):
+        path = str(tmp_path / 'two_page_file.lid')
+        shutil.copy(reference_file('two_page_file.lid'), path)
+        load_data_file(path, index_cache=True)
+        with open(path, 'ab') as f:
+            f.write(b'\x00\x00')
+        assert load_sidecar(path) is None
+
+    def test_no_sidecar_by_default(self, tmp_path):
+        path = str(tmp_path / 'two_page_file.lid')
+        shutil.copy(reference_file('two_page_file.lid'), path)
+        load_data_file(path)
+        assert load_sidecar(path) is None
+        assert not tmp_path.joinpath(sidecar_path('two_page_file.lid')).exists()
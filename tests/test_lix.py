@@ -0,0 +1,178 @@
+import numpy as np
+import pytest
+from mat.lix import (CS, lix_chunks, lix_data_bytes,
+                     lix_micro_header_anomalies, lix_micro_headers,
+                     LixFileConverterP, LixFileConverterT,
+                     lix_csv_times, write_lix_csv)
+from mat.lix_pr import get_lix_parser
+from mat.lix_tdo_records import decode_tdo_records
+from mat.lix_tdo_v3 import prf_compensate_pressure
+from tests.utils import (write_lix_tdo_file, write_lix_dox_file,
+                         lix_tdo_measurement)
+
+
+def _csv_rows(csv_path):
+    with open(csv_path) as f:
+        return [line.strip().split(',') for line in f][1:]
+
+
+class TestLixColumnar:
+    def test_tdo(self, tmp_path):
+        lid_path = str(tmp_path / 'tdo.lid')
+        measurements = [lix_tdo_measurement(1, 30000 + i, [20000, 20010],
+                                            i, -i, 100)
+                        for i in range(40)]
+        write_lix_tdo_file(lid_path, measurements, spn=2)
+        rows = _csv_rows(get_lix_parser(lid_path, 1).convert())
+        parser = get_lix_parser(lid_path, 1)
+        data = np.load(parser.convert(output_format='npy'))
+        assert parser.n_rows == len(rows) == 80
+        assert data['Time (ms)'][1] - data['Time (ms)'][0] == 500
+        assert list(data['Ay'][:4]) == [0, 0, -1, -1]
+        assert np.allclose(data['Temperature (C)'],
+                           [float(r[5]) for r in rows], atol=0.001)
+        assert np.allclose(data['Compensated Pressure (dbar)'],
+                           [float(r[8]) for r in rows], atol=0.001)
+
+    def test_dox(self, tmp_path):
+        lid_path = str(tmp_path / 'dox.lid')
+        write_lix_dox_file(lid_path, [(100, 200, 0x8003, 1500)] * 3, do2=True)
+        data = np.load(get_lix_parser(lid_path).convert(output_format='npy'))
+        assert data['Time (ms)'][1] - data['Time (ms)'][0] == 60000
+        assert list(data['DO Temperature (C)']) == [-0.03] * 3
+        assert list(data['Water Detect (%)']) == [50] * 3
+
+    def test_summarize(self, tmp_path):
+        lid_path = str(tmp_path / 'tdo.lid')
+        measurements = [lix_tdo_measurement(1, 30000 + i, [20000, 20010],
+                                            i, -i, 100)
+                        for i in range(40)]
+        write_lix_tdo_file(lid_path, measurements, spn=2)
+        data = np.load(get_lix_parser(lid_path).convert(output_format='npy'))
+        report = get_lix_parser(lid_path).summarize()
+        columns = report['streams']['TDO']['columns']
+        assert report['streams']['TDO']['rows'] == 80
+        assert columns['Ax']['max'] == 39
+        assert np.isclose(columns['Temperature (C)']['mean'],
+                          data['Temperature (C)'].mean())
+        assert report['duration'] == 39.5
+
+
+class TestLixChunks:
+    def test_chunks_are_a_view(self):
+        bb = bytes(range(256)) * 3
+        chunks = lix_chunks(bb)
+        assert chunks.shape == (3, CS)
+        assert not chunks.flags.owndata
+        assert lix_chunks(bb[:-6]).shape == (3, CS)
+
+    def test_data_bytes(self):
+        chunks = np.arange(3 * CS, dtype=np.uint16).astype(np.uint8)
+        chunks = chunks.reshape(3, CS)
+        padding = np.array([0, 240, 100])
+        data = lix_data_bytes(chunks, padding)
+        expected = (chunks[0, 8:].tobytes() + chunks[1, 8:16].tobytes()
+                    + chunks[2, 8:156].tobytes())
+        assert isinstance(data, bytearray)
+        assert data == expected
+        assert lix_data_bytes(chunks[:0], padding[:0]) == b''
+
+    def test_micro_headers(self):
+        uh = np.array([[0x0b, 0xb8, 1, 0, 0, 0, 0, 0],
+                       [0x0b, 0xb7, 2, 0, 0, 0, 1, 0x2c],
+                       [0x0b, 0xb6, 4, 9, 0, 0, 2, 0x58]], dtype=np.uint8)
+        headers = lix_micro_headers(uh)
+        assert list(headers['bat']) == [3000, 2999, 2998]
+        assert list(headers['rt']) == [0, 300, 600]
+        assert headers['ecl'][2] == 9
+        assert list(lix_micro_header_anomalies(headers)) == [2]
+
+    def test_battery_table(self, tmp_path):
+        lid_path = str(tmp_path / 'dox.lid')
+        write_lix_dox_file(lid_path, [(100, 200, 0x8003, 1500)] * 100)
+        parser = get_lix_parser(lid_path)
+        parser.convert()
+        times, voltages = parser.battery_table()
+        assert list(times - times[0]) == [0, 10, 20]
+        assert list(voltages) == [3.0] * 3
+        assert len(parser.uh_anomalies) == 0
+
+    def test_file_mapping_is_closed(self, tmp_path):
+        lid_path = str(tmp_path / 'dox.lid')
+        write_lix_dox_file(lid_path, [(100, 200, 0x8003, 1500)] * 3)
+        parser = get_lix_parser(lid_path)
+        parser.convert(output_format='npy')
+        assert parser.bb.closed
+        parser.summarize()
+        assert parser.bb.closed
+
+    def test_parse_error_is_raised(self, tmp_path, monkeypatch):
+        lid_path = str(tmp_path / 'dox.lid')
+        write_lix_dox_file(lid_path, [(100, 200, 0x8003, 1500)] * 3)
+        parser = get_lix_parser(lid_path)
+
+        def parse_measurements(mm):
+            raise ValueError('bad measurement')
+        monkeypatch.setattr(parser, '_parse_measurements', parse_measurements)
+        with pytest.raises(ValueError):
+            parser.convert()
+
+
+class TestTdoRecords:
+    def test_decode(self):
+        mm = (lix_tdo_measurement(1, 30000, [20000, 20001], 5, -5, 100)
+              + lix_tdo_measurement(0x100, 30001, [20002, 20003], 1, 2, 3)
+              + lix_tdo_measurement(0, 30002, [20004, 20005], -1, -2, -3)
+              + bytes(5) + lix_tdo_measurement(1, 1, [1, 1]))
+        records = decode_tdo_records(mm, 2)
+        assert list(records.time) == [1, 0x101]
+        assert list(records.temperature) == [30000, 30002]
+        assert records.pressure.tolist() == [[20000, 20001], [20004, 20005]]
+        assert list(records.ax) == [5, -1]
+        assert list(records.ay) == [-5, -2]
+        assert list(records.az) == [100, -3]
+
+    def test_incomplete_measurement(self):
+        mm = lix_tdo_measurement(1, 30000, [20000]) * 2
+        records = decode_tdo_records(mm[:-3], 1)
+        assert list(records.time) == [1]
+
+
+class TestTdoKernels:
+    def test_compensate_pressure(self):
+        rt = np.array([60000, 56765, 32768, 32767, 12693, 1000])
+        cp = prf_compensate_pressure(np.full(6, 20000), rt, 1.5, 2.25)
+        # a count equal to a table entry is the colder temperature
+        ct = np.array([-20, -20, 16, 17, 50, 51])
+        assert list(cp) == list(20000 - 1.5 * (ct - 2.25))
+        assert cp[2] == prf_compensate_pressure(20000, 32768, 1.5, 2.25)
+
+    def test_convert_column(self):
+        lct = LixFileConverterT(1.1238e-3, 2.3482e-4, 8.5897e-8, 0, 10000)
+        lcp = LixFileConverterP(3, 0.0016)
+        raw = [1000, 30000, 65535]
+        vt = lct.convert_column(raw)
+        assert np.allclose(vt, [lct.convert(r) for r in raw])
+        assert vt[-1] == lct.convert(65535)
+        assert list(lcp.convert_column(raw)) == [lcp.convert(r)[0]
+                                                 for r in raw]
+
+
+class TestLixCsv:
+    def test_times(self):
+        times = lix_csv_times([1706704496, 1706704497], [0, 62])
+        assert list(times) == ['2024-01-31T12:34:56.000',
+                               '2024-01-31T12:34:57.062']
+
+    def test_write(self, tmp_path, capsys, monkeypatch):
+        monkeypatch.setattr('mat.lix.g_verbose', False)
+        csv_path = str(tmp_path / 'a.csv')
+        columns = [np.array(['t0', 't1', 't2']), np.array([1.5, np.nan, 2]),
+                   np.array([1, 2, 3])]
+        write_lix_csv(csv_path, 'T,A,B\n', '{}Z,{:.2f},{}\n', columns)
+        with open(csv_path) as f:
+            assert f.read() == 'T,A,B\nt0Z,1.50,1\nt1Z,nan,2\nt2Z,2.00,3\n'
+        assert capsys.readouterr().out == ''
+        monkeypatch.setattr('mat.lix.g_verbose', True)
+        write_lix_csv(csv_path, 'T,A,B\n', '{}Z,{:.2f},{}\n', columns)
+        assert capsys.readouterr().out == '*** detected nan in 1 rows\n'
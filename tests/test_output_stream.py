@@ -0,0 +1,120 @@
+import h5py
+import numpy as np
+import pytest
+from mat.data_converter import default_parameters
+from mat.output_stream import (bin_statistics, CsvFile, format_column,
+                               HDF5Stream, PageRecorder, printf_format,
+                               TimeBins)
+from mat.time_converter import create_time_converter
+
+
+def make_csv_file(data_format):
+    parameters = {'split': None,
+                  'output_directory': None,
+                  'file_name': None,
+                  'overwrite': True}
+    csv_file = CsvFile('test.lid', 'Stream', parameters)
+    csv_file.data_format = data_format
+    return csv_file
+
+
+class TestOutputStream:
+    def test_printf_format(self):
+        assert printf_format('{},{:0.4f},{:0.2f}\n') == '%s,%0.4f,%0.2f\n'
+        assert printf_format('{},{:0.0f}%\n') == '%s,%0.0f%%\n'
+        assert printf_format('{},{:>8}\n') is None
+
+    def test_page_formatting_matches_str_format(self):
+        data = np.array([[1.23456, -0.5, np.nan, 2.5],
+                         [100.125, 3, np.inf, -0.0]])
+        time = ['a', 'b', 'c', 'd']
+        for data_format in ['{:0.4f},{:0.2f}', '{:0.0f},{:>9.1f}']:
+            row = '{},' + data_format + '\n'
+            expected = ''.join(row.format(time[i], *data[:, i])
+                               for i in range(4))
+            csv_file = make_csv_file(data_format)
+            assert csv_file._format_page(data, np.array(time, dtype='S')) \
+                == expected
+
+    def test_time_bytes_are_not_converted(self):
+        time = create_time_converter('iso8601').format_bytes(
+            np.array([1535711626.0, 1535711626.5]))
+        assert format_column(time, '') is time
+        page = make_csv_file('{:0.1f}')._format_page(np.array([[1.0, 2.0]]),
+                                                     time)
+        assert page == ('2018-08-31T10:33:46.000,1.0\n'
+                        '2018-08-31T10:33:46.500,2.0\n')
+
+    def test_file_stays_open_across_pages(self, tmp_path):
+        csv_file = make_csv_file('{:0.1f}')
+        csv_file.parameters['output_directory'] = str(tmp_path)
+        csv_file.column_header = 'Time,Value'
+        csv_file.write(np.array([[1.0, 2.0]]), np.array([b'a', b'b']))
+        handle = csv_file._file
+        csv_file.write(np.array([[3.0]]), np.array([b'c']))
+        assert csv_file._file is handle
+        csv_file.close()
+        with open(csv_file.output_path) as f:
+            assert f.read() == 'Time,Value\na,1.0\nb,2.0\nc,3.0\n'
+
+    def test_bin_statistics(self):
+        time = np.array([0, 5, 10, 15, 20, 25, 30.0])
+        data = np.array([[1, 3, 2, np.nan, 5, 7, 9],
+                         [0, 0, 1, 1, 2, 2, 3.0]])
+        stats, bin_time = bin_statistics(data, time, 10,
+                                         ['mean', 'min', 'max', 'std'])
+        assert np.array_equal(bin_time, [0, 10, 20, 30])
+        assert np.array_equal(stats[0], [2, 2, 6, 9])
+        assert np.array_equal(stats[1], [1, 2, 5, 9])
+        assert np.array_equal(stats[2], [3, 2, 7, 9])
+        assert np.array_equal(stats[3], [1, 0, 1, 0])
+        assert np.array_equal(stats[4], [0, 1, 2, 3])
+
+    def test_time_bins_span_writes(self):
+        recorder = PageRecorder()
+        bins = TimeBins(recorder, 10, 'mean,max')
+        bins.set_column_header('Stream', 'X,Y')
+        bins.write('Stream', np.array([[1.0, 2, 3], [1, 1, 1]]),
+                   np.array([0, 4, 8.0]))
+        assert recorder.pop_writes() == []
+        bins.write('Stream', np.array([[5.0, 7], [1, 1]]),
+                   np.array([12, 16.0]))
+        bins.flush()
+        writes = recorder.pop_writes()
+        assert [w[2].tolist() for w in writes] == [[0], [10]]
+        assert writes[0][1].tolist() == [[2], [3], [1], [1]]
+        assert writes[1][1].tolist() == [[6], [7], [1], [1]]
+        assert recorder.column_headers['Stream'] == \
+            ['X mean', 'X max', 'Y mean', 'Y max']
+
+    def test_time_bins_unknown_statistic(self):
+        with pytest.raises(ValueError):
+            TimeBins(PageRecorder(), 10, 'median')
+
+    def test_hdf5_page_samples(self, tmp_path):
+        parameters = default_parameters()
+        parameters['output_directory'] = str(tmp_path)
+        hdf5 = HDF5Stream('test.lid', parameters)
+        hdf5.n_pages = 3
+        hdf5.add_stream('Stream')
+        hdf5.set_page_samples('Stream', 1000)
+        hdf5.set_column_header('Stream', 'X,Y')
+        assert hdf5.file()['Stream']['Data'].chunks == (1000, 2)
+        assert hdf5.file()['Stream']['Data'].shape == (3000, 2)
+        hdf5.close()
+
+    def test_hdf5_without_page_samples(self, tmp_path):
+        parameters = default_parameters()
+        parameters['output_directory'] = str(tmp_path)
+        hdf5 = HDF5Stream('test.lid', parameters)
+        hdf5.add_stream('Stream')
+        hdf5.set_column_header('Stream', 'X,Y')
+        data = hdf5.file()['Stream']['Data']
+        assert data.shape == (0, 2)
+        assert data.chunks == (HDF5Stream.DEFAULT_CHUNK_ROWS, 2)
+        hdf5.write('Stream', np.array([[1.0, 2], [3, 4]]),
+                   np.array([0, 1.0]))
+        hdf5.close()
+        with h5py.File(str(tmp_path / 'test.hdf5'), 'r') as f:
+            assert f['Stream']['Data'][:].tolist() == [[1, 3], [2, 4]]
+            assert f['Stream']['Time'][:].tolist() == [0, 1]
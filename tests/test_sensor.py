@@ -0,0 +1,127 @@
+from unittest import TestCase
+import warnings
+import numpy as np
+from mat.header import Header
+from mat.sensor import create_sensors, demux_plan, major_interval_info
+
+
+def make_header(tags):
+    header = Header('')
+    header._header = tags
+    return header
+
+
+TAGS = {'TMP': True, 'ACL': True, 'MGN': True,
+        'TRI': 2, 'ORI': 1, 'BMR': 2, 'BMN': 2}
+
+
+class TestSensor(TestCase):
+    def test_sample_schedule_interleaves_by_time_then_order(self):
+        sensors = create_sensors(make_header(TAGS), None, 2)
+        temperature, accelerometer, magnetometer = sensors
+        # t=0: T A A A M M M, t=0.5: A A A M M M, t=1 ...
+        assert temperature.sample_ind.tolist() == [0]
+        assert accelerometer.sample_ind.tolist() == \
+            [1, 2, 3, 7, 8, 9, 13, 14, 15, 19, 20, 21]
+        assert magnetometer.sample_ind.tolist() == \
+            [4, 5, 6, 10, 11, 12, 16, 17, 18, 22, 23, 24]
+
+    def test_sample_schedule_is_shared(self):
+        first = create_sensors(make_header(TAGS), None, 60)
+        second = create_sensors(make_header(dict(TAGS)), None, 60)
+        assert first[1].sample_ind is second[1].sample_ind
+        assert not first[1].sample_ind.flags.writeable
+
+    def test_sample_times(self):
+        sensors = create_sensors(make_header(TAGS), None, 2)
+        assert np.array_equal(sensors[1]._sample_times(), [0, 0.5, 1, 1.5])
+
+    def test_major_interval_info(self):
+        assert major_interval_info(make_header(TAGS)) == (2, 50)
+
+    def test_demux_plan(self):
+        sensors = create_sensors(make_header(TAGS), None, 10)
+        temperature, accelerometer, magnetometer = sensors
+        # 25 page samples every 2 seconds, 1 temperature and 4 * 3
+        # accelerometer and magnetometer samples each
+        assert temperature.demux.period == 25
+        assert accelerometer.demux.period == 25
+        assert accelerometer.demux.width == 12
+        assert magnetometer.demux.start == 4
+        assert accelerometer.demux.runs == ((0, 4, 6), )
+
+    def test_demux_plan_irregular(self):
+        assert demux_plan(np.array([0, 1, 3, 4, 7]), 1) is None
+
+    def test_parse_page_matches_gather(self):
+        for tags in (TAGS, dict(TAGS, TMP=False)):
+            for seconds in (2, 10):
+                sensors = create_sensors(make_header(tags), None, seconds)
+                n_page = sensors[-1].sample_ind[-1] + 1
+                # a full page, and a last page ending mid period
+                for length in (n_page, n_page - 30):
+                    page = np.arange(-length, length, 2, dtype='<i2')
+                    for sensor in sensors:
+                        expected = _gather(sensor, page)
+                        data, time = sensor._parse_page(page)
+                        assert data.dtype == np.dtype(sensor.data_type)
+                        assert np.array_equal(data, expected)
+                        assert len(time) == data.shape[1]
+
+    def test_parse_page_fixed_stride_is_a_view(self):
+        sensors = create_sensors(make_header(dict(TAGS, TMP=False)), None, 10)
+        page = np.zeros(sensors[-1].sample_ind[-1] + 1, dtype='<i2')
+        data, _ = sensors[0]._parse_page(page)
+        assert np.shares_memory(data, page)
+
+    def test_demultiplex_interleaved_groups_is_a_view(self):
+        sensors = create_sensors(make_header(TAGS), None, 10)
+        accelerometer = sensors[1]
+        page = np.zeros(sensors[-1].sample_ind[-1] + 1, dtype='<i2')
+        # 4 whole periods of 4 groups, the temperature sample breaks the
+        # spacing between periods
+        data = accelerometer._demultiplex(page, 48)
+        assert data.shape == (3, 4, 4)
+        assert np.shares_memory(data, page)
+
+    def test_demux_runs(self):
+        # the third group is shifted by a sample of another sensor
+        period = np.array([0, 1, 3, 4, 7, 8, 10, 11, 13, 14])
+        sample_ind = np.concatenate([period, period + 20])
+        assert demux_plan(sample_ind, 2).runs == ((0, 2, 3), (7, 3, 3))
+        # the channels of a group aren't next to each other
+        assert demux_plan(np.array([0, 2, 3, 5, 6, 8]), 2).runs is None
+
+    def test_average_bursts_matches_nanmean(self):
+        sensor = create_sensors(make_header(TAGS), None, 60)[1]
+        data = np.random.default_rng(0).normal(size=(3, 120))
+        time = np.arange(120.0)
+        sparse = data.copy()
+        sparse[0, 5] = np.nan
+        sparse[:, 10:12] = np.nan
+        dense = data.copy()
+        dense[:, ::2] = np.nan
+        for page in (data, sparse, dense):
+            with warnings.catch_warnings():
+                # bursts of only NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                expected = np.nanmean(page.reshape(3, -1, 2), axis=2)
+            averaged, averaged_time = sensor._average_bursts(page, time)
+            assert np.array_equal(averaged, expected, equal_nan=True)
+            assert np.array_equal(averaged_time, time[::2])
+
+    def test_average_bursts_output_is_not_reused(self):
+        sensor = create_sensors(make_header(TAGS), None, 60)[1]
+        data = np.ones((3, 120))
+        data[:, ::2] = np.nan
+        first, _ = sensor._average_bursts(data, np.arange(120.0))
+        second, _ = sensor._average_bursts(data * 2, np.arange(120.0))
+        assert np.all(first == 1) and np.all(second == 2)
+
+
+def _gather(sensor, page):
+    index = np.searchsorted(sensor.sample_ind, len(page))
+    samples_per_burst = sensor.burst_count * sensor.channels
+    index = index // samples_per_burst * samples_per_burst
+    data = page[sensor.sample_ind[:index]].astype(sensor.data_type)
+    return np.reshape(data, (sensor.channels, -1), order='F')
@@ -58,4 +58,18 @@ class TestSensorDataFile(TestCase):
     def test_mini_header_voltages(self):
         data_file = load_data_file(reference_file('two_page_file.lid'))
         voltages = data_file.page_voltages()
-        assert voltages == [3.998, 3.998]
\ No newline at end of file
+        assert voltages == [3.998, 3.998]
+
+    def test_page_is_read_only_view(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        page = data_file.page(1)
+        assert not page.flags.writeable
+        assert page.dtype == '<i2'
+        data_file.close()
+
+    def test_page_cache_keeps_several_pages(self):
+        data_file = load_data_file(reference_file('two_page_file.lid'))
+        first = data_file.page(0)
+        data_file.page(1)
+        assert data_file.page(0) is first
+        data_file.close()
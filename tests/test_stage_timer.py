@@ -0,0 +1,46 @@
+from time import sleep
+from mat.stage_timer import NULL_TIMER, StageTimer
+
+
+class TestStageTimer:
+    def test_nested_stages(self):
+        timer = StageTimer()
+        with timer.stage('derive', 'Current'):
+            sleep(0.01)
+            with timer.stage('write', 'Current'):
+                sleep(0.02)
+        derive = timer.counts[('derive', 'Current')]
+        write = timer.counts[('write', 'Current')]
+        assert derive[1] == 1 and write[1] == 1
+        assert write[0] >= 0.02
+        # the time of the write isn't counted twice
+        assert derive[0] < 0.02
+
+    def test_summary(self):
+        timer = StageTimer()
+        with timer.stage('write', 'Temperature'):
+            pass
+        with timer.stage('write', 'Pressure'):
+            pass
+        timer.add_bytes('write', 'Pressure', 100)
+        summary = timer.summary()
+        assert summary['stages']['write']['calls'] == 2
+        assert summary['stages']['write']['bytes'] == 100
+        assert set(summary['details']['write']) == {'Temperature',
+                                                    'Pressure'}
+
+    def test_merge(self):
+        timer = StageTimer()
+        other = StageTimer()
+        with other.stage('read'):
+            pass
+        timer.merge(other.pop_counts())
+        timer.merge({('read', ''): [1.0, 1, 10]})
+        assert other.counts == {}
+        assert timer.counts[('read', '')][1:] == [2, 10]
+
+    def test_null_timer(self):
+        with NULL_TIMER.stage('read'):
+            NULL_TIMER.add_bytes('read', '', 10)
+        assert NULL_TIMER.summary() is None
+        assert NULL_TIMER.pop_counts() == {}
@@ -0,0 +1,48 @@
+import numpy as np
+from mat.time_converter import (concat_bytes, create_time_converter,
+                                format_decimal_seconds, format_fixed)
+
+
+TIMES = 1535711626 + np.arange(200) / 64
+
+
+class TestTimeConverter:
+    def test_iso8601(self):
+        times = create_time_converter('iso8601').format_bytes(TIMES)
+        assert times.dtype == np.dtype('S23')
+        assert times[0] == b'2018-08-31T10:33:46.000'
+        assert times[1] == b'2018-08-31T10:33:46.015'
+        assert times[-1] == b'2018-08-31T10:33:49.109'
+
+    def test_legacy(self):
+        times = create_time_converter('legacy').convert(TIMES[:1])
+        assert list(times) == ['2018-08-31,10:33:46.000']
+
+    def test_posix_matches_str_format(self):
+        times = create_time_converter('posix').convert(TIMES)
+        assert list(times) == ['{:0.3f}'.format(t) for t in TIMES]
+
+    def test_elapsed_crosses_digit_count(self):
+        converter = create_time_converter('elapsed')
+        converter.convert(np.array([100.0]))
+        times = converter.convert(np.array([109.9995, 110.0625, 200.5]))
+        assert list(times) == ['9.999', '10.062', '100.500']
+
+    def test_ties_round_half_even(self):
+        times = np.array([0.0625, 0.1875, 0.0005, 2.9995, 1e-20])
+        assert list(format_decimal_seconds(times)) == \
+            [b'0.062', b'0.188', b'0.001', b'2.999', b'0.000']
+
+    def test_fixed_matches_str_format(self):
+        values = np.concatenate([
+            np.random.default_rng(0).normal(0, 1000, 1000),
+            [0.125, 2.5, -2.5, 0.00005, -0.0, 1e300, np.nan, -np.inf]])
+        for decimals in [0, 2, 4]:
+            text_format = '{{:0.{}f}}'.format(decimals)
+            assert list(format_fixed(values, decimals)) == \
+                [text_format.format(x).encode() for x in values]
+
+    def test_concat_bytes(self):
+        joined = concat_bytes([np.array([b'a', b'bcd']), np.array([b'-', b'']),
+                               np.array([b'12', b'3'])])
+        assert list(joined) == [b'a-12', b'bcd3']
@@ -52,3 +52,61 @@ def _values_are_close(zip_obj):
         for i in range(1, len(file1)):
             assert isclose(float(file1[i]), float(file2[i]), abs_tol=0.01)
         row_count += 1
+
+
+# synthetic LIX files, the repository has no real ones
+LIX_TIME = bytes([0x24, 0x01, 0x31, 0x12, 0x34, 0x56])
+
+
+def lix_tdo_measurement(t, rt, rps, ax=0, ay=0, az=0):
+    """
+    t: seconds since the previous measurement, rps: raw pressure samples
+    """
+    if t < 0x40:
+        mask = bytes([t])
+    else:
+        mask = bytes([0x40 | (t >> 8), t & 0xff])
+    values = [rt] + list(rps) + [a & 0xffff for a in (ax, ay, az)]
+    return mask + b''.join(v.to_bytes(2, 'big') for v in values)
+
+
+def write_lix_tdo_file(file_path, measurements, rvn=3, spn=1):
+    from mat.ascii85 import num_to_ascii85
+    cc_area_length = 5 * 29 if rvn == 3 else 5 * 33
+    cc_area = bytearray(b'0' * cc_area_length)
+    cc_area[:5] = '0000{}'.format(rvn).encode()
+    coefficients = [10000, 1.1238e-3, 2.3482e-4, 8.5897e-8, 0]
+    for i, c in enumerate(coefficients):
+        cc_area[10 + 5 * i:15 + 5 * i] = num_to_ascii85(c).encode()
+    cc_area[125:130] = num_to_ascii85(3).encode()
+    cc_area[130:135] = num_to_ascii85(0.0016).encode()
+    cc_area[135:145] = b'0010000200'
+    context = b'4123' + bytes([ord(str(rvn)), 0, spn, 0]) + b'00001'
+    macro_header = b'TDO\x03' + LIX_TIME + b'\x0b\xb8\x00' + bytes(cc_area)
+    macro_header = macro_header.ljust(256 - 48, b'\x00')
+    macro_header += context.ljust(48, b'\x00')
+    _write_lix_chunks(file_path, macro_header, b''.join(measurements))
+
+
+def write_lix_dox_file(file_path, measurements, do2=False, spt=60):
+    """
+    measurements: (mg/l, %, temperature, water mV) raw 16-bit tuples
+    """
+    n = 4 if do2 else 3
+    context = b'4123' + b'\x00' * 4 + '{:05d}'.format(spt).encode()
+    macro_header = (b'DO2' if do2 else b'DO1') + b'\x03' + LIX_TIME
+    macro_header = macro_header.ljust(256 - 48, b'\x00')
+    macro_header += context.ljust(48, b'\x00')
+    data = b''.join(v.to_bytes(2, 'big') for m in measurements for v in m[:n])
+    _write_lix_chunks(file_path, macro_header, data)
+
+
+def _write_lix_chunks(file_path, macro_header, data):
+    chunks = [data[i:i + 248] for i in range(0, len(data), 248)] or [b'']
+    with open(file_path, 'wb') as f:
+        f.write(macro_header)
+        for i, chunk in enumerate(chunks):
+            padding = 248 - len(chunk)
+            f.write(b'\x0b\xb8' + bytes([(i + 1) % 256, padding])
+                    + (10 * i).to_bytes(4, 'big')
+                    + chunk + b'\x00' * padding)